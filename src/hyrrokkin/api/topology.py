@@ -19,7 +19,8 @@
 
 import io
 import os
-from typing import List, Callable, Union, Literal, Any, Dict, Protocol
+from contextlib import contextmanager
+from typing import List, Callable, Union, Literal, Any, Dict, Protocol, ContextManager
 
 from hyrrokkin.execution_manager.execution_manager import ExecutionManager
 from hyrrokkin.schema.schema import Schema
@@ -28,6 +29,7 @@ from hyrrokkin.model.link import Link
 from hyrrokkin.exceptions.invalid_link_error import InvalidLinkError
 from hyrrokkin.exceptions.invalid_node_error import InvalidNodeError
 from hyrrokkin.utils.data_store_utils import DataStoreUtils
+from hyrrokkin.storage.storage_factory import StorageFactory
 from hyrrokkin.utils.type_hints import JsonType
 from hyrrokkin.model.network import Network
 from hyrrokkin.api.topology_interactor import TopologyInteractor
@@ -38,7 +40,10 @@ class Topology:
     def __init__(self, execution_folder:str, package_list: list[str],
                  status_handler: Callable[[str, str, str, str], None] = None,
                  execution_handler: Callable[[Union[float,None], str, str, Union[Dict, Exception, None], bool], None] = None,
-                 in_process:bool=False):
+                 in_process:bool=False, resource_limits:Dict[str,Union[int,float]]={},
+                 use_journal:bool=False, use_snapshot:bool=False, storage:str="directory",
+                 storage_options:Dict[str,Any]={}, deduplicate_data:bool=False,
+                 compress_data_threshold:int=None, compress_data_keys:list[str]=[], lazy_nodes:bool=False):
         """
         Create a topology
 
@@ -50,42 +55,75 @@ class Topology:
             execution_handler: specify a function to call when a node changes its execution status
                                 passing parameters timestamp, node_id, state, exception, is_manual
             in_process: whether to execute the topology within the current process (True) or in a separate process (False)
+            resource_limits: a mapping from resource pool name to the capacity of that pool.  Nodes whose node type
+                             declares resources in the schema will only be run while the pools have capacity.
+            use_journal: if True, record edits to the topology by appending to a journal in the execution folder,
+                         rather than rewriting the topology definition after every edit.  Call close to compact the
+                         journal when finished editing.
+            use_snapshot: if True, also save the topology definition as a compact binary snapshot in the execution
+                          folder, which load_dir can read much faster than the JSON definition for large topologies.
+            storage: how node and package properties and data are stored in the execution folder, either "directory"
+                     (a file for the properties of each node and each data key), "sqlite" (a single database file)
+                     or "memory" (held in memory and discarded with the topology, requires in_process=True)
+            storage_options: options for the storage, for "memory" set spill_threshold to store data larger than
+                             this number of bytes in files rather than in memory
+            deduplicate_data: if True, node and package data is stored once for each distinct content, with each
+                              data key referring to the stored content by its hash.  This also reduces the
+                              size of files written by save_zip when many nodes store the same data.
+            compress_data_threshold: if not None, node and package data of at least this many bytes is stored
+                                     gzip compressed, and decompressed when read.  Compressed data is copied into
+                                     files written by save_zip without being compressed again.
+            compress_data_keys: data keys whose data is always stored compressed, including data written in chunks
+            lazy_nodes: if True, the execution engine only creates and loads a node's instance when the node is
+                        first executed or a client is opened on it, rather than when the topology is loaded
         """
         self.execution_folder = execution_folder
         os.makedirs(self.execution_folder, exist_ok=True)
-        self.dsu = DataStoreUtils(self.execution_folder)
+        if storage == "memory" and not in_process:
+            raise ValueError("memory storage can only be used when in_process is True")
+        self.storage = StorageFactory.create(storage, self.execution_folder, **storage_options)
+        self.dsu = DataStoreUtils(self.execution_folder, storage=self.storage, deduplicate=deduplicate_data,
+                                  compress_threshold=compress_data_threshold, compress_keys=compress_data_keys)
         self.schema = Schema()
         for package in package_list:
             self.schema.load_package_from(package + "/schema.json")
         self.status_handler = status_handler
         self.execution_handler = execution_handler
 
-        self.network = Network(self.schema, self.execution_folder)
+        self.network = Network(self.schema, self.execution_folder, use_journal=use_journal,
+                               use_snapshot=use_snapshot, storage=self.storage)
         self.executor = ExecutionManager(self.network, self.schema, execution_folder=self.execution_folder,
                                       status_callback=self.status_handler,
                                       node_execution_callback=self.execution_handler,
-                                      in_process=in_process)
+                                      in_process=in_process,
+                                      resource_limits=resource_limits, storage=storage,
+                                      storage_options=storage_options,
+                                      deduplicate_data=deduplicate_data,
+                                      compress_data_threshold=compress_data_threshold,
+                                      compress_data_keys=compress_data_keys,
+                                      lazy_nodes=lazy_nodes)
         # the empty flag indicates that the topology contains no nodes and no
         # package properties or package data has been assigned
         self.empty = True
+        # nodes removed within a batch, their data is removed only when the outermost batch completes
+        self.removed_node_ids = set()
 
-    def load_zip(self, from_file: io.BytesIO) -> dict:
+    def load_zip(self, from_file: io.BytesIO, lazy_data:bool=False) -> dict:
         """
         Load a topology from a binary stream
 
         Args:
             from_file: a binary stream, opened for reading
+            lazy_data: if True, copy the zip file into the execution folder and extract node and package data
+                       from it only when the data is first accessed
 
         Returns:
             a dictionary containing any node renamings performed to avoid id collisions with existing nodes
         """
-        (added_node_ids, added_link_ids, node_renamings) = self.network.load_zip(from_file, merging=not self.empty)
-        for node_id in added_node_ids:
-            node = self.network.get_node(node_id)
-            self.executor.add_node(node)
-        for link_id in added_link_ids:
-            link = self.network.get_link(link_id)
-            self.executor.add_link(link)
+        (added_node_ids, added_link_ids, node_renamings) = self.network.load_zip(from_file, merging=not self.empty,
+                                                                                 lazy_data=lazy_data)
+        self.executor.add_nodes([self.network.get_node(node_id) for node_id in added_node_ids])
+        self.executor.add_links([self.network.get_link(link_id) for link_id in added_link_ids])
         self.empty = False
         return node_renamings
 
@@ -94,25 +132,83 @@ class Topology:
         Load a topology from the execution folder
         """
         (added_node_ids, added_link_ids, node_renamings) = self.network.load_dir({})
-        for node_id in added_node_ids:
-            node = self.network.get_node(node_id)
-            self.executor.add_node(node)
-        for link_id in added_link_ids:
-            link = self.network.get_link(link_id)
-            self.executor.add_link(link)
+        self.executor.add_nodes([self.network.get_node(node_id) for node_id in added_node_ids])
+        self.executor.add_links([self.network.get_link(link_id) for link_id in added_link_ids])
         self.empty = False
 
-    def save_zip(self, to_file: io.BufferedWriter=None) ->Union[None,bytes]:
+    def save_zip(self, to_file: io.BufferedWriter=None, compress:bool=False) ->Union[None,bytes]:
         """
         Save a topology to a binary stream
 
         Args:
-            to_file: an opened binary file to which the topology will be saved, if provided
+            to_file: an opened binary file to which the topology will be saved, if provided.  The file is written
+                     sequentially, so this may be a pipe or socket.
+            compress: if True, compress the files in the zip file, apart from data files which are already
+                      in a compressed format
 
         Returns:
             if to_file is not provided, returns a bytes object containing the saved topology
         """
-        return self.network.save_zip(to_file)
+        return self.network.save_zip(to_file, compress=compress)
+
+    def batch(self) -> ContextManager:
+        """
+        Obtain a context manager which groups a sequence of edits, deferring the saving of the topology
+        definition until the context exits.  If the context exits with an exception, the nodes, links and
+        metadata are restored to their last saved state.
+
+        Example:
+            with topology.batch():
+                topology.add_node("n0", "numbergraph:number_input_node", {"value": 99})
+                topology.add_node("n1", "numbergraph:prime_factors_node")
+                topology.add_link("l0", "n0", None, "n1", None)
+        """
+        return self.__batch()
+
+    @contextmanager
+    def __batch(self):
+        failed_ids = None
+        try:
+            with self.network.batch():
+                try:
+                    yield self
+                except BaseException:
+                    # remember the nodes and links at the point of failure, the network may be reloaded
+                    failed_ids = (self.network.get_node_ids(), self.network.get_link_ids())
+                    raise
+        except BaseException:
+            if failed_ids is not None and self.network.batch_depth == 0:
+                self.__restore_executor(*failed_ids)
+                self.__remove_node_data()
+            raise
+        else:
+            if self.network.batch_depth == 0:
+                self.__remove_node_data()
+
+    def __remove_node_data(self):
+        # remove the data of nodes removed in the batch which have not been restored
+        removed_node_ids = self.removed_node_ids
+        self.removed_node_ids = set()
+        for node_id in removed_node_ids:
+            if self.network.get_node(node_id) is None:
+                self.dsu.remove_node_data(node_id)
+
+    def __restore_executor(self, node_ids, link_ids):
+        # update the executor to match the network after it was reloaded following a failed batch
+        for link_id in link_ids:
+            if self.network.get_link(link_id) is None:
+                self.executor.remove_link(link_id)
+        for node_id in node_ids:
+            if self.network.get_node(node_id) is None:
+                # the node was added in the failed batch, discard any data stored for it
+                self.dsu.remove_node_data(node_id)
+                self.executor.remove_node(node_id)
+        node_ids = set(node_ids)
+        link_ids = set(link_ids)
+        self.executor.add_nodes([self.network.get_node(node_id) for node_id in self.network.get_node_ids()
+                                 if node_id not in node_ids])
+        self.executor.add_links([self.network.get_link(link_id) for link_id in self.network.get_link_ids()
+                                 if link_id not in link_ids])
 
     def run(self, inject_input_values:Dict[str,Any]={}, output_listeners:Dict[str,Callable[[Any],None]]={}) -> bool:
         """
@@ -181,6 +277,7 @@ class Topology:
         if self.network.get_node(node_id) is not None:
             raise InvalidNodeError(f"Node with id {node_id} already exists")
 
+        self.__reuse_node_id(node_id)
         self.dsu.set_node_properties(node_id, properties)
         node = Node(node_id, node_type, x=x, y=y, metadata=metadata)
         self.network.add_node(node)
@@ -188,9 +285,55 @@ class Topology:
         self.empty = False
         return node_id
 
+    def add_nodes(self, nodes: list[dict[str, JsonType]]) -> list[str]:
+        """
+        Add multiple nodes to the topology, validating all nodes before any are added and then saving the
+        topology once
+
+        Args:
+            nodes: a list of dictionaries, each with keys node_id, node_type and optionally properties, metadata, x, y
+                   interpreted as for add_node
+
+        Returns:
+            list of the ids of the added nodes
+
+        Raises:
+            InvalidNodeError: if any of the nodes cannot be added, in which case no nodes are added
+        """
+        node_types = {}
+        new_nodes = []
+        for node_spec in nodes:
+            node_id = node_spec["node_id"]
+            node_type = node_spec["node_type"]
+            if self.network.get_node(node_id) is not None:
+                raise InvalidNodeError(f"Node with id {node_id} already exists")
+            try:
+                self.__get_node_type(node_type, node_types)
+            except Exception:
+                raise InvalidNodeError(f"Node type {node_type} is not defined in the schema")
+            new_nodes.append(Node(node_id, node_type, x=node_spec.get("x", 0), y=node_spec.get("y", 0),
+                                  metadata=node_spec.get("metadata", {})))
+
+        node_ids = [node.get_node_id() for node in new_nodes]
+        if len(set(node_ids)) < len(node_ids):
+            raise InvalidNodeError("Node ids must be unique")
+
+        with self.network.batch(), self.dsu.batch():
+            for (node_spec, node) in zip(nodes, new_nodes):
+                # a node without properties needs no properties file
+                properties = node_spec.get("properties", {})
+                self.__reuse_node_id(node.get_node_id())
+                self.dsu.set_node_properties(node.get_node_id(), properties if properties else None)
+                self.network.add_node(node)
+
+        self.executor.add_nodes(new_nodes)
+        self.empty = False
+        return node_ids
+
     def remove_node(self, node_id: str):
         """
-        Remove a node from the topology
+        Remove a node from the topology, along with any data stored for the node.  Within a batch, the data is
+        removed when the batch completes, and is kept if the batch fails.
 
         Args:
             node_id: the node's unique identifier
@@ -198,8 +341,18 @@ class Topology:
         if self.network.get_node(node_id) is None:
             raise InvalidNodeError(f"Node with id {node_id} does not exist")
         self.network.remove_node(node_id)
+        if self.network.batch_depth > 0:
+            self.removed_node_ids.add(node_id)
+        else:
+            self.dsu.remove_node_data(node_id)
         self.executor.remove_node(node_id)
 
+    def __reuse_node_id(self, node_id):
+        # a node added with the id of a node removed earlier in the batch does not inherit the removed node's data
+        if node_id in self.removed_node_ids:
+            self.removed_node_ids.discard(node_id)
+            self.dsu.remove_node_data(node_id)
+
     def update_node_position(self, node_id:str, x:int, y:int):
         """
         Update a node's position
@@ -232,6 +385,8 @@ class Topology:
             property_value: the value of the property, must be JSON serialisable
         """
         self.dsu.set_node_property(node_id, property_name, property_value)
+        # pass the change, so that it can be merged with any property changes not yet written by the node
+        self.executor.reload_properties([node_id], {node_id: {property_name: property_value}})
 
     def get_node_data(self, node_id: str, key: str) -> Union[bytes, str, None]:
         """
@@ -322,6 +477,72 @@ class Topology:
         Raises:
             InvalidLinkError: if the link cannot be added
         """
+        link = self.__create_link(link_id, from_node_id, from_port, to_node_id, to_port, {}, set())
+
+        if self.network.is_reachable(to_node_id, from_node_id):
+            raise InvalidLinkError(f"link from {from_node_id} to {to_node_id} would create a cycle")
+
+        self.network.add_link(link)
+        self.executor.add_link(link)
+        return link_id
+
+    def add_links(self, links: list[dict[str, Union[str, None]]]) -> list[str]:
+        """
+        Add multiple links to the topology, validating all links before any are added and then saving the
+        topology once
+
+        Args:
+            links: a list of dictionaries, each with keys link_id, from_node_id, from_port, to_node_id, to_port
+                   interpreted as for add_link.  from_port and to_port can be omitted.
+
+        Returns:
+            list of the ids of the added links
+
+        Raises:
+            InvalidLinkError: if any of the links cannot be added, in which case no links are added
+        """
+        node_types = {}
+        connected_ports = set()
+        link_ids = set()
+        new_links = []
+        for link_spec in links:
+            link_id = link_spec["link_id"]
+            if link_id in link_ids:
+                raise InvalidLinkError(f"Link with id {link_id} is specified more than once")
+            link_ids.add(link_id)
+            new_links.append(self.__create_link(link_id, link_spec["from_node_id"], link_spec.get("from_port", None),
+                                                link_spec["to_node_id"], link_spec.get("to_port", None),
+                                                node_types, connected_ports))
+
+        cycle_link = None
+        with self.network.batch(), self.dsu.batch():
+            added_links = []
+            for link in new_links:
+                # the topology has no cycles, so a link creates one only if its source is downstream of its target
+                if self.network.is_reachable(link.to_node_id, link.from_node_id):
+                    cycle_link = link
+                    break
+                self.network.add_link(link)
+                added_links.append(link)
+            if cycle_link is not None:
+                for link in added_links:
+                    self.network.remove_link(link.get_link_id())
+        # raise outside the batch, which need not reload the network when only the new links are removed
+        if cycle_link is not None:
+            raise InvalidLinkError(f"link from {cycle_link.from_node_id} to {cycle_link.to_node_id} would create a cycle")
+
+        self.executor.add_links(new_links)
+        return [link.get_link_id() for link in new_links]
+
+    def __get_node_type(self, node_type_name, node_types):
+        # look up node types via a cache, to avoid repeated schema lookups when adding many nodes or links
+        if node_type_name not in node_types:
+            node_types[node_type_name] = self.schema.get_node_type(node_type_name)
+        return node_types[node_type_name]
+
+    def __create_link(self, link_id, from_node_id, from_port, to_node_id, to_port, node_types, connected_ports):
+        # validate a link and return a new Link instance
+        # connected_ports holds (node_id, port_type, port_name) for ports connected by other links validated but not yet added
 
         if self.network.get_link(link_id) is not None:
             raise InvalidLinkError(f"Link with id {link_id} already exists")
@@ -330,14 +551,12 @@ class Topology:
         if from_node is None:
             raise InvalidLinkError(f"{from_node_id} does not exist")
 
-        from_node_type_name = from_node.get_node_type()
-        from_node_type = self.schema.get_node_type(from_node_type_name)
+        from_node_type = self.__get_node_type(from_node.get_node_type(), node_types)
 
         to_node = self.network.get_node(to_node_id)
         if to_node is None:
             raise InvalidLinkError(f"{to_node_id} does not exist")
-        to_node_type_name = to_node.get_node_type()
-        to_node_type = self.schema.get_node_type(to_node_type_name)
+        to_node_type = self.__get_node_type(to_node.get_node_type(), node_types)
 
         if from_port is None:
             if len(from_node_type.output_ports) == 1:
@@ -367,18 +586,21 @@ class Topology:
             raise InvalidLinkError(f"incompatible link types (from: {from_link_type}, to: {to_link_type})")
 
         if not from_node_type.output_ports[from_port].allows_multiple_connections():
-            if len(self.network.get_outputs_from(from_node_id, from_port)) > 0:
+            if len(self.network.get_outputs_from(from_node_id, from_port)) > 0 \
+                    or (from_node_id, "output", from_port) in connected_ports:
                 raise InvalidLinkError(
                     f"output port {from_node_id}/{from_port} is already connected and does not allow multiple connections")
 
         if not to_node_type.input_ports[to_port].allows_multiple_connections():
-            if len(self.network.get_inputs_to(to_node_id, to_port)) > 0:
+            if len(self.network.get_inputs_to(to_node_id, to_port)) > 0 \
+                    or (to_node_id, "input", to_port) in connected_ports:
                 raise InvalidLinkError(
                     f"input port {to_node_id}/{to_port} is already connected and does not allow multiple connections")
 
-        link = Link(link_id, from_node_id, from_port, to_node_id, to_port, from_link_type)
-        self.network.add_link(link)
-        self.executor.add_link(link)
+        connected_ports.add((from_node_id, "output", from_port))
+        connected_ports.add((to_node_id, "input", to_port))
+
+        return Link(link_id, from_node_id, from_port, to_node_id, to_port, from_link_type)
 
     def remove_link(self, link_id: str):
         """
@@ -393,6 +615,130 @@ class Topology:
             self.network.remove_link(link_id)
             self.executor.remove_link(link_id)
 
+    def diff(self, target: dict[str, JsonType]) -> dict[str, JsonType]:
+        """
+        Compute the changes needed to transform this topology into a target topology
+
+        Args:
+            target: a dictionary describing the target topology, in the format returned by serialise.  Nodes may
+                    also specify a properties key, in which case changes to the node's properties are included.
+                    If the metadata key is omitted, the topology's metadata is not changed.
+
+        Returns:
+            a patch to pass to apply_patch, a dictionary with keys:
+                remove_links: a list of the ids of links to remove
+                remove_nodes: a list of the ids of nodes to remove
+                add_nodes: a list of nodes to add, in the format accepted by add_nodes
+                update_nodes: a dictionary mapping from the id of an existing node to a dictionary containing
+                              changed values for keys x, y, metadata and properties
+                add_links: a list of links to add, in the format accepted by add_links
+                metadata: the new metadata for the topology, only present if the target's metadata differs
+
+        Notes:
+            a node whose type has changed is removed and added, along with the links connected to it
+        """
+        target_nodes = target.get("nodes", {})
+        target_links = {link_id: Link.load(link_id, link_content)
+                        for (link_id, link_content) in target.get("links", {}).items()}
+
+        patch = {"remove_links": [], "remove_nodes": [], "add_nodes": [], "update_nodes": {}, "add_links": []}
+
+        replaced_node_ids = set()
+        for node_id in self.network.get_node_ids():
+            target_node = target_nodes.get(node_id, None)
+            if target_node is None:
+                patch["remove_nodes"].append(node_id)
+            elif target_node["node_type"] != self.network.get_node(node_id).get_node_type():
+                patch["remove_nodes"].append(node_id)
+                replaced_node_ids.add(node_id)
+
+        for (node_id, target_node) in target_nodes.items():
+            node = self.network.get_node(node_id)
+            if node is None or node_id in replaced_node_ids:
+                node_spec = {"node_id": node_id, "node_type": target_node["node_type"]}
+                for key in ["x", "y", "metadata", "properties"]:
+                    if target_node.get(key, None) is not None:
+                        node_spec[key] = target_node[key]
+                patch["add_nodes"].append(node_spec)
+            else:
+                updates = {}
+                (x, y) = node.get_xy()
+                for (key, value) in [("x", x), ("y", y), ("metadata", node.get_metadata())]:
+                    if key in target_node and target_node[key] != value:
+                        updates[key] = target_node[key]
+                if "properties" in target_node and target_node["properties"] != self.dsu.get_node_properties(node_id):
+                    updates["properties"] = target_node["properties"]
+                if updates:
+                    patch["update_nodes"][node_id] = updates
+
+        removed_link_ids = set()
+        for link_id in self.network.get_link_ids():
+            link = self.network.get_link(link_id)
+            target_link = target_links.get(link_id, None)
+            if target_link is None or self.__link_changed(link, target_link) \
+                    or link.from_node_id in replaced_node_ids or link.to_node_id in replaced_node_ids:
+                patch["remove_links"].append(link_id)
+                removed_link_ids.add(link_id)
+
+        for (link_id, target_link) in target_links.items():
+            if self.network.get_link(link_id) is None or link_id in removed_link_ids:
+                patch["add_links"].append({"link_id": link_id,
+                                           "from_node_id": target_link.from_node_id, "from_port": target_link.from_port,
+                                           "to_node_id": target_link.to_node_id, "to_port": target_link.to_port})
+
+        # a target which does not specify metadata leaves the topology's metadata unchanged
+        if "metadata" in target and target["metadata"] != self.network.get_metadata():
+            patch["metadata"] = target["metadata"]
+
+        return patch
+
+    @staticmethod
+    def __link_changed(link, target_link):
+        return (link.from_node_id, link.from_port, link.to_node_id, link.to_port) != \
+            (target_link.from_node_id, target_link.from_port, target_link.to_node_id, target_link.to_port)
+
+    def apply_patch(self, patch: dict[str, JsonType]):
+        """
+        Apply a patch to the topology, updating a running topology without restarting nodes that are not affected.
+        Only added nodes, nodes whose properties are updated and nodes downstream of added or removed links
+        are re-executed.
+
+        Args:
+            patch: a dictionary describing the changes to make, in the format returned by diff
+
+        Raises:
+            InvalidNodeError: if a node cannot be removed or added
+            InvalidLinkError: if a link cannot be added
+
+        Notes:
+            if the patch cannot be applied, the nodes, links and metadata are restored to their state
+            before the patch, but changes to node properties are kept
+        """
+        updated_node_ids = []
+        with self.__batch():
+            for link_id in patch.get("remove_links", []):
+                self.remove_link(link_id)
+            for node_id in patch.get("remove_nodes", []):
+                self.remove_node(node_id)
+            # the storage batch is not held while messages are sent to the executor, which may also be writing
+            with self.dsu.batch():
+                for (node_id, updates) in patch.get("update_nodes", {}).items():
+                    if self.network.get_node(node_id) is None:
+                        raise InvalidNodeError(f"Node with id {node_id} does not exist")
+                    if "x" in updates or "y" in updates:
+                        (x, y) = self.network.get_node(node_id).get_xy()
+                        self.network.move_node(node_id, updates.get("x", x), updates.get("y", y))
+                    if "metadata" in updates:
+                        self.network.update_node_metadata(node_id, updates["metadata"])
+                    if "properties" in updates:
+                        self.dsu.set_node_properties(node_id, updates["properties"])
+                        updated_node_ids.append(node_id)
+            self.add_nodes(patch.get("add_nodes", []))
+            self.add_links(patch.get("add_links", []))
+            if "metadata" in patch:
+                self.network.set_metadata(patch["metadata"])
+        self.executor.update_nodes(updated_node_ids)
+
     def get_node_ids(self) -> list[str]:
         """
         Get the ids of all nodes in the topology
@@ -486,8 +832,7 @@ class Topology:
             node_id: the id of the node
             metadata: a dictionary containing the new metadata
         """
-        node = self.network.get_node(node_id)
-        node.update_metadata(metadata)
+        self.network.update_node_metadata(node_id, metadata)
 
     def get_link_ids(self) -> list[str]:
         """
@@ -578,3 +923,9 @@ class Topology:
         """
         self.network.clear()
         self.executor.clear()
+
+    def close(self):
+        """
+        Write any pending changes to the execution folder.  The topology can continue to be used after calling close.
+        """
+        self.network.close()
@@ -33,7 +33,9 @@ from .execution_client import ExecutionClient
 
 class ExecutionManager:
 
-    def __init__(self, network, schema, status_callback, node_execution_callback, execution_folder=".", in_process=True):
+    def __init__(self, network, schema, status_callback, node_execution_callback, execution_folder=".", in_process=True, resource_limits={},
+                 storage="directory", storage_options={}, deduplicate_data=False,
+                 compress_data_threshold=None, compress_data_keys=[], lazy_nodes=False):
         self.network = network
         self.schema = schema
         self.queue = queue.Queue()
@@ -57,6 +59,13 @@ class ExecutionManager:
         self.terminate_on_complete = False
         self.logger = logging.getLogger("remote_graph_executor")
         self.in_process = in_process
+        self.resource_limits = resource_limits
+        self.storage = storage
+        self.storage_options = storage_options
+        self.deduplicate_data = deduplicate_data
+        self.compress_data_threshold = compress_data_threshold
+        self.compress_data_keys = compress_data_keys
+        self.lazy_nodes = lazy_nodes
         self.restarting = False
 
     def is_paused(self):
@@ -151,7 +160,14 @@ class ExecutionManager:
             "execution_folder": self.execution_folder,
             "class_map": self.network.get_schema().get_classmap(),
             "injected_inputs": self.serialise_injected_inputs(),
-            "output_listeners": self.serialise_output_listeners()
+            "output_listeners": self.serialise_output_listeners(),
+            "resource_limits": self.resource_limits,
+            "storage": self.storage,
+            "storage_options": self.storage_options,
+            "deduplicate_data": self.deduplicate_data,
+            "compress_data_threshold": self.compress_data_threshold,
+            "compress_data_keys": self.compress_data_keys,
+            "lazy_nodes": self.lazy_nodes
         }
 
         self.running = True
@@ -371,6 +387,35 @@ class ExecutionManager:
             "loading": loading
         })
 
+    def add_nodes(self, nodes):
+        if nodes:
+            self.send_message({
+                "action": "add_nodes",
+                "nodes": [[node.get_node_id(), node.get_node_type()] for node in nodes]
+            })
+
+    def add_links(self, links):
+        if links:
+            self.send_message({
+                "action": "add_links",
+                "links": [[link.get_link_id(), link.from_node_id, link.from_port, link.to_node_id, link.to_port]
+                          for link in links]
+            })
+
+    def update_nodes(self, node_ids):
+        if node_ids:
+            self.send_message({
+                "action": "update_nodes",
+                "node_ids": node_ids
+            })
+
+    def reload_properties(self, node_ids, property_updates={}):
+        self.send_message({
+            "action": "reload_properties",
+            "node_ids": node_ids,
+            "property_updates": property_updates
+        })
+
     def add_package(self, package_id):
         self.send_message({
             "action": "add_package",
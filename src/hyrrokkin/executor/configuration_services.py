@@ -87,15 +87,16 @@ class ConfigurationServices:
         """
         self.wrapper.set_property(property_name, property_value)
 
-    def get_data(self, key: str) -> typing.Union[bytes, None]:
+    def get_data(self, key: str, mmap: bool = False) -> typing.Union[bytes, memoryview, None]:
         """
         Get binary data (bytes) associated with this package configuration.
 
         :param key: a key to locate the data (can only contain alphanumeric characters and underscores)
+        :param mmap: if True, return a read-only memoryview of the data, mapping the stored file into memory where possible
 
         :return: data or None if no data is associated with the key
         """
-        return self.wrapper.get_data(key)
+        return self.wrapper.get_data(key, mmap)
 
     def set_data(self, key: str, data: typing.Union[bytes, None]):
         """
@@ -106,6 +107,50 @@ class ConfigurationServices:
         """
         self.wrapper.set_data(key, data)
 
+    async def get_data_async(self, key: str, mmap: bool = False) -> typing.Union[bytes, memoryview, None]:
+        """
+        Get binary data (bytes) associated with this package configuration, without blocking nodes while the
+        data is read.
+
+        :param key: a key to locate the data (can only contain alphanumeric characters and underscores)
+        :param mmap: if True, return a read-only memoryview of the data, see get_data
+
+        :return: data or None if no data is associated with the key
+        """
+        return await self.wrapper.get_data_async(key, mmap)
+
+    async def set_data_async(self, key: str, data: typing.Union[bytes, None]):
+        """
+        Set binary data (bytes) associated with this package configuration, without blocking nodes while the
+        data is written.
+
+        :param key: a key to locate the data (can only contain alphanumeric characters and underscores)
+        :param data: binary data (bytes) to be stored (or None to remove previously stored data for this key)
+        """
+        await self.wrapper.set_data_async(key, data)
+
+    def open_data_reader(self, key: str) -> typing.Union[typing.BinaryIO, None]:
+        """
+        Open binary data associated with this package configuration for reading in chunks.
+
+        :param key: a key to locate the data (can only contain alphanumeric characters and underscores)
+
+        :return: a binary file object, which should be closed after use, or None if no data is associated with the key
+        """
+        return self.wrapper.open_data_reader(key)
+
+    def open_data_writer(self, key: str) -> typing.BinaryIO:
+        """
+        Open a binary file object for writing data associated with this package configuration in chunks.
+
+        :param key: a key to locate the data (can only contain alphanumeric characters and underscores)
+
+        :return: a binary file object.  The written data replaces any data previously stored for the key when the
+                 file object is closed.  If the file object is used as a context manager and an exception is raised,
+                 the written data is discarded.
+        """
+        return self.wrapper.open_data_writer(key)
+
     def get_configuration(self, package_id:str) -> typing.Union[None,"ConfigurationBase"]:
         """
         Obtain a configuration object if defined for the specified package.
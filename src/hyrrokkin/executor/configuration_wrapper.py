@@ -54,12 +54,18 @@ class ConfigurationWrapper(Wrapper):
     def set_status(self, state, status_message):
         self.execution_engine.set_status(self.package_id, "configuration", status_message, state)
 
-    def get_data(self, key):
-        return self.get_datastore_utils().get_package_data(self.package_id, key)
+    def get_data(self, key, mmap=False):
+        return self.get_datastore_utils().get_package_data(self.package_id, key, mmap)
 
     def set_data(self, key, data):
         return self.get_datastore_utils().set_package_data(self.package_id, key, data)
 
+    def open_data_reader(self, key):
+        return self.get_datastore_utils().open_package_data(self.package_id, key)
+
+    def open_data_writer(self, key):
+        return self.get_datastore_utils().open_package_data_writer(self.package_id, key)
+
     def get_configuration_wrapper(self, package_id):
         return self.execution_engine.get_configuration_wrapper(package_id)
 
@@ -18,6 +18,7 @@
 #   OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
 
 import asyncio
+import concurrent.futures
 import threading
 import logging
 from collections import defaultdict
@@ -25,6 +26,8 @@ import time
 
 from hyrrokkin.executor.node_execution_states import NodeExecutionStates
 from hyrrokkin.utils.resource_loader import ResourceLoader
+from hyrrokkin.utils.data_store_utils import DataStoreUtils
+from hyrrokkin.storage.storage_factory import StorageFactory
 
 from .graph_link import GraphLink
 from .node_services import NodeServices
@@ -39,7 +42,17 @@ class ExecutionEngine():
                  execution_complete_callback=None,
                  status_callback=None,
                  node_execution_callback=None,
-                 message_callback=None):
+                 message_callback=None,
+                 resource_limits={},
+                 flush_interval=1.0,
+                 storage="directory",
+                 storage_options={},
+                 deduplicate_data=False,
+                 compress_data_threshold=None,
+                 compress_data_keys=[],
+                 io_threads=4,
+                 lazy_nodes=False,
+                 load_limit=8):
         super().__init__()
 
         self.classmap = classmap
@@ -55,12 +68,28 @@ class ExecutionEngine():
         self.status_callback = status_callback
         self.node_execution_callback = node_execution_callback
         self.message_callback = message_callback
+        self.resource_limits = resource_limits # resource-name => capacity
+
+        # property changes made by nodes and configurations are cached, and written when execution is idle,
+        # when the engine is closed or flush_interval seconds after a client message is received
+        self.datastore_utils = DataStoreUtils(execution_folder, write_back=True,
+                                              storage=StorageFactory.create(storage, execution_folder, **storage_options),
+                                              deduplicate=deduplicate_data,
+                                              compress_threshold=compress_data_threshold,
+                                              compress_keys=compress_data_keys)
+        self.flush_interval = flush_interval
+        self.flush_handle = None
+
+        # the async data services run reads and writes on a pool of at most io_threads threads, created when first used
+        self.io_threads = io_threads
+        self.io_executor = None
 
         # new state
         self.node_types = {}  # node-id = > node-type-id
         self.links = {}  # link-id = > GraphLink
         self.out_links = {}  # node-id = > output-port = > [GraphLink]
         self.in_links = {}  # node-id = > input-port = > [GraphLink]
+        self.successors = {}  # node-id => to-node-id => number of links
 
         self.pending_connection_counts = set() # node-id
 
@@ -71,6 +100,10 @@ class ExecutionEngine():
 
         self.executing_tasks = set()
 
+        self.node_resources = {} # node-id => resource-name => amount
+        self.resources_in_use = {} # resource-name => amount
+        self.acquired_resources = {} # node-id => resource-name => amount, for executing nodes
+
         self.lock = threading.Lock()
 
         self.paused = True
@@ -79,6 +112,17 @@ class ExecutionEngine():
         self.is_executing = {}
         self.execution_states = {}
 
+        # node and package configuration instances are loaded concurrently in background tasks, with at most
+        # load_limit loads in progress at once.  Clients and messages for an instance are queued until it is loaded.
+        # In lazy mode, node instances are only loaded when a node is first executed or a client is
+        # opened on it, rather than when the node is added
+        self.lazy_nodes = lazy_nodes
+        self.load_semaphore = asyncio.Semaphore(load_limit)
+        self.unloaded_nodes = {}  # node-id => node-type-id, for nodes registered but not yet loaded
+        self.loading_nodes = {}  # node-id => task loading the node
+        self.load_failures = {}  # node-id => exception raised when the node was loaded
+        self.loading_packages = {}  # package-id => task loading the package configuration
+
         self.pending_node_clients = {}
         self.pending_configuration_clients = {}
         self.pending_node_messages = {}
@@ -120,9 +164,41 @@ class ExecutionEngine():
         else:
             self.pending_connection_counts.add(node_id)
 
+    async def add_nodes(self, nodes):
+        for (node_id, node_type_id) in nodes:
+            await self.register_node(node_id, node_type_id)
+            self.mark_dirty(node_id)
+        self.dispatch()
+
+    async def update_nodes(self, node_ids):
+        # the properties of these nodes have been changed, reload them and re-execute the nodes
+        await self.reload_properties(node_ids)
+        for node_id in node_ids:
+            if self.has_node(node_id):
+                self.mark_dirty(node_id)
+        self.dispatch()
+
+    async def reload_properties(self, node_ids, property_updates={}):
+        # node properties are loaded when a node is registered, and only reloaded when notified of a change
+        # property_updates maps a node id to the changed properties, where the change is known
+        for node_id in node_ids:
+            self.datastore_utils.invalidate_node_properties(node_id, property_updates.get(node_id, None))
+            if node_id in self.node_wrappers:
+                self.node_wrappers[node_id].reload_properties()
+
     async def remove_node(self, node_id):
         if node_id in self.node_wrappers:
             del self.node_wrappers[node_id]
+        if node_id in self.unloaded_nodes:
+            del self.unloaded_nodes[node_id]
+        if node_id in self.loading_nodes:
+            self.loading_nodes.pop(node_id).cancel()
+        if node_id in self.load_failures:
+            del self.load_failures[node_id]
+        was_executing = node_id in self.executing_nodes
+        if was_executing:
+            del self.executing_nodes[node_id]
+            self.release_resources(node_id)
         if node_id in self.node_outputs:
             del self.node_outputs[node_id]
         if node_id in self.dirty_nodes:
@@ -133,8 +209,16 @@ class ExecutionEngine():
             del self.in_links[node_id]
         if node_id in self.out_links:
             del self.out_links[node_id]
+        if node_id in self.successors:
+            del self.successors[node_id]
         if node_id in self.node_types:
             del self.node_types[node_id]
+        if node_id in self.node_resources:
+            del self.node_resources[node_id]
+        # a node added later with the same id must not see this node's cached properties
+        self.datastore_utils.invalidate_node_properties(node_id)
+        if was_executing:
+            self.dispatch()
 
     def get_outputs_from(self, output_node_id):
         input_node_ports = []
@@ -161,17 +245,31 @@ class ExecutionEngine():
         if from_node_id not in self.out_links:
             self.out_links[from_node_id] = defaultdict(list)
         self.out_links[from_node_id][from_port].append(graph_link)
+        if from_node_id not in self.successors:
+            self.successors[from_node_id] = {}
+        self.successors[from_node_id][to_node_id] = self.successors[from_node_id].get(to_node_id,0) + 1
 
         if not loading:
             self.mark_dirty(to_node_id)
             self.dispatch()
 
+    async def add_links(self, links):
+        for (link_id, from_node_id, from_port, to_node_id, to_port) in links:
+            await self.add_link(link_id, from_node_id, from_port, to_node_id, to_port, loading=True)
+            self.mark_dirty(to_node_id)
+        self.dispatch()
+
     async def remove_link(self, link_id):
         link = self.links[link_id]
 
         self.in_links[link.to_node_id][link.to_port].remove(link)
         self.out_links[link.from_node_id][link.from_port].remove(link)
         del self.links[link_id]
+        successors = self.successors.get(link.from_node_id,{})
+        if link.to_node_id in successors:
+            successors[link.to_node_id] -= 1
+            if successors[link.to_node_id] == 0:
+                del successors[link.to_node_id]
 
         self.mark_dirty(link.to_node_id)
         self.dispatch()
@@ -184,6 +282,7 @@ class ExecutionEngine():
 
     async def open_client(self, target_id, target_type, client_id, client_options, client_service_class):
         if target_type == "node":
+            self.start_loading_node(target_id)
             wrapper = self.node_wrappers.get(target_id,None)
             pending = self.pending_node_clients
         elif target_type == "configuration":
@@ -195,6 +294,8 @@ class ExecutionEngine():
 
         if wrapper:
             wrapper.open_client(client_id, client_options, client_service_class)
+        elif target_type == "node" and target_id in self.load_failures:
+            self.logger.error(f"unable to open client on node {target_id} which failed to load")
         else:
             if target_id not in pending:
                 pending[target_id] = []
@@ -213,11 +314,27 @@ class ExecutionEngine():
 
         if wrapper:
             wrapper.recv_message(client_id, *msg)
+            self.schedule_flush()
+        elif target_type == "node" and target_id in self.load_failures:
+            self.logger.error(f"unable to deliver message to node {target_id} which failed to load")
         else:
             if target_id not in pending:
                 pending[target_id] = []
             pending[target_id].append((client_id,msg))
 
+    def get_datastore_utils(self):
+        return self.datastore_utils
+
+    def schedule_flush(self):
+        if self.flush_handle is None:
+            self.flush_handle = asyncio.get_running_loop().call_later(self.flush_interval, self.flush)
+
+    def flush(self):
+        if self.flush_handle is not None:
+            self.flush_handle.cancel()
+            self.flush_handle = None
+        self.datastore_utils.flush()
+
     async def close_client(self, target_id, target_type, client_id):
         if target_type == "node":
             wrapper = self.node_wrappers.get(target_id, None)
@@ -237,6 +354,61 @@ class ExecutionEngine():
                 pending[target_id].remove(client_id)
 
     async def register_node(self, node_id, node_type_id):
+        (package_id, node_type_name) = node_type_id.split(":")
+        resources = self.classmap[package_id].get("resource_requirements",{}).get(node_type_name,{})
+        if resources:
+            self.node_resources[node_id] = resources
+        self.is_executing[node_id] = 0
+        self.unloaded_nodes[node_id] = node_type_id
+        if not self.lazy_nodes:
+            self.start_loading_node(node_id)
+
+    def has_node(self, node_id):
+        return node_id in self.node_wrappers or node_id in self.unloaded_nodes or node_id in self.loading_nodes
+
+    def start_loading_node(self, node_id):
+        # start loading a node in the background if it has not yet been loaded
+        if node_id in self.unloaded_nodes:
+            node_type_id = self.unloaded_nodes.pop(node_id)
+            self.loading_nodes[node_id] = asyncio.create_task(self.__load_node_task(node_id, node_type_id))
+
+    async def __load_node_task(self, node_id, node_type_id):
+        try:
+            # a node's package configuration is loaded before the node
+            package_task = self.loading_packages.get(node_type_id.split(":")[0], None)
+            if package_task is not None:
+                await asyncio.wait([package_task])
+            async with self.load_semaphore:
+                await self.load_node(node_id, node_type_id)
+        except Exception as ex:
+            # the failure is reported when the node is executed, clients and messages can no longer be delivered
+            self.logger.exception(f"Error loading node {node_id}")
+            self.load_failures[node_id] = ex
+            self.pending_node_clients.pop(node_id, None)
+            self.pending_node_messages.pop(node_id, None)
+        finally:
+            if self.loading_nodes.get(node_id) is asyncio.current_task():
+                del self.loading_nodes[node_id]
+
+    async def get_node_wrapper(self, node_id):
+        """
+        Get the wrapper for a node, waiting for the node to be loaded if it has not yet been loaded
+
+        Returns:
+            the wrapper, or None if the node is not registered or was removed while it was being loaded
+
+        Raises:
+            the exception raised when the node was loaded, if loading failed
+        """
+        self.start_loading_node(node_id)
+        if node_id in self.loading_nodes:
+            # the task is cancelled if the node is removed, wait without propagating the cancellation
+            await asyncio.wait([self.loading_nodes[node_id]])
+        if node_id in self.load_failures:
+            raise self.load_failures[node_id]
+        return self.node_wrappers.get(node_id, None)
+
+    async def load_node(self, node_id, node_type_id):
         (package_id, node_type_id) = node_type_id.split(":")
         services = NodeServices(node_id)
         node_wrapper = NodeWrapper(self, self.execution_folder, node_id, services)
@@ -244,18 +416,15 @@ class ExecutionEngine():
             node_wrapper.set_configuration_wrapper(self.configuration_wrappers[package_id])
         classname = self.classmap[package_id]["nodes"][node_type_id]
         cls = ResourceLoader.get_class(classname)
-        try:
-            instance = cls(services)
-            node_wrapper.set_instance(instance)
-            await node_wrapper.load()
-        except Exception as ex:
-            print(ex)
+        # node classes are checked when first used rather than when the schema is loaded
+        if not hasattr(cls, "run"):
+            raise Exception(f"Node class {classname} does not have the required run method")
+        instance = cls(services)
+        node_wrapper.set_instance(instance)
+        await node_wrapper.load()
 
         self.node_wrappers[node_id] = node_wrapper
 
-        self.is_executing[node_id] = 0
-        # self.set_node_execution_state(node_id, NodeExecutionStates.pending.value)
-
         if node_id in self.pending_node_clients:
             for (client_id, client_options, client_service_class) in self.pending_node_clients[node_id]:
                node_wrapper.open_client(client_id, client_options, client_service_class)
@@ -267,6 +436,19 @@ class ExecutionEngine():
             del self.pending_node_messages[node_id]
 
     async def register_package(self, package_id):
+        self.loading_packages[package_id] = asyncio.create_task(self.__load_package_task(package_id))
+
+    async def __load_package_task(self, package_id):
+        try:
+            async with self.load_semaphore:
+                await self.load_package(package_id)
+        except Exception:
+            self.logger.exception(f"Error loading configuration for package {package_id}")
+        finally:
+            if self.loading_packages.get(package_id) is asyncio.current_task():
+                del self.loading_packages[package_id]
+
+    async def load_package(self, package_id):
         classname = self.classmap.get(package_id,{}).get("configuration","")
         if not classname:
             return
@@ -296,25 +478,27 @@ class ExecutionEngine():
         return len(self.executing_nodes)
 
     def mark_dirty(self, node_id):
+        # mark the node and all downstream nodes as dirty, visiting nodes depth first using an explicit stack
+        # nodes that are already dirty are not expanded, so each node is visited at most once
+        pending = [node_id]
+        while pending:
+            node_id = pending.pop()
+            if node_id in self.dirty_nodes:
+                continue
 
-        if node_id in self.dirty_nodes:
-            return
-
-        self.dirty_nodes[node_id] = True
-
-        if node_id in self.executed_nodes:
-            del self.executed_nodes[node_id]
-        if node_id in self.failed_nodes:
-            del self.failed_nodes[node_id]
+            self.dirty_nodes[node_id] = True
 
-        self.set_node_execution_state(node_id, NodeExecutionStates.pending.value)
-        self.reset_execution(node_id)
+            if node_id in self.executed_nodes:
+                del self.executed_nodes[node_id]
+            if node_id in self.failed_nodes:
+                del self.failed_nodes[node_id]
 
-        # mark all downstream nodes as dirty
+            self.set_node_execution_state(node_id, NodeExecutionStates.pending.value)
+            self.reset_execution(node_id)
 
-        outputs = self.get_outputs_from(node_id)
-        for (to_node_id, _) in outputs:
-            self.mark_dirty(to_node_id)
+            # push successors in reverse so that they are popped in link order
+            successors = self.successors.get(node_id,{})
+            pending.extend(reversed(successors.keys()))
 
     def dispatch(self):
         if self.paused:
@@ -327,20 +511,23 @@ class ExecutionEngine():
 
         if launch_limit > 0:
             for node_id in self.dirty_nodes:
-                if self.can_execute(node_id):
-                    launch_nodes.append(node_id)
+                # nodes which do not fit into the resource pools are skipped, allowing
+                # other ready nodes to be launched in their place
+                if self.can_execute(node_id) and self.can_acquire_resources(node_id):
+                    launch_nodes.append((node_id, self.acquire_resources(node_id)))
 
                 if len(launch_nodes) >= launch_limit:
                     break
 
-        for node_id in launch_nodes:
+        for (node_id, acquired) in launch_nodes:
             del self.dirty_nodes[node_id]
             self.executing_nodes[node_id] = True
-            task = asyncio.create_task(self.execute(node_id))
+            task = asyncio.create_task(self.execute(node_id, acquired))
             task.add_done_callback(self.executing_tasks.discard)
             self.executing_tasks.add(task)
 
         if len(self.executing_nodes) == 0:
+            self.flush()
             if self.execution_complete_callback:
                 self.execution_complete_callback()
 
@@ -352,6 +539,37 @@ class ExecutionEngine():
                 return False
         return True
 
+    def can_acquire_resources(self, node_id):
+        for (resource_name, amount) in self.node_resources.get(node_id,{}).items():
+            if resource_name not in self.resource_limits:
+                continue # pools without a declared capacity are unbounded
+            in_use = self.resources_in_use.get(resource_name,0)
+            # a node requiring more than the pool's capacity may still run, but only when the pool is otherwise idle
+            if in_use > 0 and in_use + amount > self.resource_limits[resource_name]:
+                return False
+        return True
+
+    def acquire_resources(self, node_id):
+        # each execution acquires a new dictionary, which identifies the resources held by that execution
+        acquired = dict(self.node_resources.get(node_id,{}))
+        self.acquired_resources[node_id] = acquired
+        for (resource_name, amount) in acquired.items():
+            self.resources_in_use[resource_name] = self.resources_in_use.get(resource_name,0) + amount
+        return acquired
+
+    def is_current_execution(self, node_id, acquired):
+        # an execution abandoned when its node was removed is no longer current, even if the node was added again
+        return self.acquired_resources.get(node_id) is acquired
+
+    def release_resources(self, node_id, acquired=None):
+        if acquired is not None and not self.is_current_execution(node_id, acquired):
+            return # already released, leave any resources acquired by a later execution
+        resources = self.acquired_resources.pop(node_id,{})
+        for (resource_name, amount) in resources.items():
+            self.resources_in_use[resource_name] = self.resources_in_use.get(resource_name,0) - amount
+            if self.resources_in_use[resource_name] <= 0:
+                del self.resources_in_use[resource_name]
+
     def pre_execute(self, node_id):
         inputs = {}
         # collect together the input values at each input port
@@ -372,26 +590,35 @@ class ExecutionEngine():
 
         return inputs
 
-    async def execute(self, node_id):
+    async def execute(self, node_id, acquired):
         inputs = self.pre_execute(node_id)
         try:
-            node_wrapper = self.node_wrappers[node_id]
-            node_wrapper.reload_properties()
+            node_wrapper = await self.get_node_wrapper(node_id)
+            if node_wrapper is None:
+                return # the node was removed before it was loaded
             self.set_node_execution_state(node_id, NodeExecutionStates.executing.value)
             results = await node_wrapper.execute(inputs)
             if results is None:
                 results = {}
+            if not self.is_current_execution(node_id, acquired):
+                return # the node was removed while executing
             self.set_node_execution_state(node_id, NodeExecutionStates.executed.value)
             self.post_execute(node_id, results, None)
         except Exception as ex:
+            if not self.is_current_execution(node_id, acquired):
+                return
             self.set_node_execution_state(node_id, NodeExecutionStates.failed.value, ex)
             self.post_execute(node_id, None, ex)
+        finally:
+            # resources are released even if the execution is abandoned or cancelled
+            self.release_resources(node_id, acquired)
 
         self.dispatch()
 
     def post_execute(self, node_id, result, exn):
         if node_id in self.executing_nodes:
             del self.executing_nodes[node_id]
+            self.release_resources(node_id)
         if node_id in self.node_outputs:
             del self.node_outputs[node_id]
         if exn is not None:
@@ -410,7 +637,9 @@ class ExecutionEngine():
 
 
     def reset_execution(self, node_id):
-        self.node_wrappers[node_id].reset_execution()
+        # nodes which have not been loaded have nothing to reset
+        if node_id in self.node_wrappers:
+            self.node_wrappers[node_id].reset_execution()
 
     # called in the loop from node
     def request_execution(self, node_id):
@@ -419,13 +648,17 @@ class ExecutionEngine():
 
     def get_node_property(self, node_id, property_name):
         if node_id in self.node_wrappers:
-            return self.node_wrappers[node_id].get_property(property_name)
+            return self.node_wrappers[node_id].get_property(property_name, None)
+        elif self.has_node(node_id):
+            return self.datastore_utils.get_node_property(node_id, property_name)
         else:
             return None
 
     def set_node_property(self, node_id, property_name, property_value):
         if node_id in self.node_wrappers:
             self.node_wrappers[node_id].set_property(property_name, property_value)
+        elif self.has_node(node_id):
+            self.datastore_utils.set_node_property(node_id, property_name, property_value)
 
     def get_package_property(self, package_id, property_name):
         if package_id in self.configuration_wrappers:
@@ -456,7 +689,16 @@ class ExecutionEngine():
     def count_failed(self):
         return len(self.failed_nodes)
 
+    async def run_io(self, fn, *args):
+        if self.io_executor is None:
+            self.io_executor = concurrent.futures.ThreadPoolExecutor(max_workers=self.io_threads,
+                                                                     thread_name_prefix="hyrrokkin-io")
+        return await asyncio.get_running_loop().run_in_executor(self.io_executor, fn, *args)
+
     def close(self):
+        for task in list(self.loading_nodes.values()) + list(self.loading_packages.values()):
+            task.cancel()
+
         for node_id in self.node_wrappers:
             self.node_wrappers[node_id].close()
 
@@ -467,6 +709,13 @@ class ExecutionEngine():
 
         self.configuration_wrappers = {}
 
+        if self.io_executor is not None:
+            self.io_executor.shutdown()
+            self.io_executor = None
+
+        self.flush()
+        self.datastore_utils.get_storage().close()
+
 
 
 
@@ -93,6 +93,14 @@ class RemoteExecutionWorker:
         elif action == "add_link":
             await self.engine.add_link(control_packet["link_id"],control_packet["from_node_id"],control_packet["from_port"],
                                          control_packet["to_node_id"], control_packet["to_port"], control_packet["loading"])
+        elif action == "add_nodes":
+            await self.engine.add_nodes(control_packet["nodes"])
+        elif action == "add_links":
+            await self.engine.add_links(control_packet["links"])
+        elif action == "update_nodes":
+            await self.engine.update_nodes(control_packet["node_ids"])
+        elif action == "reload_properties":
+            await self.engine.reload_properties(control_packet["node_ids"], control_packet.get("property_updates", {}))
         elif action == "pause":
             self.engine.pause()
         elif action == "resume":
@@ -153,6 +161,13 @@ class RemoteExecutionWorker:
         self.class_map = control_packet["class_map"]
         injected_inputs = control_packet["injected_inputs"]
         output_listeners = control_packet["output_listeners"]
+        resource_limits = control_packet.get("resource_limits",{})
+        storage = control_packet.get("storage","directory")
+        storage_options = control_packet.get("storage_options",{})
+        deduplicate_data = control_packet.get("deduplicate_data",False)
+        compress_data_threshold = control_packet.get("compress_data_threshold",None)
+        compress_data_keys = control_packet.get("compress_data_keys",[])
+        lazy_nodes = control_packet.get("lazy_nodes",False)
         for [node_id, input_port, value] in injected_inputs:
             self.injected_inputs[(node_id, input_port)] = value
 
@@ -163,7 +178,14 @@ class RemoteExecutionWorker:
                                       execution_complete_callback=lambda: self.execution_complete(),
                                       status_callback=lambda *args: self.set_status(*args),
                                       node_execution_callback=lambda *args: self.set_node_execution_state(*args),
-                                      message_callback=lambda *args: self.send_client_message(*args))
+                                      message_callback=lambda *args: self.send_client_message(*args),
+                                      resource_limits=resource_limits,
+                                      storage=storage,
+                                      storage_options=storage_options,
+                                      deduplicate_data=deduplicate_data,
+                                      compress_data_threshold=compress_data_threshold,
+                                      compress_data_keys=compress_data_keys,
+                                      lazy_nodes=lazy_nodes)
 
 
 
@@ -117,17 +117,19 @@ class NodeServices:
         """
         self.wrapper.set_property(property_name, property_value)
 
-    def get_data(self, key:str) -> typing.Union[bytes,None]:
+    def get_data(self, key:str, mmap:bool=False) -> typing.Union[bytes,memoryview,None]:
         """
         Get binary data (bytes) associated with this node.
 
         Args:
             key: a key to locate the data (can only contain alphanumeric characters and underscores)
+            mmap: if True, return a read-only memoryview of the data.  Where the data is stored in a file, the file
+                  is mapped into memory rather than read, so that large data is shared via the page cache.
 
         Returns:
             data or None if no data is associated with the key
         """
-        return self.wrapper.get_data(key)
+        return self.wrapper.get_data(key, mmap)
 
     def set_data(self, key:str, data:typing.Union[bytes,None]):
         """
@@ -139,6 +141,55 @@ class NodeServices:
         """
         self.wrapper.set_data(key, data)
 
+    async def get_data_async(self, key:str, mmap:bool=False) -> typing.Union[bytes,memoryview,None]:
+        """
+        Get binary data (bytes) associated with this node, without blocking other nodes while the data is read.
+
+        Args:
+            key: a key to locate the data (can only contain alphanumeric characters and underscores)
+            mmap: if True, return a read-only memoryview of the data, see get_data
+
+        Returns:
+            data or None if no data is associated with the key
+        """
+        return await self.wrapper.get_data_async(key, mmap)
+
+    async def set_data_async(self, key:str, data:typing.Union[bytes,None]):
+        """
+        Set binary data (bytes) associated with this node, without blocking other nodes while the data is written.
+
+        Args:
+            key: a key to locate the data (can only contain alphanumeric characters and underscores)
+            data: binary data (bytes) to be stored (or None to remove previously stored data for this key)
+        """
+        await self.wrapper.set_data_async(key, data)
+
+    def open_data_reader(self, key:str) -> typing.Union[typing.BinaryIO,None]:
+        """
+        Open binary data associated with this node for reading in chunks.
+
+        Args:
+            key: a key to locate the data (can only contain alphanumeric characters and underscores)
+
+        Returns:
+            a binary file object, which should be closed after use, or None if no data is associated with the key
+        """
+        return self.wrapper.open_data_reader(key)
+
+    def open_data_writer(self, key:str) -> typing.BinaryIO:
+        """
+        Open a binary file object for writing data associated with this node in chunks.
+
+        Args:
+            key: a key to locate the data (can only contain alphanumeric characters and underscores)
+
+        Returns:
+            a binary file object.  The written data replaces any data previously stored for the key when the file
+            object is closed.  If the file object is used as a context manager and an exception is raised,
+            the written data is discarded.
+        """
+        return self.wrapper.open_data_writer(key)
+
     def get_configuration(self, package_id:str=None) -> typing.Union[None,"ConfigurationBase"]:
         """
         Obtain a configuration object if defined for the node's package.
@@ -87,12 +87,18 @@ class NodeWrapper(Wrapper):
     def reload_properties(self):
         self.properties = self.get_datastore_utils().get_node_properties(self.node_id)
 
-    def get_data(self, key):
-        return self.get_datastore_utils().get_node_data(self.node_id, key)
+    def get_data(self, key, mmap=False):
+        return self.get_datastore_utils().get_node_data(self.node_id, key, mmap)
 
     def set_data(self, key, data):
         self.get_datastore_utils().set_node_data(self.node_id, key, data)
 
+    def open_data_reader(self, key):
+        return self.get_datastore_utils().open_node_data(self.node_id, key)
+
+    def open_data_writer(self, key):
+        return self.get_datastore_utils().open_node_data_writer(self.node_id, key)
+
     def set_configuration_wrapper(self, configuration_wrapper):
         self.configuration_wrapper = configuration_wrapper
 
@@ -20,14 +20,14 @@
 import logging
 
 from hyrrokkin.utils.resource_loader import ResourceLoader
-from hyrrokkin.utils.data_store_utils import DataStoreUtils
 
 class Wrapper:
 
     def __init__(self, execution_engine, execution_folder):
         self.execution_engine = execution_engine
         self.execution_folder = execution_folder
-        self.datastore_utils = DataStoreUtils(self.execution_folder)
+        # shared between all wrappers, so that property changes are cached and written by the engine
+        self.datastore_utils = execution_engine.get_datastore_utils()
         self.instance = None
         self.client_services = {}
         self.logger = logging.getLogger("NodeWrapper")
@@ -41,6 +41,12 @@ class Wrapper:
     def get_datastore_utils(self):
         return self.datastore_utils
 
+    async def get_data_async(self, key, mmap=False):
+        return await self.execution_engine.run_io(self.get_data, key, mmap)
+
+    async def set_data_async(self, key, data):
+        await self.execution_engine.run_io(self.set_data, key, data)
+
     async def load(self):
         if self.instance is not None and hasattr(self.instance, "load"):
             await self.instance.load()
@@ -25,20 +25,67 @@ import zipfile
 import json
 import io
 import shutil
+import time
+from collections import deque
+from contextlib import contextmanager
 
 from hyrrokkin.model.node import Node as Node
 from hyrrokkin.model.link import Link as Link
+from hyrrokkin.model.snapshot import Snapshot
+from hyrrokkin.exceptions.invalid_link_error import InvalidLinkError
+from hyrrokkin.storage.directory_storage import DirectoryStorage
+
+# leading bytes of file formats which are already compressed and are stored uncompressed in exported zip files
+COMPRESSED_SIGNATURES = [
+    b"\x1f\x8b",  # gzip
+    b"PK\x03\x04",  # zip
+    b"BZh",  # bzip2
+    b"\xfd7zXZ\x00",  # xz
+    b"\x28\xb5\x2f\xfd",  # zstandard
+    b"7z\xbc\xaf\x27\x1c",  # 7-zip
+    b"\x89PNG",  # png
+    b"\xff\xd8\xff",  # jpeg
+    b"RIFF",  # webp and other RIFF containers
+]
 
 class Network:
 
-    def __init__(self, schema, savedir):
+    def __init__(self, schema, savedir, use_journal=False, journal_compaction_limit=1000, use_snapshot=False,
+                 storage=None):
         self.schema = schema
         self.savedir = savedir
+        # the backend holding node and package properties and data, which are included in zip files
+        self.storage = storage if storage is not None else DirectoryStorage(savedir)
         self.nodes = {}
         self.links = {}
+        self.in_links = {}  # node-id => input-port => link-id => Link
+        self.out_links = {}  # node-id => output-port => link-id => Link
+        self.topological_order = None  # cached list of node ids, reset when nodes or links change
+        # reachability index, the ancestors and descendants of each node (including the node itself) are
+        # represented as bitsets (python ints) and computed on demand
+        self.node_bits = {}  # node-id => int with a single bit set
+        self.bit_node_ids = []  # bit position => node-id
+        self.ancestors = {}  # node-id => bitset
+        self.descendants = {}  # node-id => bitset
         self.metadata = {}
         self.logger = logging.getLogger("network")
         self.tempdir = None
+        self.batch_depth = 0  # number of nested batch contexts currently open
+        self.batch_modified = False  # set if a save was deferred in the current batch
+        # when use_journal is set, edits are appended to a journal file rather than rewriting topology.json
+        # the journal is compacted into topology.json once it holds journal_compaction_limit records
+        self.use_journal = use_journal
+        self.journal_path = os.path.join(self.savedir, "topology.journal")
+        self.journal_compaction_limit = journal_compaction_limit
+        self.journal_length = 0
+        self.pending_records = []  # journal records deferred in the current batch
+        self.replaying = False
+        self.reloading = False  # set while reloading the network after a failed batch
+        # when use_snapshot is set, a binary snapshot is written alongside topology.json and is used by load_dir
+        self.use_snapshot = use_snapshot
+        self.snapshot_path = os.path.join(self.savedir, "topology.snapshot")
+        # copies of zip files loaded with lazy_data set, removed when no data remains to be extracted from them
+        self.archive_folder = os.path.join(self.savedir, "archives")
 
     def __del__(self):
         if self.tempdir is not None:
@@ -50,78 +97,216 @@ class Network:
     def get_directory(self):
         return self.savedir
 
+    @contextmanager
+    def batch(self):
+        """
+        Defer saving the network until the outermost batch context exits, so that a sequence
+        of edits results in a single write.  If the outermost batch context exits with an exception,
+        the edits are discarded and the network is reloaded from its last saved state.
+        """
+        self.batch_depth += 1
+        try:
+            yield self
+        except BaseException:
+            self.batch_depth -= 1
+            if self.batch_depth == 0 and not self.reloading:
+                self.__reload()
+            raise
+        else:
+            self.batch_depth -= 1
+            if self.batch_depth == 0:
+                if self.pending_records:
+                    self.__write_journal()
+                if self.batch_modified:
+                    self.__save_dir()
+
     def get_schema(self):
         return self.schema
 
     def add_node(self, node):
         node_id = node.get_node_id()
         self.nodes[node_id] = node
-        self.__save_dir()
+        if node_id not in self.node_bits:
+            self.node_bits[node_id] = 1 << len(self.bit_node_ids)
+            self.bit_node_ids.append(node_id)
+        self.topological_order = None
+        self.__record({"action": "add_node", "node_id": node_id, "node": node.save()})
 
     def move_node(self, node_id, x, y):
         self.nodes[node_id].move_to(x, y)
-        self.__save_dir()
+        self.__record({"action": "move_node", "node_id": node_id, "x": x, "y": y})
+
+    def update_node_metadata(self, node_id, metadata):
+        self.nodes[node_id].update_metadata(metadata)
+        self.__record({"action": "update_node_metadata", "node_id": node_id, "metadata": metadata})
 
     def get_node(self, node_id):
         return self.nodes.get(node_id, None)
 
     def get_connection_counts(self, node_id):
         new_counts = {"inputs": {}, "outputs": {}}
-        for link in self.links.values():
-            if link.from_node_id == node_id:
-                if link.from_port not in new_counts["outputs"]:
-                    new_counts["outputs"][link.from_port] = 0
-                new_counts["outputs"][link.from_port] = new_counts["outputs"][link.from_port] + 1
-            if link.to_node_id == node_id:
-                if link.to_port not in new_counts["inputs"]:
-                    new_counts["inputs"][link.to_port] = 0
-                new_counts["inputs"][link.to_port] = new_counts["inputs"][link.to_port] + 1
+        for (output_port, port_links) in self.out_links.get(node_id, {}).items():
+            new_counts["outputs"][output_port] = len(port_links)
+        for (input_port, port_links) in self.in_links.get(node_id, {}).items():
+            new_counts["inputs"][input_port] = len(port_links)
         return new_counts
 
     def get_node_ids(self, traversal_order=None):
         if traversal_order is None:
             return list(self.nodes.keys())
         else:
-            ordered_node_ids = []
-            node_ids = list(self.nodes.keys())
-            while len(node_ids):
-                for node_id in node_ids:
-                    schedule = True
-                    for link in self.links.values():
-                        if link.to_node_id == node_id and link.from_node_id not in ordered_node_ids:
-                            schedule = False
-                            break
-                    if schedule:
-                        ordered_node_ids.append(node_id)
-                        node_ids.remove(node_id)
+            if self.topological_order is None:
+                self.topological_order = self.__compute_topological_order()
+            ordered_node_ids = list(self.topological_order)
             if traversal_order == False:
                 ordered_node_ids.reverse()
             return ordered_node_ids
 
+    def __compute_topological_order(self):
+        # Kahn's algorithm, nodes with no remaining upstream nodes are scheduled in the order they were added
+        in_degrees = {node_id: 0 for node_id in self.nodes}
+        for (node_id, node_in_links) in self.in_links.items():
+            if node_id in in_degrees:
+                for port_links in node_in_links.values():
+                    for link in port_links.values():
+                        if link.from_node_id in self.nodes:
+                            in_degrees[node_id] += 1
+
+        ordered_node_ids = []
+        ready = deque(node_id for (node_id, in_degree) in in_degrees.items() if in_degree == 0)
+        while ready:
+            node_id = ready.popleft()
+            ordered_node_ids.append(node_id)
+            for port_links in self.out_links.get(node_id, {}).values():
+                for link in port_links.values():
+                    if link.to_node_id in in_degrees:
+                        in_degrees[link.to_node_id] -= 1
+                        if in_degrees[link.to_node_id] == 0:
+                            ready.append(link.to_node_id)
+
+        if len(ordered_node_ids) < len(self.nodes):
+            cycle_node_ids = ",".join(node_id for (node_id, in_degree) in in_degrees.items() if in_degree > 0)
+            raise InvalidLinkError(f"topology contains a cycle involving nodes ({cycle_node_ids})")
+        return ordered_node_ids
+
     def get_node_ids_to(self, node_id):
-        pred_node_ids = {node_id}
-        for link in self.links.values():
-            if link.to_node_id == node_id:
-                node_ids = self.get_node_ids_to(link.from_node_id)
-                for pred_node_id in node_ids:
-                    pred_node_ids.add(pred_node_id)
-        return list(pred_node_ids)
+        if node_id not in self.nodes:
+            return [node_id]
+        return self.__decode_bits(self.__get_ancestors(node_id))
 
     def get_node_ids_from(self, node_id):
-        succ_node_ids = {node_id}
-        for link in self.links.values():
-            if link.from_node_id == node_id:
-                node_ids = self.get_node_ids_from(link.to_node_id)
-                for succ_node_id in node_ids:
-                    succ_node_ids.add(succ_node_id)
-        return list(succ_node_ids)
+        if node_id not in self.nodes:
+            return [node_id]
+        return self.__decode_bits(self.__get_descendants(node_id))
+
+    def is_reachable(self, from_node_id, to_node_id):
+        """
+        Return True if to_node_id is from_node_id or is downstream of from_node_id
+        """
+        if from_node_id == to_node_id:
+            return True
+        if from_node_id not in self.nodes or to_node_id not in self.nodes:
+            return False
+        # avoid searching where the answer is obvious, for example when adding links to new nodes
+        if from_node_id not in self.out_links or to_node_id not in self.in_links:
+            return False
+        if from_node_id in self.descendants:
+            return (self.descendants[from_node_id] & self.node_bits[to_node_id]) != 0
+        # the index is reset by each edit, so search downstream rather than rebuild it for every new link
+        visited = {from_node_id}
+        stack = [from_node_id]
+        while stack:
+            for port_links in self.out_links.get(stack.pop(), {}).values():
+                for link in port_links.values():
+                    neighbour_id = link.to_node_id
+                    if neighbour_id == to_node_id:
+                        return True
+                    if neighbour_id not in visited and neighbour_id in self.nodes:
+                        visited.add(neighbour_id)
+                        stack.append(neighbour_id)
+        return False
+
+    def __get_ancestors(self, node_id):
+        return self.__get_reachable(node_id, self.ancestors, self.in_links, lambda link: link.from_node_id)
+
+    def __get_descendants(self, node_id):
+        return self.__get_reachable(node_id, self.descendants, self.out_links, lambda link: link.to_node_id)
+
+    def __get_reachable(self, node_id, reachable, link_index, get_neighbour_id):
+        # compute the reachable bitset for node_id and any neighbours not already in the index,
+        # using an explicit stack to visit neighbours before the node that depends on them
+        if node_id in reachable:
+            return reachable[node_id]
+        in_progress = set()
+        stack = [(node_id, False)]
+        while stack:
+            (current_node_id, expanded) = stack.pop()
+            if current_node_id in reachable:
+                continue
+            neighbour_ids = []
+            for port_links in link_index.get(current_node_id, {}).values():
+                for link in port_links.values():
+                    neighbour_id = get_neighbour_id(link)
+                    if neighbour_id in self.nodes:
+                        neighbour_ids.append(neighbour_id)
+            if expanded:
+                bits = self.node_bits[current_node_id]
+                for neighbour_id in neighbour_ids:
+                    # a neighbour may not yet be indexed only if the graph contains a cycle
+                    bits |= reachable.get(neighbour_id, self.node_bits[neighbour_id])
+                reachable[current_node_id] = bits
+            elif current_node_id not in in_progress:
+                in_progress.add(current_node_id)
+                stack.append((current_node_id, True))
+                for neighbour_id in neighbour_ids:
+                    if neighbour_id not in reachable:
+                        stack.append((neighbour_id, False))
+        return reachable[node_id]
+
+    def __decode_bits(self, bits):
+        node_ids = []
+        # reverse the binary representation so that string positions correspond to bit positions
+        digits = bin(bits)[:1:-1]
+        idx = digits.find("1")
+        while idx >= 0:
+            node_ids.append(self.bit_node_ids[idx])
+            idx = digits.find("1", idx + 1)
+        return node_ids
+
+    def __reset_reachability(self):
+        self.ancestors = {}
+        self.descendants = {}
 
     def add_link(self, link):
         link_id = link.get_link_id()
+        if link_id in self.links:
+            self.__unindex_link(self.links[link_id])
         self.links[link_id] = link
-        self.__save_dir()
+        self.__index_link(link)
+        self.topological_order = None
+        self.__reset_reachability()
+        self.__record({"action": "add_link", "link_id": link_id, "link": link.save()})
         return link
 
+    def __index_link(self, link):
+        link_id = link.get_link_id()
+        self.out_links.setdefault(link.from_node_id, {}).setdefault(link.from_port, {})[link_id] = link
+        self.in_links.setdefault(link.to_node_id, {}).setdefault(link.to_port, {})[link_id] = link
+
+    def __unindex_link(self, link):
+        link_id = link.get_link_id()
+        for (index, node_id, port) in [(self.out_links, link.from_node_id, link.from_port),
+                                       (self.in_links, link.to_node_id, link.to_port)]:
+            node_links = index.get(node_id, {})
+            port_links = node_links.get(port, {})
+            if link_id in port_links:
+                del port_links[link_id]
+                # remove empty entries so that the indexes only record connected ports
+                if not port_links:
+                    del node_links[port]
+                    if not node_links:
+                        del index[node_id]
+
     def get_link(self, link_id):
         return self.links.get(link_id,None)
 
@@ -130,7 +315,7 @@ class Network:
 
     def set_metadata(self, metadata):
         self.metadata = deepcopy(metadata)
-        self.__save_dir()
+        self.__record({"action": "set_metadata", "metadata": self.metadata})
 
     def get_metadata(self):
         return deepcopy(self.metadata)
@@ -138,6 +323,8 @@ class Network:
     def remove_node(self, node_id):
         if node_id in self.nodes:
             del self.nodes[node_id]
+            self.topological_order = None
+            self.__reset_reachability()
         for dirpath in [self.tempdir, self.savedir]:
             if dirpath is not None:
                 file_storage = os.path.join(dirpath,"files",node_id)
@@ -146,17 +333,28 @@ class Network:
                         shutil.rmtree(file_storage)
                     except:
                         self.logger.exception(f"Unable to remove directory {file_storage} when removing node")
-        self.__save_dir()
+        self.__record({"action": "remove_node", "node_id": node_id})
 
     def remove_link(self, link_id):
         if link_id in self.links:
+            self.__unindex_link(self.links[link_id])
             del self.links[link_id]
-        self.__save_dir()
+            self.topological_order = None
+            self.__reset_reachability()
+        self.__record({"action": "remove_link", "link_id": link_id})
 
     def clear(self):
         self.nodes = {}
         self.links = {}
-        self.__save_dir()
+        self.in_links = {}
+        self.out_links = {}
+        self.topological_order = None
+        self.node_bits = {}
+        self.bit_node_ids = []
+        self.__reset_reachability()
+        self.__record({"action": "clear"})
+        if not self.replaying:
+            self.storage.remove_unused_archives(self.archive_folder)
 
     def get_input_ports(self, node_id):
         node = self.nodes.get(node_id,None)
@@ -182,60 +380,71 @@ class Network:
 
     def get_inputs_to(self, node_id, input_port_name=None):
         inputs = []
-        for link in self.links.values():
-            if link.to_node_id == node_id and (input_port_name is None or link.to_port == input_port_name):
+        node_in_links = self.in_links.get(node_id, {})
+        if input_port_name is None:
+            port_links_list = node_in_links.values()
+        else:
+            port_links_list = [node_in_links.get(input_port_name, {})]
+        for port_links in port_links_list:
+            for link in port_links.values():
                 inputs.append((link.from_node_id, link.from_port))
         return inputs
 
     def get_outputs_from(self, node_id, output_port_name=None):
         outputs = []
-        for link in self.links.values():
-            if link.from_node_id == node_id and (output_port_name is None or link.from_port == output_port_name):
+        node_out_links = self.out_links.get(node_id, {})
+        if output_port_name is None:
+            port_links_list = node_out_links.values()
+        else:
+            port_links_list = [node_out_links.get(output_port_name, {})]
+        for port_links in port_links_list:
+            for link in port_links.values():
                 outputs.append((link.to_node_id, link.to_port))
         return outputs
 
     def get_terminal_nodes(self):
-        node_ids = set(self.nodes.keys())
-        for link in self.links.values():
-            node_ids.remove(link.from_node_id)
-        return node_ids
+        return set(node_id for node_id in self.nodes if node_id not in self.out_links)
 
     def load(self, from_dict, node_renamings):
+        with self.batch():
+            return self.__load(from_dict, node_renamings)
+
+    def __load(self, from_dict, node_renamings):
+        nodes = [Node.load(node_id, node_content["node_type"], node_content)
+                 for (node_id, node_content) in from_dict.get("nodes", {}).items()]
+        links = [Link.load(link_id, link_content) for (link_id, link_content) in from_dict.get("links", {}).items()]
+        return self.__add_loaded(nodes, links, from_dict.get("metadata", {}), node_renamings)
+
+    def __add_loaded(self, nodes, links, new_metadata, node_renamings):
 
         added_node_ids = []
         added_link_ids = []
 
-        nodes = from_dict.get("nodes", {})
-
-        for (node_id, node_content) in nodes.items():
+        for node in nodes:
+            node_id = node.get_node_id()
             # check for collision with existing node ids, rename if necessary
             if node_id in self.nodes and node_id not in node_renamings:
                 node_renamings[node_id] = "n"+str(uuid.uuid4())
 
-            renamed = node_id in node_renamings
-            node_id = node_renamings.get(node_id,node_id)
-
-            added_node_ids.append(node_id)
-            node = Node.load(node_id, node_content["node_type"], node_content)
-            if renamed:
+            if node_id in node_renamings:
+                node.node_id = node_renamings[node_id]
                 node.x += 100
                 node.y += 100
+
+            added_node_ids.append(node.get_node_id())
             self.add_node(node)
 
-        link_renamings = {}
-        links = from_dict.get("links", {})
-        for (link_id, link_content) in links.items():
+        for link in links:
             # check for collision with existing links ids, rename if necessary
-            if link_id in self.links:
-                link_renamings[link_id] = "l"+str(uuid.uuid4())
-                link_id = link_renamings[link_id]
-            added_link_ids.append(link_id)
-            link = Link.load(link_id, link_content, node_renamings)
+            if link.get_link_id() in self.links:
+                link.link_id = "l"+str(uuid.uuid4())
+            link.from_node_id = node_renamings.get(link.from_node_id, link.from_node_id)
+            link.to_node_id = node_renamings.get(link.to_node_id, link.to_node_id)
+            added_link_ids.append(link.get_link_id())
             self.add_link(link)
 
         # do not overwrite existing metadata...
         metadata = self.get_metadata()
-        new_metadata = from_dict.get("metadata", {})
         for key in new_metadata:
             if key not in metadata:
                 metadata[key] = new_metadata[key]
@@ -243,10 +452,27 @@ class Network:
 
         return (added_node_ids, added_link_ids, node_renamings)
 
-    def load_zip(self, f, merging=False):
+    def load_zip(self, f, merging=False, lazy_data=False):
+        # topology.json will be overwritten, make sure it is not combined with a journal of earlier edits
+        if os.path.exists(self.journal_path):
+            self.compact()
+        # any snapshot describes the topology before the zip file's topology.json is extracted
+        if os.path.exists(self.snapshot_path):
+            os.remove(self.snapshot_path)
         node_renamings = {}
+        if lazy_data:
+            # keep a copy of the zip file, node and package data files are extracted from it when first accessed
+            os.makedirs(self.archive_folder, exist_ok=True)
+            archive_path = os.path.join(self.archive_folder, str(uuid.uuid4()) + ".zip")
+            if isinstance(f, str):
+                shutil.copyfile(f, archive_path)
+            else:
+                with open(archive_path, "wb") as archive_file:
+                    shutil.copyfileobj(f, archive_file)
+            f = archive_path
         with zipfile.ZipFile(f) as zf:
             zipinfos = zf.infolist()
+            member_names = {zipinfo: zipinfo.filename for zipinfo in zipinfos}
             for zipinfo in zipinfos:
                 # if there is a collision on node id with an existing node
                 # rename the new node and extract files to the new folder
@@ -260,29 +486,144 @@ class Network:
                         storage_comps[1] = node_renamings[node_id]
                         zipinfo.filename = "/".join(storage_comps)
 
-            extract_zipinfos = [zipinfo for zipinfo in zipinfos if zipinfo.filename.startswith("node") or zipinfo.filename.startswith("package")]
-
-            for zipinfo in extract_zipinfos:
-                if merging and zipinfo.filename.startswith("package"):
-                    continue # if merging, do not overwrite existing package properties and data
-                zf.extract(zipinfo,self.savedir)
+            extract_zipinfos = [zipinfo for zipinfo in zipinfos if zipinfo.filename.startswith("node")
+                                or zipinfo.filename.startswith("package") or zipinfo.filename.startswith("blob")]
+
+            with self.storage.batch():
+                existing_blobs = {}  # blob hash => whether the blob was stored before loading
+                for zipinfo in extract_zipinfos:
+                    if merging and zipinfo.filename.startswith("package"):
+                        continue # if merging, do not overwrite existing package properties and data
+                    if zipinfo.is_dir():
+                        continue
+                    parsed_entry = self.storage.parse_entry(zipinfo.filename)
+                    if parsed_entry is not None and parsed_entry[0] == "blob":
+                        blob_hash = parsed_entry[1]
+                        if blob_hash not in existing_blobs:
+                            existing_blobs[blob_hash] = self.storage.get_properties_stamp("blob", blob_hash) is not None
+                        if existing_blobs[blob_hash]:
+                            # the content is already stored, add the loaded data keys to its reference count
+                            if parsed_entry[2] is None:
+                                properties = self.storage.load_properties("blob", blob_hash)
+                                with zf.open(zipinfo) as from_file:
+                                    properties["references"] += json.loads(from_file.read())["references"]
+                                self.storage.save_properties("blob", blob_hash, properties)
+                            continue
+                    if lazy_data and parsed_entry is not None and parsed_entry[2] is not None:
+                        self.storage.write_lazy_entry(zipinfo.filename, archive_path, member_names[zipinfo])
+                    else:
+                        with zf.open(zipinfo) as from_file:
+                            self.storage.write_entry(zipinfo.filename, from_file)
             zf.extract("topology.json", self.savedir)
 
+        # loaded entries may have replaced all references to earlier archives
+        self.storage.remove_unused_archives(self.archive_folder)
         return self.load_dir(node_renamings, merging=merging)
 
     def load_dir(self, node_renamings, merging=False):
         json_path = os.path.join(self.savedir, "topology.json")
         loaded_node_ids = []
         loaded_link_ids = []
-        if os.path.exists(json_path):
-            with open(json_path) as f:
-                saved_topology = json.loads(f.read())
-                (loaded_node_ids, loaded_link_ids, node_renamings) = self.load(saved_topology,node_renamings)
-            if merging:
-                with open(json_path,"w") as of:
-                    of.write(json.dumps(self.save()))
+        journal_exists = os.path.exists(self.journal_path)
+        snapshot = self.__read_snapshot(json_path)
+        if os.path.exists(json_path) or journal_exists or snapshot is not None:
+            existing_node_ids = set(self.nodes.keys())
+            existing_link_ids = set(self.links.keys())
+            # if the network is empty, the files being loaded already describe the loaded topology
+            unchanged = not (self.nodes or self.links or self.metadata or node_renamings or journal_exists)
+            with self.batch():
+                if snapshot is not None:
+                    (nodes, links, metadata) = snapshot
+                    self.__add_loaded(nodes, links, metadata, node_renamings)
+                elif os.path.exists(json_path):
+                    with open(json_path) as f:
+                        saved_topology = json.loads(f.read())
+                        (_, _, node_renamings) = self.load(saved_topology,node_renamings)
+                if journal_exists:
+                    self.__replay_journal()
+                # the loaded topology is saved in full below, so there is no need to journal the loaded elements
+                self.pending_records = []
+                # skip rewriting topology.json, unless a snapshot also needs to be written
+                if unchanged and (snapshot is not None or not self.use_snapshot):
+                    self.batch_modified = False
+            if journal_exists or self.use_journal:
+                self.compact()
+            loaded_node_ids = [node_id for node_id in self.nodes if node_id not in existing_node_ids]
+            loaded_link_ids = [link_id for link_id in self.links if link_id not in existing_link_ids]
         return (loaded_node_ids, loaded_link_ids, node_renamings)
 
+    def __reload(self):
+        # discard unsaved edits and reload the network from the execution folder
+        self.pending_records = []
+        self.batch_modified = False
+        self.replaying = True
+        try:
+            self.clear()
+        finally:
+            self.replaying = False
+        self.metadata = {}
+        self.reloading = True
+        try:
+            self.load_dir({})
+        finally:
+            self.reloading = False
+
+    def __read_snapshot(self, json_path):
+        # return the contents of the snapshot, or None if there is no snapshot or it is out of date
+        if not os.path.exists(self.snapshot_path):
+            return None
+        try:
+            if os.path.exists(json_path):
+                json_stat = os.stat(json_path)
+                if Snapshot.read_stamp(self.snapshot_path) != (json_stat.st_size, json_stat.st_mtime_ns):
+                    self.logger.info(f"Ignoring snapshot {self.snapshot_path}, topology.json has been modified")
+                    return None
+            return Snapshot.read(self.snapshot_path)
+        except ValueError:
+            self.logger.exception(f"Ignoring invalid snapshot {self.snapshot_path}")
+            return None
+
+    def __replay_journal(self):
+        self.replaying = True
+        try:
+            with open(self.journal_path) as f:
+                for line in f:
+                    if not line.strip():
+                        continue
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        # the last record may be incomplete if the process exited while it was being written
+                        self.logger.warning(f"Ignoring incomplete record in {self.journal_path}")
+                        break
+                    self.__apply_record(record)
+        finally:
+            self.replaying = False
+
+    def __apply_record(self, record):
+        action = record["action"]
+        if action == "add_node":
+            node_content = record["node"]
+            self.add_node(Node.load(record["node_id"], node_content["node_type"], node_content))
+        elif action == "move_node":
+            if record["node_id"] in self.nodes:
+                self.move_node(record["node_id"], record["x"], record["y"])
+        elif action == "update_node_metadata":
+            if record["node_id"] in self.nodes:
+                self.update_node_metadata(record["node_id"], record["metadata"])
+        elif action == "remove_node":
+            self.remove_node(record["node_id"])
+        elif action == "add_link":
+            self.add_link(Link.load(record["link_id"], record["link"]))
+        elif action == "remove_link":
+            self.remove_link(record["link_id"])
+        elif action == "set_metadata":
+            self.set_metadata(record["metadata"])
+        elif action == "clear":
+            self.clear()
+        else:
+            self.logger.warning(f"Ignoring unknown journal action {action}")
+
     def save(self):
         saved = {"nodes": {}, "links": {}}
 
@@ -295,23 +636,98 @@ class Network:
         saved["metadata"] = deepcopy(self.metadata)
         return saved
 
-    def save_zip(self, to_file=None):
+    def save_zip(self, to_file=None, compress=False):
         saved = self.save()
         f = to_file if to_file else io.BytesIO()
-        zf = zipfile.ZipFile(f, "w")
+        compression = zipfile.ZIP_DEFLATED if compress else zipfile.ZIP_STORED
+        # files are copied into the zip file in chunks, to_file need not be seekable
+        zf = zipfile.ZipFile(f, "w", compression=compression)
         zf.writestr("topology.json", json.dumps(saved,indent=4))
-        for subdir in ["node","package"]:
-            for root, dirs, files in os.walk(os.path.join(self.savedir,subdir)):
-                for file in files:
-                    entry = os.path.relpath(os.path.join(root,file),self.savedir)
-                    zf.write(os.path.join(self.savedir,entry),entry)
+        for entry in self.storage.list_entries():
+            self.__write_zip_entry(zf, entry, compression)
         zf.close()
         if to_file is None:
             return f.getvalue()
 
+    def __write_zip_entry(self, zf, entry, compression):
+        with self.storage.open_entry(entry) as from_file:
+            header = from_file.read(8)
+            zipinfo = zipfile.ZipInfo(entry, date_time=time.localtime()[:6])
+            zipinfo.external_attr = 0o644 << 16
+            # data which is already in a compressed format is stored as-is
+            is_compressed = any(header.startswith(signature) for signature in COMPRESSED_SIGNATURES)
+            zipinfo.compress_type = zipfile.ZIP_STORED if is_compressed else compression
+            # if the size is known, zipfile uses zip64 extensions only for large entries
+            size = self.storage.get_entry_size(entry)
+            if size is not None:
+                zipinfo.file_size = size
+            with zf.open(zipinfo, "w", force_zip64=size is None) as to_file:
+                to_file.write(header)
+                shutil.copyfileobj(from_file, to_file)
+
+    def compact(self):
+        """
+        Write the whole network to topology.json and remove the journal of edits
+        """
+        self.pending_records = []
+        self.batch_modified = False
+        self.__write_topology()
+        if os.path.exists(self.journal_path):
+            os.remove(self.journal_path)
+        self.journal_length = 0
+
+    def close(self):
+        if self.use_journal:
+            self.compact()
+        self.storage.remove_unused_archives(self.archive_folder)
+
+    def __record(self, record):
+        if self.replaying:
+            return
+        if self.use_journal:
+            self.pending_records.append(record)
+            if self.batch_depth == 0:
+                self.__write_journal()
+        else:
+            self.__save_dir()
+
+    def __write_journal(self):
+        with open(self.journal_path, "a") as f:
+            f.write("".join(json.dumps(record) + "\n" for record in self.pending_records))
+        self.journal_length += len(self.pending_records)
+        self.pending_records = []
+        if self.journal_length >= self.journal_compaction_limit:
+            self.compact()
+
     def __save_dir(self):
+        if self.batch_depth > 0:
+            self.batch_modified = True
+            return
+        self.batch_modified = False
+        self.__write_topology()
+
+    def __write_topology(self):
         saved = self.save()
         path = os.path.join(self.savedir,"topology.json")
-        with open(path,"w") as f:
+        # write to a temporary file and then rename, so that topology.json is replaced atomically
+        temp_path = path + ".tmp"
+        with open(temp_path,"w") as f:
             f.write(json.dumps(saved,indent=4))
+        os.replace(temp_path, path)
+        if self.use_snapshot:
+            self.__write_snapshot(path)
+
+    def __write_snapshot(self, json_path):
+        json_stat = os.stat(json_path)
+        temp_path = self.snapshot_path + ".tmp"
+        try:
+            Snapshot.write(temp_path, self.nodes.values(), self.links.values(), self.metadata,
+                           (json_stat.st_size, json_stat.st_mtime_ns))
+            os.replace(temp_path, self.snapshot_path)
+        except ValueError:
+            # fall back to loading from topology.json
+            self.logger.exception(f"Unable to write snapshot {self.snapshot_path}")
+            for path in [temp_path, self.snapshot_path]:
+                if os.path.exists(path):
+                    os.remove(path)
 
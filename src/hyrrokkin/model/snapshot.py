@@ -0,0 +1,162 @@
+#   Hyrrokkin - a Python library for building and running executable graphs
+#
+#   MIT License - Copyright (C) 2022-2023  Visual Topology Ltd
+#
+#   Permission is hereby granted, free of charge, to any person obtaining a copy of this software
+#   and associated documentation files (the "Software"), to deal in the Software without
+#   restriction, including without limitation the rights to use, copy, modify, merge, publish,
+#   distribute, sublicense, and/or sell copies of the Software, and to permit persons to whom the
+#   Software is furnished to do so, subject to the following conditions:
+#
+#   The above copyright notice and this permission notice shall be included in all copies or
+#   substantial portions of the Software.
+#
+#   THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING
+#   BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+#   NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM,
+#   DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#   OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+import array
+import json
+import mmap
+import struct
+import sys
+
+from hyrrokkin.model.node import Node
+from hyrrokkin.model.link import Link
+
+# an unsigned 32 bit integer array type, used for the node and link tables
+INDEX_TYPECODE = "I" if array.array("I").itemsize == 4 else "L"
+
+class Snapshot:
+    """
+    Read and write a compact binary representation of a network, which is faster to load than topology.json
+
+    The file consists of a fixed size header followed by:
+        a string table - all node ids, link ids, node types, port names and link types, UTF-8 encoded and NUL separated
+        a node table - (node-id, node-type) string indexes for each node
+        a link table - (link-id, from-node-id, from-port, to-node-id, to-port, link-type) string indexes for each link
+        a JSON encoded document holding node positions, node metadata and the network metadata
+
+    The header records the size and modification time of the topology.json file written alongside the snapshot,
+    so that a snapshot which is out of date with respect to topology.json can be detected and ignored.
+    """
+
+    MAGIC = b"HYRSNAP\x00"
+    VERSION = 1
+    HEADER = struct.Struct("<8sIqqIIIII")
+
+    @staticmethod
+    def write(path, nodes, links, metadata, json_stamp):
+        strings = []
+        string_indexes = {}
+
+        def intern(s):
+            idx = string_indexes.get(s, None)
+            if idx is None:
+                if "\x00" in s:
+                    raise ValueError(f"Unable to write snapshot, string contains a NUL character: {s!r}")
+                idx = len(strings)
+                string_indexes[s] = idx
+                strings.append(s)
+            return idx
+
+        node_table = array.array(INDEX_TYPECODE)
+        positions = []
+        node_metadata = []
+        for node in nodes:
+            node_table.append(intern(node.get_node_id()))
+            node_table.append(intern(node.get_node_type()))
+            positions.append(node.get_xy())
+            node_metadata.append(node.get_metadata())
+
+        link_table = array.array(INDEX_TYPECODE)
+        for link in links:
+            link_table.extend([intern(link.get_link_id()), intern(link.from_node_id), intern(link.from_port),
+                               intern(link.to_node_id), intern(link.to_port), intern(link.get_link_type())])
+
+        if sys.byteorder == "big":
+            node_table.byteswap()
+            link_table.byteswap()
+
+        string_bytes = "\x00".join(strings).encode("utf-8")
+        extras = json.dumps({"positions": positions, "node_metadata": node_metadata, "metadata": metadata}).encode("utf-8")
+        (json_size, json_mtime_ns) = json_stamp
+        with open(path, "wb") as f:
+            f.write(Snapshot.HEADER.pack(Snapshot.MAGIC, Snapshot.VERSION, json_size, json_mtime_ns,
+                                         len(strings), len(nodes), len(links), len(string_bytes), len(extras)))
+            f.write(string_bytes)
+            f.write(node_table.tobytes())
+            f.write(link_table.tobytes())
+            f.write(extras)
+
+    @staticmethod
+    def read_stamp(path):
+        """
+        Return the (size, modification time) of the topology.json file that was current when the snapshot was written
+        """
+        with open(path, "rb") as f:
+            header = f.read(Snapshot.HEADER.size)
+        (_, json_size, json_mtime_ns, _, _, _, _, _) = Snapshot.__unpack_header(header)
+        return (json_size, json_mtime_ns)
+
+    @staticmethod
+    def read(path):
+        """
+        Read a snapshot, returning a tuple (nodes, links, metadata)
+
+        Raises:
+            ValueError: if the file is not a valid snapshot
+        """
+        with open(path, "rb") as f:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                (_, _, _, string_count, node_count, link_count, strings_length, extras_length) = \
+                    Snapshot.__unpack_header(mm[:Snapshot.HEADER.size])
+                offset = Snapshot.HEADER.size
+                itemsize = array.array(INDEX_TYPECODE).itemsize
+                expected_length = offset + strings_length + itemsize * (2 * node_count + 6 * link_count) + extras_length
+                if len(mm) != expected_length:
+                    raise ValueError(f"Snapshot {path} is truncated or corrupt")
+
+                strings = mm[offset:offset + strings_length].decode("utf-8").split("\x00") if string_count else []
+                offset += strings_length
+                if len(strings) != string_count:
+                    raise ValueError(f"Snapshot {path} is corrupt")
+
+                node_table = Snapshot.__read_table(mm, offset, 2 * node_count)
+                offset += itemsize * 2 * node_count
+                link_table = Snapshot.__read_table(mm, offset, 6 * link_count)
+                offset += itemsize * 6 * link_count
+                extras = json.loads(mm[offset:offset + extras_length].decode("utf-8"))
+
+        positions = extras["positions"]
+        node_metadata = extras["node_metadata"]
+        nodes = []
+        for idx in range(node_count):
+            (x, y) = positions[idx]
+            nodes.append(Node(strings[node_table[2 * idx]], strings[node_table[2 * idx + 1]], x, y, node_metadata[idx]))
+
+        links = []
+        for idx in range(0, 6 * link_count, 6):
+            links.append(Link(strings[link_table[idx]], strings[link_table[idx + 1]], strings[link_table[idx + 2]],
+                              strings[link_table[idx + 3]], strings[link_table[idx + 4]], strings[link_table[idx + 5]]))
+
+        return (nodes, links, extras["metadata"])
+
+    @staticmethod
+    def __unpack_header(header):
+        if len(header) < Snapshot.HEADER.size:
+            raise ValueError("Snapshot header is truncated")
+        fields = Snapshot.HEADER.unpack(header)
+        if fields[0] != Snapshot.MAGIC or fields[1] != Snapshot.VERSION:
+            raise ValueError("Snapshot has an unrecognised format or version")
+        return fields[1:]
+
+    @staticmethod
+    def __read_table(mm, offset, count):
+        table = array.array(INDEX_TYPECODE)
+        table.frombytes(mm[offset:offset + table.itemsize * count])
+        if sys.byteorder == "big":
+            table.byteswap()
+        return table
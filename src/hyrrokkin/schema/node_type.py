@@ -23,19 +23,32 @@ from hyrrokkin.utils.resource_loader import ResourceLoader
 
 class NodeType:
 
-    def __init__(self, metadata, display, input_ports, output_ports, classname, enabled=True):
+    def __init__(self, metadata, display, input_ports, output_ports, classname, enabled=True, resource_requirements={},
+                 package_resource_path=None):
         self.metadata = metadata
         self.display = display
         self.input_ports = input_ports
         self.output_ports = output_ports
+        # classname can be absolute or relative to the package path, it is resolved when first needed
         self.classname = classname
+        self.package_resource_path = package_resource_path
+        self.resolved_classname = None
         self.enabled = enabled
+        self.resource_requirements = resource_requirements
 
     def is_enabled(self):
         return self.enabled
 
     def get_classname(self):
-        return self.classname
+        if self.resolved_classname is None:
+            if self.classname and self.package_resource_path is not None:
+                self.resolved_classname = ResourceLoader.resolve_classname(self.package_resource_path, self.classname)
+            else:
+                self.resolved_classname = self.classname
+        return self.resolved_classname
+
+    def get_resource_requirements(self):
+        return self.resource_requirements
 
     def get_input_ports(self):
         return self.input_ports.items()
@@ -47,20 +60,13 @@ class NodeType:
     def load(from_dict, package_resource_path):
         # classname can be absolute or relative to the package path
         enabled = from_dict.get("enabled", True)
+        # resource_requirements maps a resource pool name to the amount of that resource consumed while a node runs
+        resource_requirements = from_dict.get("resource_requirements", {})
+        for (resource_name, amount) in resource_requirements.items():
+            if not isinstance(amount, (int, float)) or amount < 0:
+                raise Exception(f"Invalid amount {amount} for resource {resource_name}, must be a non-negative number")
+        # the class is not imported until a node of this type is loaded by the execution engine
         classname = from_dict.get("classname", None)
-        if classname:
-            # assume relative first, get the fully qualified backend class name
-            fq_classname = package_resource_path + "." + classname
-
-            try:
-                cls = ResourceLoader.get_class(fq_classname)
-                classname = fq_classname
-            except:
-                cls = ResourceLoader.get_class(classname)
-
-            # check class has expected attributes
-            if not hasattr(cls, "run"):
-                raise Exception(f"Node class {classname} does not have the required run method")
 
         return NodeType(metadata=from_dict.get("metadata", {}),
                         display=from_dict.get("display", {}),
@@ -68,4 +74,5 @@ class NodeType:
                                      from_dict.get("input_ports", {}).items()},
                         output_ports={name: Port.load(port_dict) for (name, port_dict) in
                                       from_dict.get("output_ports", {}).items()},
-                        classname=classname, enabled=enabled)
+                        classname=classname, enabled=enabled, resource_requirements=resource_requirements,
+                        package_resource_path=package_resource_path)
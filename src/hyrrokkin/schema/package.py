@@ -24,13 +24,16 @@ from hyrrokkin.utils.resource_loader import ResourceLoader
 
 class Package:
 
-    def __init__(self, id, metadata, display, node_types, link_types, configuration):
+    def __init__(self, id, metadata, display, node_types, link_types, configuration, package_resource_path=None):
         self.id = id
         self.metadata = metadata
         self.display = display
         self.node_types = node_types
         self.link_types = link_types
         self.configuration = configuration
+        # the configuration classname can be absolute or relative to the package path, it is resolved when first needed
+        self.package_resource_path = package_resource_path
+        self.configuration_resolved = False
 
     def get_node_types(self):
         return self.node_types
@@ -48,6 +51,11 @@ class Package:
         return self.node_types[node_type_id]
 
     def get_configuration(self):
+        if not self.configuration_resolved:
+            if "classname" in self.configuration and self.package_resource_path is not None:
+                self.configuration["classname"] = ResourceLoader.resolve_classname(self.package_resource_path,
+                                                                                   self.configuration["classname"])
+            self.configuration_resolved = True
         return self.configuration
 
     def save(self):
@@ -61,15 +69,19 @@ class Package:
             "link_types": [
                 link_type.save(id) for (id, link_type) in self.link_types.items()
             ],
-            "configuration": self.configuration
+            "configuration": self.get_configuration()
         }
 
     def get_classmap(self):
         classmap = { "nodes": {} }
         if self.configuration:
-            classmap["configuration"] = self.configuration["classname"]
+            classmap["configuration"] = self.get_configuration()["classname"]
         for (id, node_type) in self.node_types.items():
             classmap["nodes"][id] = node_type.get_classname()
+            if node_type.get_resource_requirements():
+                if "resource_requirements" not in classmap:
+                    classmap["resource_requirements"] = {}
+                classmap["resource_requirements"][id] = node_type.get_resource_requirements()
         return classmap
 
     @staticmethod
@@ -87,22 +99,12 @@ class Package:
 
         configuration = from_dict.get("configuration", {})
 
-        if "classname" in configuration:
-            # assume relative first, get the fully qualified backend class name
-            fq_classname = package_resource_path + "." + configuration["classname"]
-
-            try:
-                cls = ResourceLoader.get_class(fq_classname)
-                configuration["classname"] = fq_classname
-            except Exception as ex:
-                print(ex)
-                pass
-
         return Package(
             from_dict["id"],
             from_dict.get("metadata", {}),
             from_dict.get("display", {}),
             node_types,
             link_types,
-            configuration
+            configuration,
+            package_resource_path
         )
@@ -0,0 +1,81 @@
+#   Hyrrokkin - a Python library for building and running executable graphs
+#
+#   MIT License - Copyright (C) 2022-2023  Visual Topology Ltd
+#
+#   Permission is hereby granted, free of charge, to any person obtaining a copy of this software
+#   and associated documentation files (the "Software"), to deal in the Software without
+#   restriction, including without limitation the rights to use, copy, modify, merge, publish,
+#   distribute, sublicense, and/or sell copies of the Software, and to permit persons to whom the
+#   Software is furnished to do so, subject to the following conditions:
+#
+#   The above copyright notice and this permission notice shall be included in all copies or
+#   substantial portions of the Software.
+#
+#   THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING
+#   BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+#   NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM,
+#   DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#   OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+import io
+
+class DataWriter(io.BufferedIOBase):
+    """
+    A binary file object opened for writing, which stages the written data in another file object and
+    passes it to a commit function when closed.  If the writer is used as a context manager and the
+    block raises an exception, or the writer is garbage collected without being closed, the staged data
+    is discarded instead.
+    """
+
+    def __init__(self, f, commit_fn, discard_fn):
+        """
+        Args:
+            f: the file object to which data is written
+            commit_fn: a function called with f when the writer is closed, which should store the data and close f
+            discard_fn: a function called with f when the writer is discarded, which should close f
+        """
+        super().__init__()
+        self.f = f
+        self.commit_fn = commit_fn
+        self.discard_fn = discard_fn
+
+    def writable(self):
+        return True
+
+    def write(self, b):
+        if self.closed:
+            raise ValueError("write to closed data writer")
+        return self.f.write(b)
+
+    def close(self):
+        if self.closed:
+            return
+        try:
+            self.commit_fn(self.f)
+        finally:
+            super().close()
+
+    def discard(self):
+        """
+        Close the writer without storing the written data
+        """
+        if self.closed:
+            return
+        try:
+            self.discard_fn(self.f)
+        finally:
+            super().close()
+
+    def __del__(self):
+        # IOBase.__del__ would close, and so commit, a writer which was never closed
+        if not self.closed:
+            try:
+                self.discard()
+            except Exception:
+                pass
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is not None:
+            self.discard()
+        else:
+            self.close()
@@ -0,0 +1,276 @@
+#   Hyrrokkin - a Python library for building and running executable graphs
+#
+#   MIT License - Copyright (C) 2022-2023  Visual Topology Ltd
+#
+#   Permission is hereby granted, free of charge, to any person obtaining a copy of this software
+#   and associated documentation files (the "Software"), to deal in the Software without
+#   restriction, including without limitation the rights to use, copy, modify, merge, publish,
+#   distribute, sublicense, and/or sell copies of the Software, and to permit persons to whom the
+#   Software is furnished to do so, subject to the following conditions:
+#
+#   The above copyright notice and this permission notice shall be included in all copies or
+#   substantial portions of the Software.
+#
+#   THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING
+#   BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+#   NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM,
+#   DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#   OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+import os
+import json
+import mmap
+import shutil
+import threading
+import uuid
+import zipfile
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None  # not available on windows, batches are then only serialised within a process
+
+from hyrrokkin.storage.data_writer import DataWriter
+from hyrrokkin.storage.storage_base import StorageBase
+
+class DirectoryStorage(StorageBase):
+    """
+    Store properties and data in a directory tree, with one file for the properties of each owner
+    and one file for each data key
+    """
+
+    # a data file which has not yet been extracted from an imported zip file is represented by
+    # a reference file (the data file path with this suffix appended)
+    LAZY_REFERENCE_SUFFIX = ".lazy"
+
+    # files are written under a temporary name with this suffix and then renamed
+    TEMPORARY_SUFFIX = ".tmp"
+
+    # batches are serialised between processes by locking this file in the root folder
+    LOCK_FILENAME = "storage.lock"
+
+    # absolute root folder => [lock, batch depth, open lock file], shared by all instances in the process
+    folder_locks = {}
+    folder_locks_lock = threading.Lock()
+
+    def __init__(self, root_folder):
+        self.root_folder = root_folder
+        with DirectoryStorage.folder_locks_lock:
+            self.folder_lock = DirectoryStorage.folder_locks.setdefault(os.path.abspath(root_folder),
+                                                                        [threading.RLock(), 0, None])
+
+    def __get_path(self, entry):
+        return os.path.join(self.root_folder, *entry.split("/"))
+
+    def load_properties(self, owner_type, owner_id):
+        path = self.__get_path(StorageBase.format_entry(owner_type, owner_id))
+        if os.path.exists(path):
+            with open(path) as f:
+                return json.loads(f.read())
+        return None
+
+    def get_properties_stamp(self, owner_type, owner_id):
+        try:
+            stat = os.stat(self.__get_path(StorageBase.format_entry(owner_type, owner_id)))
+            return (stat.st_size, stat.st_mtime_ns)
+        except FileNotFoundError:
+            return None
+
+    def save_properties(self, owner_type, owner_id, properties):
+        path = self.__get_path(StorageBase.format_entry(owner_type, owner_id))
+        if properties is None:
+            if os.path.exists(path):
+                os.remove(path)
+        else:
+            self.__write_file(path, lambda f: f.write(json.dumps(properties).encode("utf-8")))
+
+    def get_data(self, owner_type, owner_id, key):
+        filepath = self.__get_path(StorageBase.format_entry(owner_type, owner_id, key))
+        if os.path.exists(filepath) or self.__extract_lazy_reference(filepath):
+            with open(filepath, mode="rb") as f:
+                return f.read()
+        else:
+            return None
+
+    def set_data(self, owner_type, owner_id, key, data):
+        filepath = self.__get_path(StorageBase.format_entry(owner_type, owner_id, key))
+
+        reference_path = filepath + DirectoryStorage.LAZY_REFERENCE_SUFFIX
+        if os.path.exists(reference_path):
+            os.remove(reference_path)
+
+        if data is None:
+            if os.path.exists(filepath):
+                os.remove(filepath)
+            return
+
+        self.__write_file(filepath, lambda f: f.write(data))
+
+    def open_data_writer(self, owner_type, owner_id, key):
+        filepath = self.__get_path(StorageBase.format_entry(owner_type, owner_id, key))
+        os.makedirs(os.path.dirname(filepath), exist_ok=True)
+        temp_path = filepath + "." + str(uuid.uuid4()) + DirectoryStorage.TEMPORARY_SUFFIX
+
+        def commit(f):
+            f.close()
+            reference_path = filepath + DirectoryStorage.LAZY_REFERENCE_SUFFIX
+            if os.path.exists(reference_path):
+                os.remove(reference_path)
+            os.replace(temp_path, filepath)
+
+        def discard(f):
+            f.close()
+            os.remove(temp_path)
+
+        return DataWriter(open(temp_path, "wb"), commit, discard)
+
+    def map_data(self, owner_type, owner_id, key):
+        filepath = self.__get_path(StorageBase.format_entry(owner_type, owner_id, key))
+        if not os.path.exists(filepath) and not self.__extract_lazy_reference(filepath):
+            return None
+        with open(filepath, mode="rb") as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                return memoryview(b"") # empty files cannot be mapped
+            # the mapping remains valid after the file is closed, and after the file is replaced or removed
+            return memoryview(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+
+    def list_keys(self, owner_type, owner_id):
+        folder = os.path.join(self.root_folder, owner_type, owner_id, "data")
+        if not os.path.isdir(folder):
+            return []
+        keys = set()
+        for filename in os.listdir(folder):
+            if filename.endswith(DirectoryStorage.TEMPORARY_SUFFIX):
+                continue
+            if filename.endswith(DirectoryStorage.LAZY_REFERENCE_SUFFIX):
+                filename = filename[:-len(DirectoryStorage.LAZY_REFERENCE_SUFFIX)]
+            keys.add(filename)
+        return list(keys)
+
+    def list_entries(self):
+        entries = []
+        for subdir in ["node","package","blob"]:
+            for root, dirs, files in os.walk(os.path.join(self.root_folder,subdir)):
+                for file in files:
+                    entry = os.path.relpath(os.path.join(root,file),self.root_folder).replace(os.sep, "/")
+                    if entry.endswith(DirectoryStorage.TEMPORARY_SUFFIX):
+                        continue
+                    if entry.endswith(DirectoryStorage.LAZY_REFERENCE_SUFFIX):
+                        entry = entry[:-len(DirectoryStorage.LAZY_REFERENCE_SUFFIX)]
+                    entries.append(entry)
+        return entries
+
+    def open_entry(self, entry):
+        path = self.__get_path(entry)
+        reference_path = path + DirectoryStorage.LAZY_REFERENCE_SUFFIX
+        if not os.path.exists(path) and os.path.exists(reference_path):
+            # read data which has not yet been extracted directly from the imported zip file
+            (zf, zipinfo) = self.__open_lazy_reference(reference_path)
+            with zf:
+                # the member remains readable after the ZipFile is closed
+                return zf.open(zipinfo)
+        return open(path, "rb")
+
+    def get_entry_size(self, entry):
+        path = self.__get_path(entry)
+        reference_path = path + DirectoryStorage.LAZY_REFERENCE_SUFFIX
+        if not os.path.exists(path) and os.path.exists(reference_path):
+            (zf, zipinfo) = self.__open_lazy_reference(reference_path)
+            with zf:
+                return zipinfo.file_size
+        return os.path.getsize(path)
+
+    def write_entry(self, entry, from_file):
+        path = self.__get_path(entry)
+        reference_path = path + DirectoryStorage.LAZY_REFERENCE_SUFFIX
+        if os.path.exists(reference_path):
+            os.remove(reference_path)
+        self.__write_file(path, lambda f: shutil.copyfileobj(from_file, f))
+
+    @contextmanager
+    def batch(self):
+        # updates are written immediately, but batches on the same folder do not interleave so that
+        # read-modify-write sequences such as updating reference counts are not lost
+        lock = self.folder_lock[0]
+        with lock:
+            if self.folder_lock[1] == 0 and fcntl is not None:
+                os.makedirs(self.root_folder, exist_ok=True)
+                lock_file = open(os.path.join(self.root_folder, DirectoryStorage.LOCK_FILENAME), "w")
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                self.folder_lock[2] = lock_file
+            self.folder_lock[1] += 1
+            try:
+                yield self
+            finally:
+                self.folder_lock[1] -= 1
+                if self.folder_lock[1] == 0 and self.folder_lock[2] is not None:
+                    self.folder_lock[2].close() # closing the file releases the lock
+                    self.folder_lock[2] = None
+
+    def __write_file(self, path, write_fn):
+        # write to a temporary file and rename it, so that readers (including any memory mappings of the file)
+        # never see a partially written file
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = path + "." + str(uuid.uuid4()) + DirectoryStorage.TEMPORARY_SUFFIX
+        try:
+            with open(temp_path, "wb") as f:
+                write_fn(f)
+            os.replace(temp_path, path)
+        except:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+    def write_lazy_entry(self, entry, archive_path, member_name):
+        # record that the data file should be extracted from the zip file when it is first accessed
+        path = self.__get_path(entry)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        if os.path.exists(path):
+            os.remove(path)
+        archive_path = os.path.relpath(archive_path, os.path.dirname(path))
+        with open(path + DirectoryStorage.LAZY_REFERENCE_SUFFIX, "w") as f:
+            f.write(json.dumps({"archive": archive_path, "member": member_name}))
+
+    def remove_unused_archives(self, archive_folder):
+        if not os.path.isdir(archive_folder):
+            return
+        with self.batch():
+            referenced_paths = set()
+            for subdir in ["node", "package", "blob"]:
+                for root, dirs, files in os.walk(os.path.join(self.root_folder, subdir)):
+                    for file in files:
+                        if file.endswith(DirectoryStorage.LAZY_REFERENCE_SUFFIX):
+                            with open(os.path.join(root, file)) as f:
+                                archive_path = os.path.join(root, json.loads(f.read())["archive"])
+                            referenced_paths.add(os.path.normpath(archive_path))
+            for filename in os.listdir(archive_folder):
+                archive_path = os.path.normpath(os.path.join(archive_folder, filename))
+                if archive_path not in referenced_paths:
+                    os.remove(archive_path)
+
+    def __open_lazy_reference(self, reference_path):
+        # open the zip file referred to by a reference file, returning a tuple (ZipFile, ZipInfo)
+        with open(reference_path) as f:
+            reference = json.loads(f.read())
+        archive_path = os.path.join(os.path.dirname(reference_path), reference["archive"])
+        zf = zipfile.ZipFile(archive_path)
+        return (zf, zf.getinfo(reference["member"]))
+
+    def __extract_lazy_reference(self, filepath):
+        reference_path = filepath + DirectoryStorage.LAZY_REFERENCE_SUFFIX
+        if not os.path.exists(reference_path):
+            return False
+        try:
+            (zf, zipinfo) = self.__open_lazy_reference(reference_path)
+        except FileNotFoundError:
+            # another process may have extracted the file first
+            return os.path.exists(filepath)
+        # extract to a temporary file and rename, in case another process is extracting the same file
+        temp_path = filepath + "." + str(uuid.uuid4()) + DirectoryStorage.TEMPORARY_SUFFIX
+        with zf, zf.open(zipinfo) as member, open(temp_path, "wb") as f:
+            shutil.copyfileobj(member, f)
+        os.replace(temp_path, filepath)
+        if os.path.exists(reference_path):
+            os.remove(reference_path)
+        return True
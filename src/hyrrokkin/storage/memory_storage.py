@@ -0,0 +1,170 @@
+#   Hyrrokkin - a Python library for building and running executable graphs
+#
+#   MIT License - Copyright (C) 2022-2023  Visual Topology Ltd
+#
+#   Permission is hereby granted, free of charge, to any person obtaining a copy of this software
+#   and associated documentation files (the "Software"), to deal in the Software without
+#   restriction, including without limitation the rights to use, copy, modify, merge, publish,
+#   distribute, sublicense, and/or sell copies of the Software, and to permit persons to whom the
+#   Software is furnished to do so, subject to the following conditions:
+#
+#   The above copyright notice and this permission notice shall be included in all copies or
+#   substantial portions of the Software.
+#
+#   THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING
+#   BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+#   NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM,
+#   DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#   OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+import io
+import json
+import mmap
+import os
+import shutil
+import threading
+import uuid
+import weakref
+from contextlib import contextmanager
+
+from hyrrokkin.storage.storage_base import StorageBase
+
+class MemoryStorage(StorageBase):
+    """
+    Store properties and data in memory, for short-lived topologies which do not need to persist them
+
+    Data larger than an optional threshold is spilled to files in the execution folder, which are removed when
+    the storage is no longer used.  A topology and an execution engine running in the same process share a single
+    instance for each execution folder, see get_instance.
+    """
+
+    SPILL_FOLDER = "spill"
+
+    # execution folder => the instance in use for that folder
+    instances = weakref.WeakValueDictionary()
+    instances_lock = threading.Lock()
+
+    def __init__(self, root_folder, spill_threshold=None):
+        """
+        Args:
+            root_folder: the execution folder, only used to hold spilled data
+            spill_threshold: if not None, data larger than this many bytes is stored in a file rather than in memory
+        """
+        self.root_folder = root_folder
+        self.spill_threshold = spill_threshold
+        self.spill_folder = os.path.join(root_folder, MemoryStorage.SPILL_FOLDER)
+        self.properties = {}  # (owner_type, owner_id) => (JSON encoded properties, version)
+        self.data = {}  # (owner_type, owner_id, key) => data as bytes, or the path of the file holding spilled data
+        self.version = 0
+        self.lock = threading.RLock()
+        weakref.finalize(self, shutil.rmtree, self.spill_folder, True)
+
+    @staticmethod
+    def get_instance(root_folder, spill_threshold=None):
+        """
+        Get the instance in use for an execution folder in this process, creating it if there is none
+        """
+        with MemoryStorage.instances_lock:
+            storage = MemoryStorage.instances.get(os.path.abspath(root_folder), None)
+            if storage is None:
+                storage = MemoryStorage(root_folder, spill_threshold)
+                MemoryStorage.instances[os.path.abspath(root_folder)] = storage
+            return storage
+
+    def load_properties(self, owner_type, owner_id):
+        with self.lock:
+            item = self.properties.get((owner_type, owner_id), None)
+        return json.loads(item[0]) if item is not None else None
+
+    def get_properties_stamp(self, owner_type, owner_id):
+        with self.lock:
+            item = self.properties.get((owner_type, owner_id), None)
+        return item[1] if item is not None else None
+
+    def save_properties(self, owner_type, owner_id, properties):
+        with self.lock:
+            if properties is None:
+                self.properties.pop((owner_type, owner_id), None)
+            else:
+                self.version += 1
+                self.properties[(owner_type, owner_id)] = (json.dumps(properties), self.version)
+
+    def get_data(self, owner_type, owner_id, key):
+        with self.lock:
+            data = self.data.get((owner_type, owner_id, key), None)
+        if isinstance(data, str):
+            with open(data, "rb") as f:
+                return f.read()
+        return data
+
+    def map_data(self, owner_type, owner_id, key):
+        with self.lock:
+            data = self.data.get((owner_type, owner_id, key), None)
+        if isinstance(data, str):
+            with open(data, "rb") as f:
+                if os.fstat(f.fileno()).st_size == 0:
+                    return memoryview(b"")
+                return memoryview(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+        return memoryview(data) if data is not None else None
+
+    def set_data(self, owner_type, owner_id, key, data):
+        if data is not None and self.spill_threshold is not None and len(data) > self.spill_threshold:
+            os.makedirs(self.spill_folder, exist_ok=True)
+            path = os.path.join(self.spill_folder, str(uuid.uuid4()))
+            with open(path, "wb") as f:
+                f.write(data)
+            data = path
+        with self.lock:
+            previous = self.data.pop((owner_type, owner_id, key), None)
+            if data is not None:
+                self.data[(owner_type, owner_id, key)] = data
+        if isinstance(previous, str):
+            os.remove(previous)
+
+    def list_keys(self, owner_type, owner_id):
+        with self.lock:
+            return [key for (data_owner_type, data_owner_id, key) in self.data
+                    if data_owner_type == owner_type and data_owner_id == owner_id]
+
+    def list_entries(self):
+        with self.lock:
+            return [StorageBase.format_entry(owner_type, owner_id) for (owner_type, owner_id) in self.properties] \
+                + [StorageBase.format_entry(owner_type, owner_id, key) for (owner_type, owner_id, key) in self.data]
+
+    def open_entry(self, entry):
+        (owner_type, owner_id, key) = StorageBase.parse_entry(entry)
+        with self.lock:
+            if key is None:
+                item = self.properties.get((owner_type, owner_id), None)
+                content = item[0].encode("utf-8") if item is not None else None
+            else:
+                content = self.data.get((owner_type, owner_id, key), None)
+        if content is None:
+            raise FileNotFoundError(entry)
+        if isinstance(content, str):
+            return open(content, "rb")
+        return io.BytesIO(content)
+
+    def get_entry_size(self, entry):
+        with self.open_entry(entry) as f:
+            return f.seek(0, io.SEEK_END)
+
+    def write_entry(self, entry, from_file):
+        parsed = StorageBase.parse_entry(entry)
+        if parsed is None:
+            return # only properties and data are stored
+        (owner_type, owner_id, key) = parsed
+        content = from_file.read()
+        if key is None:
+            self.save_properties(owner_type, owner_id, json.loads(content.decode("utf-8")))
+        else:
+            self.set_data(owner_type, owner_id, key, content)
+
+    @contextmanager
+    def batch(self):
+        with self.lock:
+            yield self
+
+    def close(self):
+        # the instance may still be in use by the topology, its contents are released when it is no longer referenced
+        pass
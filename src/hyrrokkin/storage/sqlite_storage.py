@@ -0,0 +1,186 @@
+#   Hyrrokkin - a Python library for building and running executable graphs
+#
+#   MIT License - Copyright (C) 2022-2023  Visual Topology Ltd
+#
+#   Permission is hereby granted, free of charge, to any person obtaining a copy of this software
+#   and associated documentation files (the "Software"), to deal in the Software without
+#   restriction, including without limitation the rights to use, copy, modify, merge, publish,
+#   distribute, sublicense, and/or sell copies of the Software, and to permit persons to whom the
+#   Software is furnished to do so, subject to the following conditions:
+#
+#   The above copyright notice and this permission notice shall be included in all copies or
+#   substantial portions of the Software.
+#
+#   THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING
+#   BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+#   NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM,
+#   DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#   OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+import io
+import json
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+from contextlib import contextmanager
+
+from hyrrokkin.storage.data_writer import DataWriter
+from hyrrokkin.storage.storage_base import StorageBase
+
+class SqliteStorage(StorageBase):
+    """
+    Store properties and data in a single SQLite database file in the execution folder
+
+    The database uses write-ahead logging so that the topology and the execution worker processes can access it
+    concurrently.  Updates made outside a batch are committed immediately, updates made inside a batch are
+    committed in a single transaction when the outermost batch exits.
+    """
+
+    DATABASE_FILENAME = "datastore.db"
+
+    def __init__(self, root_folder):
+        self.root_folder = root_folder
+        os.makedirs(self.root_folder, exist_ok=True)
+        self.path = os.path.join(self.root_folder, SqliteStorage.DATABASE_FILENAME)
+        # transactions are managed explicitly, see batch
+        self.connection = sqlite3.connect(self.path, isolation_level=None, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.execute("CREATE TABLE IF NOT EXISTS properties (owner_type TEXT, owner_id TEXT, "
+                                "properties TEXT, version INTEGER, PRIMARY KEY (owner_type, owner_id))")
+        self.connection.execute("CREATE TABLE IF NOT EXISTS data (owner_type TEXT, owner_id TEXT, key TEXT, "
+                                "data BLOB, PRIMARY KEY (owner_type, owner_id, key))")
+        self.lock = threading.RLock()
+        self.batch_depth = 0
+
+    def __execute(self, sql, parameters=()):
+        with self.lock:
+            return self.connection.execute(sql, parameters).fetchall()
+
+    def load_properties(self, owner_type, owner_id):
+        rows = self.__execute("SELECT properties FROM properties WHERE owner_type=? AND owner_id=?",
+                              (owner_type, owner_id))
+        return json.loads(rows[0][0]) if rows else None
+
+    def get_properties_stamp(self, owner_type, owner_id):
+        rows = self.__execute("SELECT version FROM properties WHERE owner_type=? AND owner_id=?",
+                              (owner_type, owner_id))
+        return rows[0][0] if rows else None
+
+    def save_properties(self, owner_type, owner_id, properties):
+        with self.batch():
+            if properties is None:
+                self.__execute("DELETE FROM properties WHERE owner_type=? AND owner_id=?", (owner_type, owner_id))
+            else:
+                self.__execute("INSERT INTO properties (owner_type, owner_id, properties, version) VALUES (?,?,?,1) "
+                               "ON CONFLICT (owner_type, owner_id) "
+                               "DO UPDATE SET properties=excluded.properties, version=version+1",
+                               (owner_type, owner_id, json.dumps(properties)))
+
+    def get_data(self, owner_type, owner_id, key):
+        rows = self.__execute("SELECT data FROM data WHERE owner_type=? AND owner_id=? AND key=?",
+                              (owner_type, owner_id, key))
+        return rows[0][0] if rows else None
+
+    def set_data(self, owner_type, owner_id, key, data):
+        with self.batch():
+            if data is None:
+                self.__execute("DELETE FROM data WHERE owner_type=? AND owner_id=? AND key=?",
+                               (owner_type, owner_id, key))
+            else:
+                self.__execute("INSERT OR REPLACE INTO data (owner_type, owner_id, key, data) VALUES (?,?,?,?)",
+                               (owner_type, owner_id, key, data))
+
+    def list_keys(self, owner_type, owner_id):
+        return [key for (key,) in self.__execute("SELECT key FROM data WHERE owner_type=? AND owner_id=?",
+                                                  (owner_type, owner_id))]
+
+    def list_entries(self):
+        entries = []
+        for (owner_type, owner_id) in self.__execute("SELECT owner_type, owner_id FROM properties"):
+            entries.append(StorageBase.format_entry(owner_type, owner_id))
+        for (owner_type, owner_id, key) in self.__execute("SELECT owner_type, owner_id, key FROM data"):
+            entries.append(StorageBase.format_entry(owner_type, owner_id, key))
+        return entries
+
+    def open_data_writer(self, owner_type, owner_id, key):
+        if not hasattr(self.connection, "blobopen"):
+            return super().open_data_writer(owner_type, owner_id, key)
+
+        def commit(f):
+            # python 3.11+, copy the staged data into the database incrementally rather than loading it into memory
+            with f:
+                size = f.seek(0, io.SEEK_END)
+                f.seek(0)
+                with self.batch():
+                    self.__execute("INSERT OR REPLACE INTO data (owner_type, owner_id, key, data) "
+                                   "VALUES (?,?,?,zeroblob(?))", (owner_type, owner_id, key, size))
+                    rows = self.__execute("SELECT rowid FROM data WHERE owner_type=? AND owner_id=? AND key=?",
+                                          (owner_type, owner_id, key))
+                    with self.connection.blobopen("data", "data", rows[0][0]) as blob:
+                        shutil.copyfileobj(f, blob)
+
+        return DataWriter(tempfile.TemporaryFile(), commit, lambda f: f.close())
+
+    def open_entry(self, entry):
+        (owner_type, owner_id, key) = StorageBase.parse_entry(entry)
+        if key is None:
+            rows = self.__execute("SELECT properties FROM properties WHERE owner_type=? AND owner_id=?",
+                                  (owner_type, owner_id))
+            if not rows:
+                raise FileNotFoundError(entry)
+            return io.BytesIO(rows[0][0].encode("utf-8"))
+        rows = self.__execute("SELECT rowid FROM data WHERE owner_type=? AND owner_id=? AND key=?",
+                              (owner_type, owner_id, key))
+        if not rows:
+            raise FileNotFoundError(entry)
+        if hasattr(self.connection, "blobopen"):
+            # python 3.11+, read the data incrementally rather than loading it into memory
+            with self.lock:
+                return self.connection.blobopen("data", "data", rows[0][0], readonly=True)
+        return io.BytesIO(self.get_data(owner_type, owner_id, key))
+
+    def get_entry_size(self, entry):
+        (owner_type, owner_id, key) = StorageBase.parse_entry(entry)
+        if key is None:
+            rows = self.__execute("SELECT length(CAST(properties AS BLOB)) FROM properties "
+                                  "WHERE owner_type=? AND owner_id=?", (owner_type, owner_id))
+        else:
+            rows = self.__execute("SELECT length(data) FROM data WHERE owner_type=? AND owner_id=? AND key=?",
+                                  (owner_type, owner_id, key))
+        return rows[0][0] if rows else None
+
+    def write_entry(self, entry, from_file):
+        parsed = StorageBase.parse_entry(entry)
+        if parsed is None:
+            return # only properties and data are stored
+        (owner_type, owner_id, key) = parsed
+        content = from_file.read()
+        if key is None:
+            self.save_properties(owner_type, owner_id, json.loads(content.decode("utf-8")))
+        else:
+            self.set_data(owner_type, owner_id, key, content)
+
+    @contextmanager
+    def batch(self):
+        with self.lock:
+            if self.batch_depth == 0:
+                self.connection.execute("BEGIN IMMEDIATE")
+            self.batch_depth += 1
+            try:
+                yield self
+            except:
+                self.batch_depth -= 1
+                if self.batch_depth == 0:
+                    self.connection.execute("ROLLBACK")
+                raise
+            else:
+                self.batch_depth -= 1
+                if self.batch_depth == 0:
+                    self.connection.execute("COMMIT")
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
@@ -0,0 +1,189 @@
+#   Hyrrokkin - a Python library for building and running executable graphs
+#
+#   MIT License - Copyright (C) 2022-2023  Visual Topology Ltd
+#
+#   Permission is hereby granted, free of charge, to any person obtaining a copy of this software
+#   and associated documentation files (the "Software"), to deal in the Software without
+#   restriction, including without limitation the rights to use, copy, modify, merge, publish,
+#   distribute, sublicense, and/or sell copies of the Software, and to permit persons to whom the
+#   Software is furnished to do so, subject to the following conditions:
+#
+#   The above copyright notice and this permission notice shall be included in all copies or
+#   substantial portions of the Software.
+#
+#   THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING
+#   BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+#   NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM,
+#   DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#   OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+from abc import abstractmethod
+from contextlib import contextmanager
+import os
+import tempfile
+import zipfile
+
+from hyrrokkin.storage.data_writer import DataWriter
+
+class StorageBase:
+    """
+    Defines the interface for storage backends which hold the properties and data of nodes and package configurations
+
+    Properties and data are identified by an owner type ("node" or "package") and the owner's id.  When saving and
+    loading zip files, the stored items are exchanged as entries named by their path within the zip file, for example
+    node/<node-id>/properties.json and node/<node-id>/data/<key>
+    """
+
+    @abstractmethod
+    def load_properties(self, owner_type, owner_id):
+        """
+        Return the properties of an owner as a dictionary, or None if no properties are stored
+        """
+        pass
+
+    @abstractmethod
+    def get_properties_stamp(self, owner_type, owner_id):
+        """
+        Return a value which changes whenever the properties of an owner are saved, used to check that cached
+        properties are still current
+        """
+        pass
+
+    @abstractmethod
+    def save_properties(self, owner_type, owner_id, properties):
+        """
+        Save the properties of an owner, or remove them if properties is None
+        """
+        pass
+
+    @abstractmethod
+    def get_data(self, owner_type, owner_id, key):
+        """
+        Return the data stored under a key as bytes, or None if no data is stored
+        """
+        pass
+
+    @abstractmethod
+    def set_data(self, owner_type, owner_id, key, data):
+        """
+        Store data (bytes) under a key, or remove the data if data is None
+        """
+        pass
+
+    def open_data(self, owner_type, owner_id, key):
+        """
+        Open the data stored under a key, returning a binary file object opened for reading, or None if no data
+        is stored
+        """
+        try:
+            return self.open_entry(StorageBase.format_entry(owner_type, owner_id, key))
+        except FileNotFoundError:
+            return None
+
+    def open_data_writer(self, owner_type, owner_id, key):
+        """
+        Open a binary file object for writing data to be stored under a key.  The data replaces any existing data
+        when the file object is closed.
+        """
+        entry = StorageBase.format_entry(owner_type, owner_id, key)
+
+        def commit(f):
+            with f:
+                f.seek(0)
+                self.write_entry(entry, f)
+
+        return DataWriter(tempfile.TemporaryFile(), commit, lambda f: f.close())
+
+    def map_data(self, owner_type, owner_id, key):
+        """
+        Return a read-only memoryview of the data stored under a key, or None if no data is stored.  Backends
+        which keep data in files map the file into memory rather than reading it.
+        """
+        data = self.get_data(owner_type, owner_id, key)
+        return memoryview(data) if data is not None else None
+
+    def list_keys(self, owner_type, owner_id):
+        """
+        Return a list of the keys under which data is stored for an owner
+        """
+        keys = []
+        for entry in self.list_entries():
+            parsed = StorageBase.parse_entry(entry)
+            if parsed is not None and parsed[0] == owner_type and parsed[1] == owner_id and parsed[2] is not None:
+                keys.append(parsed[2])
+        return keys
+
+    @abstractmethod
+    def list_entries(self):
+        """
+        Return a list of the names of all stored entries
+        """
+        pass
+
+    @abstractmethod
+    def open_entry(self, entry):
+        """
+        Open a stored entry, returning a binary file object opened for reading
+        """
+        pass
+
+    def get_entry_size(self, entry):
+        """
+        Return the size in bytes of a stored entry, or None if the size is not known without reading the entry
+        """
+        return None
+
+    @abstractmethod
+    def write_entry(self, entry, from_file):
+        """
+        Store an entry, reading its contents from a binary file object
+        """
+        pass
+
+    def write_lazy_entry(self, entry, archive_path, member_name):
+        """
+        Store an entry from a member of a zip file.  Backends may defer reading the member until the entry is accessed,
+        in which case the zip file must not be modified or removed.
+        """
+        with zipfile.ZipFile(archive_path) as zf:
+            with zf.open(member_name) as from_file:
+                self.write_entry(entry, from_file)
+
+    def remove_unused_archives(self, archive_folder):
+        """
+        Remove the zip files in archive_folder which are no longer needed by entries stored with write_lazy_entry
+        """
+        # entries are read from the zip file when they are stored, so no zip file is needed afterwards
+        if os.path.isdir(archive_folder):
+            for filename in os.listdir(archive_folder):
+                os.remove(os.path.join(archive_folder, filename))
+
+    @contextmanager
+    def batch(self):
+        """
+        Group a sequence of updates, which backends may write in a single transaction.  Batches on the same
+        storage do not interleave, so a batch can safely read and then update stored values.
+        """
+        yield self
+
+    def close(self):
+        pass
+
+    @staticmethod
+    def parse_entry(entry):
+        """
+        Parse an entry name, returning a tuple (owner_type, owner_id, key) where key is None for properties,
+        or None if the name does not identify properties or data
+        """
+        comps = entry.split("/")
+        if len(comps) == 3 and comps[2] == "properties.json":
+            return (comps[0], comps[1], None)
+        if len(comps) == 4 and comps[2] == "data":
+            return (comps[0], comps[1], comps[3])
+        return None
+
+    @staticmethod
+    def format_entry(owner_type, owner_id, key=None):
+        if key is None:
+            return f"{owner_type}/{owner_id}/properties.json"
+        return f"{owner_type}/{owner_id}/data/{key}"
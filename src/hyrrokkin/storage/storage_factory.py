@@ -0,0 +1,48 @@
+#   Hyrrokkin - a Python library for building and running executable graphs
+#
+#   MIT License - Copyright (C) 2022-2023  Visual Topology Ltd
+#
+#   Permission is hereby granted, free of charge, to any person obtaining a copy of this software
+#   and associated documentation files (the "Software"), to deal in the Software without
+#   restriction, including without limitation the rights to use, copy, modify, merge, publish,
+#   distribute, sublicense, and/or sell copies of the Software, and to permit persons to whom the
+#   Software is furnished to do so, subject to the following conditions:
+#
+#   The above copyright notice and this permission notice shall be included in all copies or
+#   substantial portions of the Software.
+#
+#   THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING
+#   BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+#   NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM,
+#   DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#   OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+from hyrrokkin.storage.directory_storage import DirectoryStorage
+from hyrrokkin.storage.memory_storage import MemoryStorage
+from hyrrokkin.storage.sqlite_storage import SqliteStorage
+
+class StorageFactory:
+
+    STORAGE_TYPES = {
+        "directory": DirectoryStorage,
+        "sqlite": SqliteStorage,
+        "memory": MemoryStorage.get_instance
+    }
+
+    @staticmethod
+    def create(storage_type, root_folder, **options):
+        """
+        Create a storage backend
+
+        Args:
+            storage_type: the name of the backend, one of "directory", "sqlite" or "memory"
+            root_folder: the execution folder in which the backend stores properties and data
+            options: backend specific options, for example spill_threshold for "memory"
+
+        Raises:
+            ValueError: if the storage type is not recognised
+        """
+        if storage_type not in StorageFactory.STORAGE_TYPES:
+            raise ValueError(f"Unknown storage type {storage_type}, should be one of "
+                             f"({','.join(StorageFactory.STORAGE_TYPES)})")
+        return StorageFactory.STORAGE_TYPES[storage_type](root_folder, **options)
@@ -17,13 +17,81 @@
 #   DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
 #   OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
 
-import os
-import json
+import gzip
+import hashlib
+import io
+import shutil
+import tempfile
+import threading
+from contextlib import contextmanager
+from copy import deepcopy
+
+from hyrrokkin.storage.data_writer import DataWriter
+from hyrrokkin.storage.directory_storage import DirectoryStorage
+from hyrrokkin.storage.storage_base import StorageBase
+
+class _DecompressingReader(gzip.GzipFile):
+    # a reader for gzip compressed data which also closes the file object it reads from
+
+    def __init__(self, fileobj):
+        super().__init__(fileobj=fileobj, mode="rb")
+        self.compressed_file = fileobj
+
+    def close(self):
+        try:
+            super().close()
+        finally:
+            self.compressed_file.close()
 
 class DataStoreUtils:
 
-    def __init__(self, root_folder):
+    # when deduplicating, data is stored once per distinct content as a blob owned by BLOB_OWNER_TYPE and identified
+    # by the SHA-256 of the content, and each data key stores the hash in a reference (the key with REFERENCE_SUFFIX)
+    BLOB_OWNER_TYPE = "blob"
+    BLOB_KEY = "content"
+    REFERENCE_SUFFIX = ".ref"
+
+    # compressed data is stored gzip compressed under the key with COMPRESSED_SUFFIX, so that save_zip stores it as-is
+    COMPRESSED_SUFFIX = ".gz"
+    COMPRESSION_LEVEL = 6
+
+    CHUNK_SIZE = 1024*1024
+
+    def __init__(self, root_folder, write_back=False, storage=None, deduplicate=False,
+                 compress_threshold=None, compress_keys=()):
         self.root_folder = root_folder
+        # the backend which stores properties and data, by default a directory tree under root_folder
+        self.storage = storage if storage is not None else DirectoryStorage(root_folder)
+        # when write_back is set, properties are cached in memory and changes are only written when flush is called
+        self.write_back = write_back
+        self.property_cache = {}  # (file-type, owner-id) => properties dict, or None if there are no properties
+        self.property_stamps = {}  # (file-type, owner-id) => storage stamp of the properties when cached
+        self.dirty_properties = set()  # (file-type, owner-id) for cached properties not yet written
+        self.write_lock = threading.RLock()
+        # when deduplicate is set, data is written as reference counted, content addressed blobs
+        # data written either way can always be read
+        self.deduplicate = deduplicate
+        # data is compressed when written if its key is in compress_keys, or its size is at least compress_threshold
+        # (for data written via open_..._data_writer, only compress_keys applies unless deduplicating)
+        # compressed data is decompressed transparently when read
+        self.compress_threshold = compress_threshold
+        self.compress_keys = set(compress_keys)
+
+    def get_storage(self):
+        return self.storage
+
+    def batch(self):
+        """
+        Obtain a context manager which groups a sequence of writes into a single storage batch
+        """
+        return self.__write_batch()
+
+    @contextmanager
+    def __write_batch(self):
+        # writes may be made from several threads (see ExecutionEngine.run_io), hold the lock so that they do not
+        # interleave even if the storage backend does not serialise its batches
+        with self.write_lock, self.storage.batch():
+            yield
 
     @staticmethod
     def __check_valid_data_key(key):
@@ -31,61 +99,222 @@ class DataStoreUtils:
             if not c.isalnum() and c != '_':
                 raise ValueError("data key can only contain alphanumeric characters and underscores")
 
-    def __get_data(self, owner_id, file_type, key):
+    def __get_data(self, owner_id, file_type, key, mmap=False):
+        if mmap:
+            return self.__read_data(owner_id, file_type, key, self.storage.map_data,
+                                    lambda compressed: memoryview(gzip.decompress(compressed)))
+        return self.__read_data(owner_id, file_type, key, self.storage.get_data, gzip.decompress)
+
+    def __open_data(self, owner_id, file_type, key):
+        return self.__read_data(owner_id, file_type, key, self.storage.open_data, _DecompressingReader)
+
+    def __read_data(self, owner_id, file_type, key, read_fn, decompress_fn):
+        # read data using read_fn(owner_type, owner_id, key), following any reference to deduplicated data
         DataStoreUtils.__check_valid_data_key(key)
-        filepath = os.path.join(self.root_folder, file_type, owner_id, "data", key)
+        result = self.__read_content(file_type, owner_id, key, read_fn, decompress_fn)
+        if result is None:
+            blob_hash = self.__get_blob_hash(owner_id, file_type, key)
+            if blob_hash is not None:
+                result = self.__read_content(DataStoreUtils.BLOB_OWNER_TYPE, blob_hash, DataStoreUtils.BLOB_KEY,
+                                             read_fn, decompress_fn)
+        return result
+
+    def __read_content(self, owner_type, owner_id, key, read_fn, decompress_fn):
+        # read data stored under a key, applying decompress_fn if the data is stored compressed
+        result = read_fn(owner_type, owner_id, key)
+        if result is None:
+            compressed = read_fn(owner_type, owner_id, key + DataStoreUtils.COMPRESSED_SUFFIX)
+            if compressed is not None:
+                result = decompress_fn(compressed)
+        return result
 
-        if os.path.exists(filepath):
-            with open(filepath, mode="rb") as f:
-                return f.read()
+    def __write_content(self, owner_type, owner_id, key, data, compress):
+        # store data under a key, compressed or uncompressed, removing the data in the other form
+        if compress:
+            self.storage.set_data(owner_type, owner_id, key + DataStoreUtils.COMPRESSED_SUFFIX,
+                                  gzip.compress(data, compresslevel=DataStoreUtils.COMPRESSION_LEVEL, mtime=0))
+            self.storage.set_data(owner_type, owner_id, key, None)
         else:
-            return None
+            self.storage.set_data(owner_type, owner_id, key, data)
+            self.storage.set_data(owner_type, owner_id, key + DataStoreUtils.COMPRESSED_SUFFIX, None)
+
+    def __should_compress(self, key, size):
+        if key in self.compress_keys:
+            return True
+        return self.compress_threshold is not None and size >= self.compress_threshold
 
     def __set_data(self, owner_id, file_type, key, data):
         DataStoreUtils.__check_valid_data_key(key)
+        if data is not None and not isinstance(data, bytes):
+            raise ValueError("data passed to set_data must be bytes")
+        compress = data is not None and self.__should_compress(key, len(data))
+        if self.deduplicate and data is not None:
+            self.__set_blob_reference(owner_id, file_type, key, hashlib.sha256(data).hexdigest(),
+                lambda blob_hash: self.__write_content(DataStoreUtils.BLOB_OWNER_TYPE, blob_hash,
+                                                       DataStoreUtils.BLOB_KEY, data, compress))
+        else:
+            with self.__write_batch():
+                self.__remove_blob_reference(owner_id, file_type, key)
+                self.__write_content(file_type, owner_id, key, data, compress)
+
+    def __open_data_writer(self, owner_id, file_type, key):
+        DataStoreUtils.__check_valid_data_key(key)
+        if not self.deduplicate:
+            # the size of the data is not known in advance, so only the keys policy decides whether to compress
+            compress = key in self.compress_keys
+            compressed_key = key + DataStoreUtils.COMPRESSED_SUFFIX
+            writer = self.storage.open_data_writer(file_type, owner_id, compressed_key if compress else key)
+            f = gzip.GzipFile(fileobj=writer, mode="wb", compresslevel=DataStoreUtils.COMPRESSION_LEVEL,
+                              mtime=0) if compress else writer
 
-        folder = os.path.join(self.root_folder, file_type, owner_id, "data")
+            def commit(f):
+                with self.__write_batch():
+                    if compress:
+                        f.close()
+                    writer.close()
+                    self.storage.set_data(file_type, owner_id, key if compress else compressed_key, None)
+                    self.__remove_blob_reference(owner_id, file_type, key)
 
-        filepath = os.path.join(folder, key)
+            def discard(f):
+                if compress:
+                    f.close()
+                writer.discard()
 
-        if data is None:
-            if os.path.exists(filepath):
-                os.remove(filepath)
-            return
+            return DataWriter(f, commit, discard)
+
+        def commit_blob(f):
+            # the hash is only known when all the data has been written, so stage the data in a temporary file
+            with f:
+                size = f.seek(0, io.SEEK_END)
+                f.seek(0)
+                digest = hashlib.sha256()
+                for chunk in iter(lambda: f.read(DataStoreUtils.CHUNK_SIZE), b""):
+                    digest.update(chunk)
+
+                def write_blob(blob_hash):
+                    f.seek(0)
+                    if self.__should_compress(key, size):
+                        compressed_key = DataStoreUtils.BLOB_KEY + DataStoreUtils.COMPRESSED_SUFFIX
+                        with self.storage.open_data_writer(DataStoreUtils.BLOB_OWNER_TYPE, blob_hash,
+                                                           compressed_key) as writer:
+                            with gzip.GzipFile(fileobj=writer, mode="wb",
+                                               compresslevel=DataStoreUtils.COMPRESSION_LEVEL, mtime=0) as to_file:
+                                shutil.copyfileobj(f, to_file)
+                    else:
+                        self.storage.write_entry(StorageBase.format_entry(DataStoreUtils.BLOB_OWNER_TYPE, blob_hash,
+                                                                          DataStoreUtils.BLOB_KEY), f)
 
-        os.makedirs(folder, exist_ok=True)
+                self.__set_blob_reference(owner_id, file_type, key, digest.hexdigest(), write_blob)
 
-        if isinstance(data, bytes):
-            with open(filepath, "wb") as f:
-                f.write(data)
+        return DataWriter(tempfile.TemporaryFile(), commit_blob, lambda f: f.close())
+
+    def __set_blob_reference(self, owner_id, file_type, key, blob_hash, write_blob_fn):
+        # refer a data key to the blob with the given hash, calling write_blob_fn(blob_hash) if the blob is not stored
+        with self.__write_batch():
+            if self.__get_blob_hash(owner_id, file_type, key) == blob_hash:
+                return # the content is unchanged, nothing needs to be written
+            self.__remove_blob_reference(owner_id, file_type, key)
+            self.__acquire_blob(blob_hash, write_blob_fn)
+            self.storage.set_data(file_type, owner_id, key + DataStoreUtils.REFERENCE_SUFFIX, blob_hash.encode("ascii"))
+            # remove any copy of the data stored before deduplication was enabled
+            self.storage.set_data(file_type, owner_id, key, None)
+
+    def __remove_blob_reference(self, owner_id, file_type, key):
+        blob_hash = self.__get_blob_hash(owner_id, file_type, key)
+        if blob_hash is not None:
+            self.storage.set_data(file_type, owner_id, key + DataStoreUtils.REFERENCE_SUFFIX, None)
+            self.__release_blob(blob_hash)
+
+    def __get_blob_hash(self, owner_id, file_type, key):
+        reference = self.storage.get_data(file_type, owner_id, key + DataStoreUtils.REFERENCE_SUFFIX)
+        return reference.decode("ascii") if reference is not None else None
+
+    def __acquire_blob(self, blob_hash, write_blob_fn):
+        # blob properties hold the number of data keys referring to the blob
+        properties = self.storage.load_properties(DataStoreUtils.BLOB_OWNER_TYPE, blob_hash)
+        if properties is None:
+            write_blob_fn(blob_hash)
+            properties = {"references": 0}
+        properties["references"] += 1
+        self.storage.save_properties(DataStoreUtils.BLOB_OWNER_TYPE, blob_hash, properties)
+
+    def __release_blob(self, blob_hash):
+        properties = self.storage.load_properties(DataStoreUtils.BLOB_OWNER_TYPE, blob_hash)
+        if properties is None:
+            return
+        properties["references"] -= 1
+        if properties["references"] > 0:
+            self.storage.save_properties(DataStoreUtils.BLOB_OWNER_TYPE, blob_hash, properties)
         else:
-            raise ValueError("data passed to set_data must be bytes")
+            self.__write_content(DataStoreUtils.BLOB_OWNER_TYPE, blob_hash, DataStoreUtils.BLOB_KEY, None, False)
+            self.storage.save_properties(DataStoreUtils.BLOB_OWNER_TYPE, blob_hash, None)
 
     def __save_properties(self, owner_id, file_type, properties):
-        folder = os.path.join(self.root_folder, file_type, owner_id)
+        if self.write_back:
+            key = (file_type, owner_id)
+            self.property_cache[key] = deepcopy(properties)
+            self.dirty_properties.add(key)
+        else:
+            self.storage.save_properties(file_type, owner_id, properties)
+
+    def __load_properties(self, owner_id, file_type, copy=True):
+        if not self.write_back:
+            return self.__read_properties(owner_id, file_type)
 
-        path = os.path.join(folder, "properties.json")
+        key = (file_type, owner_id)
+        # unwritten changes take precedence, otherwise check that the properties have not been changed by another process
+        if key not in self.dirty_properties:
+            stamp = self.storage.get_properties_stamp(file_type, owner_id)
+            if key not in self.property_cache or self.property_stamps.get(key) != stamp:
+                self.property_cache[key] = self.__read_properties(owner_id, file_type)
+                self.property_stamps[key] = stamp
+        properties = self.property_cache[key]
         if properties is None:
-            if os.path.exists(path):
-                os.remove(path)
-        else:
-            os.makedirs(folder, exist_ok=True)
-            with open(path,"w") as f:
-                f.write(json.dumps(properties))
+            return {}
+        return deepcopy(properties) if copy else properties
 
-    def __load_properties(self, owner_id, file_type):
-        folder = os.path.join(self.root_folder, file_type, owner_id)
+    def __read_properties(self, owner_id, file_type):
+        properties = self.storage.load_properties(file_type, owner_id)
+        return properties if properties is not None else {}
 
-        path = os.path.join(folder, "properties.json")
-        if os.path.exists(path):
-            with open(path) as f:
-                return json.loads(f.read())
+    def invalidate_node_properties(self, node_id, property_updates=None):
+        """
+        Discard any cached properties for a node after the properties have been updated elsewhere.  If the node
+        has unwritten changes and property_updates (property name => new value, or None if the property was removed)
+        describes the update, the update is applied to the cached properties so that the unwritten changes are kept.
+        Otherwise the unwritten changes are discarded.
+        """
+        key = ("node", node_id)
+        if property_updates is not None and key in self.dirty_properties:
+            properties = self.property_cache[key]
+            if properties is None:
+                properties = self.property_cache[key] = {}
+            for (property_name, property_value) in property_updates.items():
+                if property_value is not None:
+                    properties[property_name] = deepcopy(property_value)
+                else:
+                    properties.pop(property_name, None)
+            return
+        self.property_cache.pop(key, None)
+        self.property_stamps.pop(key, None)
+        self.dirty_properties.discard(key)
 
-        return {}
+    def flush(self):
+        """
+        Write any cached property changes
+        """
+        if not self.dirty_properties:
+            return
+        with self.__write_batch():
+            for key in self.dirty_properties:
+                (file_type, owner_id) = key
+                self.storage.save_properties(file_type, owner_id, self.property_cache[key])
+                self.property_stamps[key] = self.storage.get_properties_stamp(file_type, owner_id)
+        self.dirty_properties = set()
 
     def get_node_property(self, node_id, property_name):
-        properties = self.__load_properties(node_id, "node")
-        return properties.get(property_name, None)
+        properties = self.__load_properties(node_id, "node", copy=False)
+        return deepcopy(properties.get(property_name, None))
 
     def set_node_property(self, node_id, property_name, property_value):
         properties = self.__load_properties(node_id, "node")
@@ -102,15 +331,31 @@ class DataStoreUtils:
     def set_node_properties(self, node_id, properties):
         self.__save_properties(node_id, "node", properties)
 
-    def get_node_data(self, node_id, key):
-        return self.__get_data(node_id, "node", key)
+    def get_node_data(self, node_id, key, mmap=False):
+        return self.__get_data(node_id, "node", key, mmap)
+
+    def open_node_data(self, node_id, key):
+        return self.__open_data(node_id, "node", key)
+
+    def open_node_data_writer(self, node_id, key):
+        return self.__open_data_writer(node_id, "node", key)
 
     def set_node_data(self, node_id, key, data):
         self.__set_data(node_id, "node", key, data)
 
+    def remove_node_data(self, node_id):
+        """
+        Remove all data stored for a node, releasing its references to any deduplicated data
+        """
+        with self.__write_batch():
+            for key in self.storage.list_keys("node", node_id):
+                if key.endswith(DataStoreUtils.REFERENCE_SUFFIX):
+                    self.__release_blob(self.storage.get_data("node", node_id, key).decode("ascii"))
+                self.storage.set_data("node", node_id, key, None)
+
     def get_package_property(self, package_id, property_name):
-        properties = self.__load_properties(package_id, "package")
-        return properties.get(property_name, None)
+        properties = self.__load_properties(package_id, "package", copy=False)
+        return deepcopy(properties.get(property_name, None))
 
     def set_package_property(self, package_id, property_name, property_value):
         properties = self.__load_properties(package_id, "package")
@@ -127,8 +372,14 @@ class DataStoreUtils:
     def set_package_properties(self, package_id, properties):
         self.__save_properties(package_id, "package", properties)
 
-    def get_package_data(self, package_id, key):
-        return self.__get_data(package_id, "package", key)
+    def get_package_data(self, package_id, key, mmap=False):
+        return self.__get_data(package_id, "package", key, mmap)
+
+    def open_package_data(self, package_id, key):
+        return self.__open_data(package_id, "package", key)
+
+    def open_package_data_writer(self, package_id, key):
+        return self.__open_data_writer(package_id, "package", key)
 
     def set_package_data(self, package_id, key, data):
         self.__set_data(package_id, "package", key, data)
@@ -18,10 +18,15 @@
 #   OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
 
 from importlib import import_module, resources
+import importlib.util
 
 
 class ResourceLoader:
 
+    # caches shared by all users within the process
+    class_cache = {}  # fully qualified class name => class
+    classname_cache = {}  # (package path, class name) => fully qualified class name
+
     @staticmethod
     def split_resource_path(resource_path):
         if resource_path.startswith("/"):
@@ -51,7 +56,28 @@ class ResourceLoader:
 
     @staticmethod
     def get_class(module_class_name):
-        module_path, class_name = module_class_name.rsplit('.', 1)
-        module = import_module(module_path)
-        cls = getattr(module, class_name)
+        cls = ResourceLoader.class_cache.get(module_class_name, None)
+        if cls is None:
+            module_path, class_name = module_class_name.rsplit('.', 1)
+            module = import_module(module_path)
+            cls = getattr(module, class_name)
+            ResourceLoader.class_cache[module_class_name] = cls
         return cls
+
+    @staticmethod
+    def resolve_classname(package_path, classname):
+        """
+        Resolve a class name which may be relative to a package or fully qualified, returning the fully
+        qualified class name.  The module defining the class is located but not imported.
+        """
+        key = (package_path, classname)
+        if key not in ResourceLoader.classname_cache:
+            # assume relative first
+            fq_classname = package_path + "." + classname
+            try:
+                is_relative = importlib.util.find_spec(fq_classname.rsplit('.', 1)[0]) is not None
+            except Exception:
+                # for example the package path is not a package, or importing a parent package fails
+                is_relative = False
+            ResourceLoader.classname_cache[key] = fq_classname if is_relative else classname
+        return ResourceLoader.classname_cache[key]
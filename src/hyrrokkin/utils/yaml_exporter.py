@@ -19,46 +19,69 @@
 
 from yaml import dump
 
+try:
+    # use the faster libyaml based dumper where it is available
+    from yaml import CDumper as Dumper
+except ImportError:
+    from yaml import Dumper
+
+
+def dump_section(value, to_file, indent=""):
+    text = dump(value, Dumper=Dumper, default_flow_style=False, sort_keys=False)
+    if indent:
+        text = "".join(indent + line for line in text.splitlines(keepends=True))
+    to_file.write(text)
+
 
 def export_to_yaml(from_topology,to_file):
+    # the document is written section by section, and nodes and links one at a time,
+    # so that memory use does not grow with the size of the topology
     node_ids = from_topology.get_node_ids()
 
+    node_types = {}  # node-id => (package-id, node-type-id)
     configuration = {}
 
     for node_id in node_ids:
-        package_id, _ = from_topology.get_node_type(node_id)
+        package_id, node_type = from_topology.get_node_type(node_id)
+        node_types[node_id] = (package_id, node_type)
         if package_id not in configuration:
             configuration[package_id] = from_topology.get_package_properties(package_id)
 
-    exported = {
-        "metadata":from_topology.get_metadata(),
-        "configuration":configuration,
-        "nodes":{},
-        "links":[]
-    }
+    dump_section({"metadata": from_topology.get_metadata()}, to_file)
+    dump_section({"configuration": configuration}, to_file)
 
-    node_types = {}
-    for node_id in node_ids:
-        package_id, node_type = from_topology.get_node_type(node_id)
-        properties = from_topology.get_node_properties(node_id)
-        fq_node_type = package_id + ":" + node_type
-        node_types[node_id] = fq_node_type
-        exported["nodes"][node_id] = {"type":fq_node_type, "properties":properties}
-
-    link_ids = from_topology.get_link_ids()
-    for link_id in link_ids:
-        from_node_id,from_port,to_node_id,to_port = from_topology.get_link(link_id)
-        from_ports = from_topology.get_output_port_names(from_node_id)
-        to_ports = from_topology.get_input_port_names(to_node_id)
-        s = from_node_id
-        if len(from_ports) > 1:
-            s += ":" + from_port
-        s += " => "
-        s += to_node_id
-        if len(to_ports) > 1:
-            s += ":" + to_port
-        exported["links"].append(s)
+    if node_ids:
+        to_file.write("nodes:\n")
+        for node_id in node_ids:
+            package_id, node_type = node_types[node_id]
+            properties = from_topology.get_node_properties(node_id)
+            fq_node_type = package_id + ":" + node_type
+            dump_section({node_id: {"type": fq_node_type, "properties": properties}}, to_file, indent="  ")
+    else:
+        dump_section({"nodes": {}}, to_file)
 
+    # port names only need to be looked up once per node type
+    port_counts = {}  # (package-id, node-type-id) => (output-port-count, input-port-count)
 
-    dump(exported,to_file,default_flow_style=False, sort_keys=False)
+    def get_port_counts(node_id):
+        node_type = node_types[node_id]
+        if node_type not in port_counts:
+            port_counts[node_type] = (len(from_topology.get_output_port_names(node_id)),
+                                      len(from_topology.get_input_port_names(node_id)))
+        return port_counts[node_type]
 
+    link_ids = from_topology.get_link_ids()
+    if link_ids:
+        to_file.write("links:\n")
+        for link_id in link_ids:
+            from_node_id,from_port,to_node_id,to_port = from_topology.get_link(link_id)
+            s = from_node_id
+            if get_port_counts(from_node_id)[0] > 1:
+                s += ":" + from_port
+            s += " => "
+            s += to_node_id
+            if get_port_counts(to_node_id)[1] > 1:
+                s += ":" + to_port
+            dump_section([s], to_file)
+    else:
+        dump_section({"links": []}, to_file)
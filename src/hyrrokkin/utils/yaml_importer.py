@@ -17,47 +17,108 @@
 #   DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
 #   OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
 
-from yaml import load, FullLoader
+import logging
+import time
 
+from yaml import load
+
+try:
+    # use the faster libyaml based loader where it is available
+    from yaml import CFullLoader as Loader
+except ImportError:
+    from yaml import FullLoader as Loader
+
+from hyrrokkin.exceptions.invalid_link_error import InvalidLinkError
+from hyrrokkin.exceptions.invalid_node_error import InvalidNodeError
+
+logger = logging.getLogger("yaml_importer")
+
+def parse_link_spec(link_spec):
+    if not isinstance(link_spec, str) or "=>" not in link_spec:
+        raise InvalidLinkError(f"Invalid link {link_spec}, expecting from_node[:from_port] => to_node[:to_port]")
+    from_to = link_spec.split("=>")
+    from_parts = from_to[0].strip().split(":")
+    from_node_id = from_parts[0]
+    from_port = from_parts[1] if len(from_parts) > 1 else None
+    to_parts = from_to[1].strip().split(":")
+    to_node_id = to_parts[0]
+    to_port = to_parts[1] if len(to_parts) > 1 else None
+    return (from_node_id, from_port, to_node_id, to_port)
+
+def check_link_port(link_spec, node_id, port, ports, direction):
+    # check a port named in a link (or the default port if the name is omitted) against the node type's ports
+    if port is None:
+        if len(ports) != 1:
+            port_names = ",".join(list(ports.keys()))
+            raise InvalidLinkError(f"Link {link_spec} does not specify the {direction} port for node {node_id}, should be one of ({port_names})")
+        port = next(iter(ports))
+    elif port not in ports:
+        raise InvalidLinkError(f"Link {link_spec} refers to {port} which is not a valid {direction} port for node {node_id}")
+    return ports[port]
 
 def import_from_yaml(into_topology,from_file):
 
-    cfg = load(from_file, Loader=FullLoader)
+    start_time = time.time()
+    cfg = load(from_file, Loader=Loader)
+    parsed_time = time.time()
 
     metadata = cfg.get("metadata",{})
-    into_topology.set_metadata(metadata)
-
     spec = cfg.get("configuration",{})
-    for package_id in spec:
-        package_properties = {}
-        for (name,value) in spec[package_id].items():
-            package_properties[name] = value
-        into_topology.set_configuration(package_id, package_properties)
+    nodes = cfg.get("nodes",{}) or {}
+    links = cfg.get("links",[]) or []
 
-    nodes = cfg.get("nodes",{})
+    # validate the structure of the whole specification before modifying the topology
+
+    schema = into_topology.schema
+    existing_node_ids = set(into_topology.get_node_ids())
     node_types = {}
-    if nodes:
-        for node_id in nodes:
-            node_spec = nodes[node_id]
-            node_type = node_spec["type"]
-            node_properties = node_spec.get("properties",{})
-            into_topology.add_node(node_id, node_type, node_properties)
-            node_types[node_id] = node_type
-
-    links = cfg.get("links",[])
-    if links:
-        for idx in range(len(links)):
-            link_id = "link"+str(idx)
-            link_spec = cfg["links"][idx]
-            from_to = link_spec.split("=>")
-            from_parts = from_to[0].strip().split(":")
-            from_node_id = from_parts[0]
-            from_port = from_parts[1] if len(from_parts) > 1 else None
-            to_parts = from_to[1].strip().split(":")
-            to_node_id = to_parts[0]
-            to_port = to_parts[1] if len(to_parts) > 1 else None
-
-            into_topology.add_link(link_id,from_node_id,from_port,to_node_id,to_port)
+    for node_id in existing_node_ids:
+        node_types[node_id] = schema.get_node_type(schema.form_descriptor(*into_topology.get_node_type(node_id)))
+
+    node_specs = []
+    for node_id in nodes:
+        node_spec = nodes[node_id]
+        if not isinstance(node_spec, dict) or "type" not in node_spec:
+            raise InvalidNodeError(f"Node {node_id} does not specify a type")
+        if node_id in existing_node_ids:
+            raise InvalidNodeError(f"Node with id {node_id} already exists")
+        try:
+            node_types[node_id] = schema.get_node_type(node_spec["type"])
+        except Exception:
+            raise InvalidNodeError(f"Node type {node_spec['type']} is not defined in the schema")
+        node_specs.append({"node_id": node_id, "node_type": node_spec["type"],
+                           "properties": node_spec.get("properties",{})})
+
+    link_specs = []
+    for idx in range(len(links)):
+        (from_node_id, from_port, to_node_id, to_port) = parse_link_spec(links[idx])
+        for node_id in [from_node_id, to_node_id]:
+            if node_id not in node_types:
+                raise InvalidLinkError(f"Link {links[idx]} refers to undefined node {node_id}")
+        output_port = check_link_port(links[idx], from_node_id, from_port, node_types[from_node_id].output_ports, "output")
+        input_port = check_link_port(links[idx], to_node_id, to_port, node_types[to_node_id].input_ports, "input")
+        if output_port.link_type != input_port.link_type:
+            raise InvalidLinkError(f"Link {links[idx]} connects incompatible link types "
+                                   f"(from: {output_port.link_type}, to: {input_port.link_type})")
+        link_specs.append({"link_id": "link"+str(idx), "from_node_id": from_node_id, "from_port": from_port,
+                           "to_node_id": to_node_id, "to_port": to_port})
+
+    validated_time = time.time()
+
+    with into_topology.batch():
+        into_topology.set_metadata(metadata)
+
+        for package_id in spec:
+            package_properties = {}
+            for (name,value) in spec[package_id].items():
+                package_properties[name] = value
+            into_topology.set_configuration(package_id, package_properties)
 
+        into_topology.add_nodes(node_specs)
+        into_topology.add_links(link_specs)
 
+    end_time = time.time()
 
+    logger.info(f"imported {len(node_specs)} nodes and {len(link_specs)} links "
+                f"(parse: {parsed_time-start_time:.3f}s, validate: {validated_time-parsed_time:.3f}s, "
+                f"build: {end_time-validated_time:.3f}s)")
@@ -0,0 +1,87 @@
+#   Hyrrokkin - a Python library for building and running executable graphs
+#
+#   MIT License - Copyright (C) 2022-2023  Visual Topology Ltd
+#
+#   Permission is hereby granted, free of charge, to any person obtaining a copy of this software
+#   and associated documentation files (the "Software"), to deal in the Software without
+#   restriction, including without limitation the rights to use, copy, modify, merge, publish,
+#   distribute, sublicense, and/or sell copies of the Software, and to permit persons to whom the
+#   Software is furnished to do so, subject to the following conditions:
+#
+#   The above copyright notice and this permission notice shall be included in all copies or
+#   substantial portions of the Software.
+#
+#   THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING
+#   BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+#   NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM,
+#   DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#   OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+# Measure the cost of ExecutionEngine.mark_dirty on chains and layered diamonds of increasing size
+# The time per node (chain) or per link (diamond) should stay roughly constant as the graph grows
+#
+# usage: python -m test.benchmarks.mark_dirty_benchmark
+
+import asyncio
+import tempfile
+import time
+
+from hyrrokkin.executor.execution_engine import ExecutionEngine
+from hyrrokkin.schema.schema import Schema
+
+numbergraph_package = "hyrrokkin.example_packages.numbergraph"
+
+def create_engine():
+    schema = Schema()
+    schema.load_package_from(numbergraph_package + "/schema.json")
+    return ExecutionEngine(schema.get_classmap(), tempfile.mkdtemp(), 4, {}, {})
+
+async def build_chain(engine, length):
+    for idx in range(length):
+        await engine.add_node(f"n{idx}", "numbergraph:number_display_node", loading=True)
+    for idx in range(1, length):
+        await engine.add_link(f"l{idx}", f"n{idx-1}", "data_out", f"n{idx}", "integer_data_in", loading=True)
+    return length-1
+
+async def build_diamond(engine, layers, width):
+    # each node in a layer is linked to every node in the next layer
+    link_count = 0
+    await engine.add_node("source", "numbergraph:number_display_node", loading=True)
+    previous_layer = ["source"]
+    for layer in range(layers):
+        current_layer = [f"n{layer}_{idx}" for idx in range(width)]
+        for node_id in current_layer:
+            await engine.add_node(node_id, "numbergraph:number_display_node", loading=True)
+            for from_node_id in previous_layer:
+                await engine.add_link(f"l{link_count}", from_node_id, "data_out", node_id, "integer_data_in", loading=True)
+                link_count += 1
+        previous_layer = current_layer
+    return link_count
+
+def time_mark_dirty(engine, node_id, repeats=5):
+    best = None
+    for _ in range(repeats):
+        engine.dirty_nodes = {}
+        start_time = time.perf_counter()
+        engine.mark_dirty(node_id)
+        elapsed = time.perf_counter() - start_time
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+def main():
+    print("chain")
+    for length in [1000, 2000, 4000, 8000, 16000]:
+        engine = create_engine()
+        asyncio.run(build_chain(engine, length))
+        elapsed = time_mark_dirty(engine, "n0")
+        print(f"\tnodes={length:6d} time={elapsed*1000:8.2f}ms per node={elapsed*1e6/length:6.2f}us")
+
+    print("diamond")
+    for layers in [10, 20, 40, 80]:
+        engine = create_engine()
+        link_count = asyncio.run(build_diamond(engine, layers, 20))
+        elapsed = time_mark_dirty(engine, "source")
+        print(f"\tlinks={link_count:6d} time={elapsed*1000:8.2f}ms per link={elapsed*1e6/link_count:6.2f}us")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,72 @@
+#   Hyrrokkin - a Python library for building and running executable graphs
+#
+#   MIT License - Copyright (C) 2022-2023  Visual Topology Ltd
+#
+#   Permission is hereby granted, free of charge, to any person obtaining a copy of this software
+#   and associated documentation files (the "Software"), to deal in the Software without
+#   restriction, including without limitation the rights to use, copy, modify, merge, publish,
+#   distribute, sublicense, and/or sell copies of the Software, and to permit persons to whom the
+#   Software is furnished to do so, subject to the following conditions:
+#
+#   The above copyright notice and this permission notice shall be included in all copies or
+#   substantial portions of the Software.
+#
+#   THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING
+#   BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+#   NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM,
+#   DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#   OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+# Compare the time taken by Network.load_dir to load a topology from topology.json and from a binary snapshot
+#
+# usage: python -m test.benchmarks.snapshot_benchmark
+
+import os
+import tempfile
+import time
+
+from hyrrokkin.model.network import Network
+from hyrrokkin.model.node import Node
+from hyrrokkin.model.link import Link
+from hyrrokkin.schema.schema import Schema
+
+numbergraph_package = "hyrrokkin.example_packages.numbergraph"
+
+def create_schema():
+    schema = Schema()
+    schema.load_package_from(numbergraph_package + "/schema.json")
+    return schema
+
+def build_network(schema, node_count):
+    # a set of chains, each of 10 display nodes
+    network = Network(schema, tempfile.mkdtemp(), use_snapshot=True)
+    with network.batch():
+        for idx in range(node_count):
+            network.add_node(Node(f"n{idx}", "numbergraph:number_display_node", idx % 100, idx // 100, None))
+            if idx % 10:
+                network.add_link(Link(f"l{idx}", f"n{idx-1}", "data_out", f"n{idx}", "integer_data_in",
+                                      "numbergraph:integer"))
+    return network.get_directory()
+
+def time_load_dir(schema, savedir, repeats=3):
+    best = None
+    for _ in range(repeats):
+        network = Network(schema, savedir)
+        start_time = time.perf_counter()
+        network.load_dir({})
+        elapsed = time.perf_counter() - start_time
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+def main():
+    schema = create_schema()
+    for node_count in [10000, 100000]:
+        savedir = build_network(schema, node_count)
+        snapshot_time = time_load_dir(schema, savedir)
+        # without the snapshot, load_dir falls back to topology.json
+        os.remove(os.path.join(savedir, "topology.snapshot"))
+        json_time = time_load_dir(schema, savedir)
+        print(f"nodes={node_count:6d} json={json_time*1000:8.1f}ms snapshot={snapshot_time*1000:8.1f}ms")
+
+if __name__ == '__main__':
+    main()
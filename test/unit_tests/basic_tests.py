@@ -21,6 +21,8 @@ import unittest
 import tempfile
 
 from hyrrokkin.api.topology import Topology
+from hyrrokkin.exceptions.invalid_link_error import InvalidLinkError
+from hyrrokkin.exceptions.invalid_node_error import InvalidNodeError
 
 numbergraph_package = "hyrrokkin.example_packages.numbergraph"
 
@@ -151,6 +153,150 @@ class BasicTests(unittest.TestCase):
         self.assertFalse(t.run())
         self.assertEqual(list(map(lambda x:x[1:3],execution_events)),[('n0', 'pending'), ('n1', 'pending'), ('n2','pending'), ('n0', 'executing'), ('n0', 'executed'), ('n1', 'executing'), ('n1', 'failed')])
 
+    def test7(self):
+        t = Topology(tempfile.mkdtemp(), [numbergraph_package])
+        with t.batch():
+            t.add_node("n0", "numbergraph:number_input_node", {"value": 99})
+            t.add_node("n1", "numbergraph:prime_factors_node", {})
+            t.add_link("l0", "n0", "data_out", "n1", "data_in")
+
+        t2 = Topology(t.execution_folder, [numbergraph_package])
+        t2.load_dir()
+        self.assertEqual(t2.get_node_ids(), ["n0", "n1"])
+        test_outputs = []
+        self.assertTrue(t2.run(output_listeners={"n1:data_out": lambda v: test_outputs.append(v)}))
+        self.assertEqual(test_outputs, [[3, 3, 11]])
+
+        # edits in a batch which fails are discarded
+        with self.assertRaises(InvalidLinkError):
+            with t2.batch():
+                t2.add_node("n2", "numbergraph:number_display_node", {})
+                t2.add_link("l1", "n1", "data_out", "n2", "integerlist_data_in")
+                t2.remove_link("l0")
+                t2.add_link("l2", "n1", "data_out", "n0", "no_such_port")
+        self.assertEqual(t2.get_node_ids(), ["n0", "n1"])
+        self.assertEqual(t2.get_link_ids(), ["l0"])
+        test_outputs = []
+        self.assertTrue(t2.run(output_listeners={"n1:data_out": lambda v: test_outputs.append(v)}))
+        self.assertEqual(test_outputs, [[3, 3, 11]])
+
+    def test8(self):
+        t = Topology(tempfile.mkdtemp(), [numbergraph_package])
+        self.assertEqual(t.add_nodes([
+            {"node_id": "n0", "node_type": "numbergraph:number_input_node", "properties": {"value": 99}},
+            {"node_id": "n1", "node_type": "numbergraph:prime_factors_node"},
+            {"node_id": "n2", "node_type": "numbergraph:number_display_node", "x": 100, "y": 50}
+        ]), ["n0", "n1", "n2"])
+
+        with self.assertRaises(InvalidNodeError):
+            t.add_nodes([{"node_id": "n3", "node_type": "numbergraph:number_input_node"},
+                         {"node_id": "n4", "node_type": "numbergraph:no_such_node"}])
+        self.assertEqual(t.get_node_ids(), ["n0", "n1", "n2"])
+
+        # the input port of n1 does not allow multiple connections, so neither link is added
+        t.add_nodes([{"node_id": "n5", "node_type": "numbergraph:number_input_node"}])
+        with self.assertRaises(InvalidLinkError):
+            t.add_links([{"link_id": "l0", "from_node_id": "n0", "to_node_id": "n1"},
+                         {"link_id": "l1", "from_node_id": "n5", "to_node_id": "n1"}])
+        self.assertEqual(t.get_link_ids(), [])
+
+        self.assertEqual(t.add_links([
+            {"link_id": "l0", "from_node_id": "n0", "to_node_id": "n1"},
+            {"link_id": "l1", "from_node_id": "n1", "to_node_id": "n2", "to_port": "integerlist_data_in"}
+        ]), ["l0", "l1"])
+        self.assertEqual(t.get_link("l1"), ("n1", "data_out", "n2", "integerlist_data_in"))
+
+        test_outputs = []
+        self.assertTrue(t.run(output_listeners={"n1:data_out": lambda v: test_outputs.append(v)}))
+        self.assertEqual(test_outputs, [[3, 3, 11]])
+
+    def test9(self):
+        t = self.__get_test_topology()
+        target = t.serialise()
+        target["nodes"]["n0"]["properties"] = {"value": 100}
+        target["nodes"]["n2"]["x"] = 200
+        target["nodes"]["n3"] = {"node_type": "numbergraph:number_display_node", "x": 10, "y": 10, "metadata": {}}
+        target["links"]["l2"] = {"from_port": "n1:data_out", "to_port": "n3:integerlist_data_in"}
+        del target["links"]["l1"]
+        target["metadata"] = {"name": "patched"}
+
+        patch = t.diff(target)
+        self.assertEqual(patch, {
+            "remove_links": ["l1"],
+            "remove_nodes": [],
+            "add_nodes": [{"node_id": "n3", "node_type": "numbergraph:number_display_node", "x": 10, "y": 10,
+                           "metadata": {}}],
+            "update_nodes": {"n0": {"properties": {"value": 100}}, "n2": {"x": 200}},
+            "add_links": [{"link_id": "l2", "from_node_id": "n1", "from_port": "data_out",
+                           "to_node_id": "n3", "to_port": "integerlist_data_in"}],
+            "metadata": {"name": "patched"}
+        })
+
+        t.apply_patch(patch)
+        self.assertEqual(t.get_node_ids(), ["n0", "n1", "n2", "n3"])
+        self.assertEqual(t.get_link_ids(), ["l0", "l2"])
+        self.assertEqual(t.serialise_node("n2")["x"], 200)
+        self.assertEqual(t.get_node_property("n0", "value"), 100)
+        self.assertEqual(t.get_metadata(), {"name": "patched"})
+        self.assertEqual(t.diff(target), {"remove_links": [], "remove_nodes": [], "add_nodes": [],
+                                          "update_nodes": {}, "add_links": []})
+
+        # a patch which cannot be applied leaves the topology and the data of its nodes unchanged
+        t.set_node_data("n0", "notes", b"kept")
+        with self.assertRaises(InvalidLinkError):
+            t.apply_patch({"remove_links": ["l0", "l2"], "remove_nodes": ["n0"],
+                           "add_links": [{"link_id": "l3", "from_node_id": "n1", "from_port": "data_out",
+                                          "to_node_id": "n3", "to_port": "no_such_port"}]})
+        self.assertEqual(t.get_node_ids(), ["n0", "n1", "n2", "n3"])
+        self.assertEqual(t.get_link_ids(), ["l0", "l2"])
+        self.assertEqual(t.get_node_property("n0", "value"), 100)
+        self.assertEqual(t.get_node_data("n0", "notes"), b"kept")
+
+        # a target without metadata leaves the metadata unchanged
+        del target["metadata"]
+        self.assertNotIn("metadata", t.diff(target))
+        t.apply_patch(t.diff(target))
+        self.assertEqual(t.get_metadata(), {"name": "patched"})
+
+        test_outputs = []
+        self.assertTrue(t.run(output_listeners={"n1:data_out": lambda v: test_outputs.append(v)}))
+        self.assertEqual(test_outputs, [[2, 2, 5, 5]])
+
+        # a change to a node's type replaces the node and its links
+        t.set_node_data("n2", "notes", b"replaced")
+        target["nodes"]["n2"]["node_type"] = "numbergraph:number_input_node"
+        del target["links"]["l2"]
+        target["links"]["l1"] = {"from_port": "n2:data_out", "to_port": "n3:integer_data_in"}
+        patch = t.diff(target)
+        self.assertEqual(patch["remove_nodes"], ["n2"])
+        self.assertEqual([node["node_id"] for node in patch["add_nodes"]], ["n2"])
+        t.apply_patch(patch)
+        self.assertEqual(t.get_node_type("n2"), ("numbergraph", "number_input_node"))
+        self.assertIsNone(t.get_node_data("n2", "notes"))
+        self.assertEqual(t.get_link("l1"), ("n2", "data_out", "n3", "integer_data_in"))
+
+    def test10(self):
+        t = Topology(tempfile.mkdtemp(), [numbergraph_package])
+        # allow prime factors nodes to be chained, so that links can form a cycle
+        node_type = t.schema.get_node_type("numbergraph:prime_factors_node")
+        node_type.output_ports["data_out"] = node_type.input_ports["data_in"]
+        t.add_nodes([{"node_id": node_id, "node_type": "numbergraph:prime_factors_node"} for node_id in ["a", "b", "c"]])
+        t.add_links([{"link_id": "l0", "from_node_id": "a", "to_node_id": "b"}])
+
+        # neither link is added if together they would form a cycle
+        with self.assertRaises(InvalidLinkError):
+            t.add_links([{"link_id": "l1", "from_node_id": "b", "to_node_id": "c"},
+                         {"link_id": "l2", "from_node_id": "c", "to_node_id": "a"}])
+        self.assertEqual(t.get_link_ids(), ["l0"])
+        with self.assertRaises(InvalidLinkError):
+            t.add_link("l1", "b", None, "a", None)
+        self.assertEqual(t.add_links([{"link_id": "l1", "from_node_id": "b", "to_node_id": "c"}]), ["l1"])
+
+        t2 = Topology(t.execution_folder, [numbergraph_package])
+        t2.load_dir()
+        self.assertEqual(t2.get_link_ids(), ["l0", "l1"])
+
+
 if __name__ == '__main__':
     import logging
     logging.basicConfig(level=logging.INFO)
@@ -18,10 +18,17 @@
 #   OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
 
 
+import gc
+import gzip
+import io
+import os
 import unittest
 import tempfile
+import threading
+import zipfile
 
 from hyrrokkin.api.topology import Topology
+from hyrrokkin.utils.data_store_utils import DataStoreUtils
 
 numbergraph_package = "hyrrokkin.example_packages.numbergraph"
 
@@ -76,6 +83,361 @@ class FileStorageTests(unittest.TestCase):
 
             self.assertEqual(test_binary1, t2.get_package_data("numbergraph", "abc_0"))
 
+    def test3(self):
+        # save to a stream which does not support seeking, as when writing to a pipe or socket
+        class UnseekableStream(io.RawIOBase):
+
+            def __init__(self, to_file):
+                self.to_file = to_file
+
+            def writable(self):
+                return True
+
+            def write(self, b):
+                return self.to_file.write(b)
+
+        with tempfile.NamedTemporaryFile(suffix=".zip", delete=True) as saved:
+            test_binary1 = b"0" * 10000
+            test_binary2 = gzip.compress(b"0" * 10000)
+
+            t = Topology(tempfile.mkdtemp(),[numbergraph_package])
+            t.add_node("n0", "numbergraph:integer_value_node", properties={"value": 99})
+            t.set_node_data("n0", "abc0", test_binary1)
+            t.set_node_data("n0", "abc1", test_binary2)
+
+            with open(saved.name, "wb") as f:
+                t.save_zip(UnseekableStream(f), compress=True)
+
+            with zipfile.ZipFile(saved.name) as zf:
+                self.assertEqual(zf.getinfo("node/n0/data/abc0").compress_type, zipfile.ZIP_DEFLATED)
+                self.assertEqual(zf.getinfo("node/n0/data/abc1").compress_type, zipfile.ZIP_STORED)
+
+            t2 = Topology(tempfile.mkdtemp(),[numbergraph_package])
+            with open(saved.name, "rb") as f:
+                t2.load_zip(f)
+            self.assertEqual(test_binary1, t2.get_node_data("n0", "abc0"))
+            self.assertEqual(test_binary2, t2.get_node_data("n0", "abc1"))
+
+    def test4(self):
+        with tempfile.NamedTemporaryFile(suffix=".zip", delete=True) as saved:
+            test_binary1 = b"34723974"
+            test_binary2 = b"93847"
+
+            t = Topology(tempfile.mkdtemp(),[numbergraph_package])
+            t.add_node("n0", "numbergraph:integer_value_node", properties={"value": 99})
+            t.set_node_data("n0", "abc0", test_binary1)
+            t.set_node_data("n0", "abc1", test_binary2)
+            t.set_node_data("n0", "abc2", test_binary2)
+            t.set_package_data("numbergraph","abc_0", test_binary1)
+
+            with open(saved.name, "wb") as f:
+                t.save_zip(f)
+
+            folder = tempfile.mkdtemp()
+            t2 = Topology(folder,[numbergraph_package])
+            with open(saved.name, "rb") as f:
+                t2.load_zip(f, lazy_data=True)
+
+            # properties are extracted immediately, data files when first accessed
+            self.assertEqual(t2.get_node_property("n0", "value"), 99)
+            data_path = os.path.join(folder, "node", "n0", "data", "abc0")
+            self.assertFalse(os.path.exists(data_path))
+            self.assertEqual(test_binary1, t2.get_node_data("n0", "abc0"))
+            self.assertTrue(os.path.exists(data_path))
+            self.assertEqual(test_binary1, t2.get_package_data("numbergraph", "abc_0"))
+
+            # setting data replaces the data that has not been extracted
+            t2.set_node_data("n0", "abc1", None)
+            self.assertIsNone(t2.get_node_data("n0", "abc1"))
+
+            # data which has not been extracted is copied from the original zip file when saving
+            t2.set_package_data("numbergraph","abc_0", None)
+            t3 = Topology(tempfile.mkdtemp(),[numbergraph_package])
+            t3.load_zip(io.BytesIO(t2.save_zip()))
+            self.assertEqual(test_binary1, t3.get_node_data("n0", "abc0"))
+            self.assertIsNone(t3.get_node_data("n0", "abc1"))
+            self.assertEqual(test_binary2, t3.get_node_data("n0", "abc2"))
+            self.assertFalse(os.path.exists(os.path.join(folder, "node", "n0", "data", "abc2")))
+            self.assertIsNone(t3.get_package_data("numbergraph", "abc_0"))
+
+            # the copy of the zip file is removed once no data remains to be extracted from it
+            archive_folder = os.path.join(folder, "archives")
+            archives = os.listdir(archive_folder)
+            self.assertEqual(len(archives), 1)
+            t2.close()
+            self.assertEqual(os.listdir(archive_folder), archives)
+            self.assertEqual(test_binary2, t2.get_node_data("n0", "abc2"))
+            with open(saved.name, "rb") as f:
+                t2.load_zip(f, lazy_data=True)
+            self.assertEqual(len(os.listdir(archive_folder)), 1)
+            self.assertNotEqual(os.listdir(archive_folder), archives)
+
+
+    def test5(self):
+        folder = tempfile.mkdtemp()
+        dsu = DataStoreUtils(folder, write_back=True)
+        dsu.set_node_properties("n0", {"value": 1})
+        for value in range(2, 100):
+            dsu.set_node_property("n0", "value", value)
+        dsu.set_package_property("numbergraph", "cache_size", 10)
+
+        # changes are cached until flushed
+        self.assertEqual(dsu.get_node_property("n0", "value"), 99)
+        self.assertEqual(DataStoreUtils(folder).get_node_properties("n0"), {})
+        dsu.flush()
+        self.assertEqual(DataStoreUtils(folder).get_node_properties("n0"), {"value": 99})
+        self.assertEqual(DataStoreUtils(folder).get_package_property("numbergraph", "cache_size"), 10)
+
+        # changes made elsewhere are picked up when the cached properties have been flushed
+        DataStoreUtils(folder).set_node_properties("n0", {"value": 100, "name": "n0"})
+        self.assertEqual(dsu.get_node_properties("n0"), {"value": 100, "name": "n0"})
+
+        dsu.set_node_properties("n0", None)
+        self.assertEqual(dsu.get_node_properties("n0"), {})
+        dsu.flush()
+        self.assertEqual(DataStoreUtils(folder).get_node_properties("n0"), {})
+
+    def test6(self):
+        folder = tempfile.mkdtemp()
+        t = Topology(folder, [numbergraph_package], storage="sqlite")
+        t.add_node("n0", "numbergraph:number_input_node", properties={"value": 99})
+        t.add_node("n1", "numbergraph:prime_factors_node")
+        t.add_link("l0", "n0", "data_out", "n1", "data_in")
+        t.set_node_data("n0", "abc0", b"34723974")
+        t.set_package_data("numbergraph", "abc_0", b"93847")
+
+        # properties and data are held in a single database file
+        self.assertTrue(os.path.exists(os.path.join(folder, "datastore.db")))
+        self.assertFalse(os.path.exists(os.path.join(folder, "node")))
+
+        test_outputs = []
+        self.assertTrue(t.run(output_listeners={"n1:data_out": lambda v: test_outputs.append(v)}))
+        self.assertEqual(test_outputs, [[3, 3, 11]])
+
+        # zip files are exchanged between storage types
+        t2 = Topology(tempfile.mkdtemp(), [numbergraph_package])
+        t2.load_zip(io.BytesIO(t.save_zip()))
+        self.assertEqual(t2.get_node_property("n0", "value"), 99)
+        self.assertEqual(t2.get_node_data("n0", "abc0"), b"34723974")
+
+        t3 = Topology(tempfile.mkdtemp(), [numbergraph_package], storage="sqlite")
+        t3.load_zip(io.BytesIO(t2.save_zip()))
+        self.assertEqual(t3.get_node_property("n0", "value"), 99)
+        self.assertEqual(t3.get_node_data("n0", "abc0"), b"34723974")
+        self.assertEqual(t3.get_package_data("numbergraph", "abc_0"), b"93847")
+        t3.set_node_data("n0", "abc0", None)
+        self.assertIsNone(t3.get_node_data("n0", "abc0"))
+
+    def test7(self):
+        folder = tempfile.mkdtemp()
+        t = Topology(folder, [numbergraph_package], deduplicate_data=True)
+        reference_data = os.urandom(100000)
+        for idx in range(3):
+            t.add_node(f"n{idx}", "numbergraph:number_input_node", properties={"value": idx})
+            t.set_node_data(f"n{idx}", "reference", reference_data)
+        t.set_node_data("n2", "other", b"1234")
+
+        # identical data is stored once, with a count of the keys referring to it
+        blob_folder = os.path.join(folder, "blob")
+        self.assertEqual(len(os.listdir(blob_folder)), 2)
+        dsu = DataStoreUtils(folder)
+        for idx in range(3):
+            self.assertEqual(dsu.get_node_data(f"n{idx}", "reference"), reference_data)
+
+        # setting unchanged data does not rewrite the stored content
+        blob_paths = [os.path.join(blob_folder, blob_hash, "data", "content") for blob_hash in os.listdir(blob_folder)]
+        stamps = [os.stat(path).st_mtime_ns for path in blob_paths]
+        t.set_node_data("n0", "reference", reference_data)
+        self.assertEqual([os.stat(path).st_mtime_ns for path in blob_paths], stamps)
+
+        # the content is also saved once in zip files, which can be loaded with or without deduplication
+        saved = t.save_zip()
+        self.assertLess(len(saved), 2 * len(reference_data))
+        t2 = Topology(tempfile.mkdtemp(), [numbergraph_package])
+        t2.load_zip(io.BytesIO(saved))
+        self.assertEqual(t2.get_node_data("n1", "reference"), reference_data)
+        self.assertEqual(t2.get_node_data("n2", "other"), b"1234")
+
+        # loading the zip file into the topology adds references to the existing content
+        t.load_zip(io.BytesIO(saved))
+        self.assertEqual(len(os.listdir(blob_folder)), 2)
+        self.assertEqual(len(t.get_node_ids()), 6)
+        for node_id in t.get_node_ids():
+            self.assertEqual(t.get_node_data(node_id, "reference"), reference_data)
+            t.set_node_data(node_id, "reference", None)
+            t.set_node_data(node_id, "other", None)
+        # content is removed when no keys refer to it
+        self.assertFalse(any(os.listdir(os.path.join(blob_folder, blob_hash, "data")) for blob_hash in os.listdir(blob_folder)))
+
+    def test8(self):
+        for (storage, deduplicate) in [("directory", False), ("directory", True), ("sqlite", False)]:
+            folder = tempfile.mkdtemp()
+            t = Topology(folder, [numbergraph_package], storage=storage, deduplicate_data=deduplicate)
+            t.add_node("n0", "numbergraph:number_input_node", properties={"value": 99})
+            test_binary = os.urandom(1000000)
+            t.set_node_data("n0", "abc0", test_binary)
+            t.set_node_data("n0", "abc1", b"")
+
+            dsu = DataStoreUtils(folder, storage=t.storage)
+            view = dsu.get_node_data("n0", "abc0", mmap=True)
+            self.assertIsInstance(view, memoryview)
+            self.assertTrue(view.readonly)
+            self.assertEqual(view, test_binary)
+            self.assertEqual(dsu.get_node_data("n0", "abc1", mmap=True), b"")
+            self.assertIsNone(dsu.get_node_data("n0", "abc2", mmap=True))
+
+            # data which is replaced while mapped does not change the mapping
+            t.set_node_data("n0", "abc0", b"1234")
+            self.assertEqual(view, test_binary)
+
+            with dsu.open_node_data("n0", "abc0") as f:
+                self.assertEqual(f.read(2), b"12")
+                self.assertEqual(f.read(), b"34")
+            self.assertIsNone(dsu.open_node_data("n0", "abc2"))
+
+    def test9(self):
+        for (storage, deduplicate) in [("directory", False), ("directory", True), ("sqlite", False)]:
+            folder = tempfile.mkdtemp()
+            t = Topology(folder, [numbergraph_package], storage=storage, deduplicate_data=deduplicate)
+            t.add_node("n0", "numbergraph:number_input_node", properties={"value": 99})
+            t.set_node_data("n0", "abc0", b"old")
+            dsu = DataStoreUtils(folder, storage=t.storage, deduplicate=deduplicate)
+
+            chunks = [os.urandom(100000) for _ in range(10)]
+            with dsu.open_node_data_writer("n0", "abc0") as f:
+                for chunk in chunks:
+                    f.write(chunk)
+                # the existing data is replaced only when the writer is closed
+                self.assertEqual(t.get_node_data("n0", "abc0"), b"old")
+            self.assertEqual(t.get_node_data("n0", "abc0"), b"".join(chunks))
+
+            # data written before an exception is discarded
+            with self.assertRaises(RuntimeError):
+                with dsu.open_package_data_writer("numbergraph", "abc1") as f:
+                    f.write(b"1234")
+                    raise RuntimeError()
+            self.assertIsNone(t.get_package_data("numbergraph", "abc1"))
+
+            # data written to a writer which is dropped without being closed is discarded
+            f = dsu.open_node_data_writer("n0", "abc2")
+            f.write(b"partial")
+            del f
+            gc.collect()
+            self.assertIsNone(t.get_node_data("n0", "abc2"))
+
+            with dsu.open_node_data("n0", "abc0") as f:
+                self.assertEqual(list(iter(lambda: f.read(100000), b"")), chunks)
+            if storage == "directory":
+                self.assertEqual(os.listdir(os.path.join(folder, "node", "n0", "data")),
+                                 ["abc0.ref"] if deduplicate else ["abc0"])
+
+    def test10(self):
+        with self.assertRaises(ValueError):
+            Topology(tempfile.mkdtemp(), [numbergraph_package], storage="memory")
+
+        folder = tempfile.mkdtemp()
+        t = Topology(folder, [numbergraph_package], in_process=True, storage="memory",
+                     storage_options={"spill_threshold": 1000})
+        t.add_node("n0", "numbergraph:number_input_node", properties={"value": 99})
+        t.add_node("n1", "numbergraph:prime_factors_node")
+        t.add_link("l0", "n0", "data_out", "n1", "data_in")
+        t.set_node_data("n0", "abc0", b"34723974")
+        large_data = os.urandom(2000)
+        t.set_node_data("n0", "abc1", large_data)
+
+        # the execution engine shares the topology's storage
+        test_outputs = []
+        self.assertTrue(t.run(output_listeners={"n1:data_out": lambda v: test_outputs.append(v)}))
+        self.assertEqual(test_outputs, [[3, 3, 11]])
+        self.assertFalse(os.path.exists(os.path.join(folder, "node")))
+
+        # only data above the threshold is written to a file
+        spill_folder = os.path.join(folder, "spill")
+        self.assertEqual(len(os.listdir(spill_folder)), 1)
+        self.assertEqual(t.get_node_data("n0", "abc1"), large_data)
+
+        t2 = Topology(tempfile.mkdtemp(), [numbergraph_package])
+        t2.load_zip(io.BytesIO(t.save_zip()))
+        self.assertEqual(t2.get_node_property("n0", "value"), 99)
+        self.assertEqual(t2.get_node_data("n0", "abc0"), b"34723974")
+        self.assertEqual(t2.get_node_data("n0", "abc1"), large_data)
+
+        # spilled data is removed when the topology is discarded
+        del t
+        gc.collect()
+        self.assertFalse(os.path.exists(spill_folder))
+
+    def test11(self):
+        for deduplicate in [False, True]:
+            folder = tempfile.mkdtemp()
+            t = Topology(folder, [numbergraph_package], deduplicate_data=deduplicate,
+                         compress_data_threshold=1000, compress_data_keys=["streamed"])
+            t.add_node("n0", "numbergraph:number_input_node", properties={"value": 99})
+            large_data = b",".join(str(idx).encode("utf-8") for idx in range(100000))
+            t.set_node_data("n0", "large", large_data)
+            t.set_node_data("n0", "small", b"1234")
+            dsu = DataStoreUtils(folder, storage=t.storage, deduplicate=deduplicate, compress_keys=["streamed"])
+            with dsu.open_node_data_writer("n0", "streamed") as f:
+                for idx in range(100):
+                    f.write(large_data[idx*1000:(idx+1)*1000])
+
+            if not deduplicate:
+                self.assertEqual(sorted(os.listdir(os.path.join(folder, "node", "n0", "data"))),
+                                 ["large.gz", "small", "streamed.gz"])
+                self.assertLess(os.path.getsize(os.path.join(folder, "node", "n0", "data", "large.gz")),
+                                len(large_data) // 2)
+
+            # compressed data is decompressed when read
+            self.assertEqual(t.get_node_data("n0", "large"), large_data)
+            self.assertEqual(t.get_node_data("n0", "small"), b"1234")
+            self.assertEqual(dsu.get_node_data("n0", "streamed", mmap=True), large_data[:100000])
+            with dsu.open_node_data("n0", "large") as f:
+                self.assertEqual(f.read(100), large_data[:100])
+
+            # compressed data is stored in zip files without compressing it again
+            with zipfile.ZipFile(io.BytesIO(t.save_zip(compress=True))) as zf:
+                compress_types = {zipinfo.filename.split("/")[-1]: zipinfo.compress_type for zipinfo in zf.infolist()}
+            self.assertEqual(compress_types["large.gz" if not deduplicate else "content.gz"], zipfile.ZIP_STORED)
+
+            t2 = Topology(tempfile.mkdtemp(), [numbergraph_package])
+            t2.load_zip(io.BytesIO(t.save_zip()))
+            self.assertEqual(t2.get_node_data("n0", "large"), large_data)
+
+            # data rewritten below the threshold is stored uncompressed
+            t2.set_node_data("n0", "large", b"5678")
+            self.assertEqual(t2.get_node_data("n0", "large"), b"5678")
+
+    def test12(self):
+        folder = tempfile.mkdtemp()
+        t = Topology(folder, [numbergraph_package], deduplicate_data=True)
+        for idx in range(8):
+            t.add_node(f"n{idx}", "numbergraph:number_input_node", properties={"value": idx})
+
+        # reference counts are not lost when several writers share the same data
+        reference_data = os.urandom(10000)
+        def write(node_id):
+            dsu = DataStoreUtils(folder, deduplicate=True)
+            for key_idx in range(10):
+                dsu.set_node_data(node_id, f"key{key_idx}", reference_data)
+
+        threads = [threading.Thread(target=write, args=(f"n{idx}",)) for idx in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        blob_folder = os.path.join(folder, "blob")
+        [blob_hash] = os.listdir(blob_folder)
+        self.assertEqual(t.storage.load_properties("blob", blob_hash), {"references": 80})
+
+        # removing nodes releases their references, the data is removed with the last reference
+        for idx in range(7):
+            t.remove_node(f"n{idx}")
+        self.assertEqual(t.storage.load_properties("blob", blob_hash), {"references": 10})
+        self.assertEqual(t.get_node_data("n7", "key0"), reference_data)
+        t.remove_node("n7")
+        self.assertIsNone(t.storage.load_properties("blob", blob_hash))
+        self.assertFalse(os.path.exists(os.path.join(blob_folder, blob_hash, "data", "content")))
+
 
 if __name__ == '__main__':
     import logging
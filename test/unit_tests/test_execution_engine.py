@@ -0,0 +1,473 @@
+#   Hyrrokkin - a Python library for building and running executable graphs
+#
+#   MIT License - Copyright (C) 2022-2023  Visual Topology Ltd
+#
+#   Permission is hereby granted, free of charge, to any person obtaining a copy of this software
+#   and associated documentation files (the "Software"), to deal in the Software without
+#   restriction, including without limitation the rights to use, copy, modify, merge, publish,
+#   distribute, sublicense, and/or sell copies of the Software, and to permit persons to whom the
+#   Software is furnished to do so, subject to the following conditions:
+#
+#   The above copyright notice and this permission notice shall be included in all copies or
+#   substantial portions of the Software.
+#
+#   THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING
+#   BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+#   NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM,
+#   DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#   OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+import asyncio
+import json
+import os
+import time
+import unittest
+import unittest.mock
+import tempfile
+
+from hyrrokkin.executor.execution_engine import ExecutionEngine
+from hyrrokkin.schema.schema import Schema
+from hyrrokkin.utils.resource_loader import ResourceLoader
+from hyrrokkin.utils.data_store_utils import DataStoreUtils
+
+numbergraph_package = "hyrrokkin.example_packages.numbergraph"
+
+class ExecutionEngineTests(unittest.TestCase):
+
+    def __init__(self,*args,**kwargs):
+        super().__init__(*args,**kwargs)
+
+    def __get_classmap(self, node_type_resources={}):
+        schema_path = numbergraph_package + "/schema.json"
+        package_content = json.loads(ResourceLoader.load_resource(schema_path).decode("utf-8"))
+        for (node_type_id, resources) in node_type_resources.items():
+            package_content["node_types"][node_type_id]["resource_requirements"] = resources
+        schema = Schema()
+        schema.load_package_from_dict(package_content, schema_path)
+        return schema.get_classmap()
+
+    async def __run_to_completion(self, engine):
+        await engine.run_coro(False)
+        while engine.executing_tasks:
+            await asyncio.gather(*list(engine.executing_tasks))
+
+    def test_resource_limits(self):
+        classmap = self.__get_classmap({"number_input_node": {"db": 1}})
+        self.assertEqual(classmap["numbergraph"]["resource_requirements"], {"number_input_node": {"db": 1}})
+
+        max_executing = {}
+
+        def track_execution(at_time, node_id, state, exn, is_manual):
+            if state == "executing":
+                for node_type in ["input", "display"]:
+                    executing = len([n for n in engine.executing_nodes if n.startswith(node_type)])
+                    max_executing[node_type] = max(max_executing.get(node_type, 0), executing)
+
+        engine = ExecutionEngine(classmap, tempfile.mkdtemp(), 4, {}, {},
+                                 node_execution_callback=track_execution,
+                                 resource_limits={"db": 1})
+
+        async def run():
+            await engine.add_package("numbergraph")
+            for idx in range(3):
+                await engine.add_node(f"input{idx}", "numbergraph:number_input_node", loading=True)
+            for idx in range(2):
+                await engine.add_node(f"display{idx}", "numbergraph:number_display_node", loading=True)
+            await self.__run_to_completion(engine)
+
+        asyncio.run(run())
+
+        # the input nodes are limited by the db pool, the display nodes run alongside them
+        self.assertEqual(max_executing, {"input": 1, "display": 2})
+        self.assertEqual(len(engine.executed_nodes), 5)
+        self.assertEqual(engine.resources_in_use, {})
+
+    def test_resource_paths(self):
+        # the resources key lists resource dependencies, it does not request capacity from resource pools
+        schema_path = numbergraph_package + "/schema.json"
+        package_content = json.loads(ResourceLoader.load_resource(schema_path).decode("utf-8"))
+        package_content["node_types"]["number_input_node"]["resources"] = ["number_input_node.js"]
+        schema = Schema()
+        schema.load_package_from_dict(package_content, schema_path)
+        self.assertNotIn("resource_requirements", schema.get_classmap()["numbergraph"])
+
+    def test_oversized_resource_request(self):
+        classmap = self.__get_classmap({"number_input_node": {"memory_gb": 8}})
+        engine = ExecutionEngine(classmap, tempfile.mkdtemp(), 4, {}, {}, resource_limits={"memory_gb": 4})
+
+        async def run():
+            await engine.add_package("numbergraph")
+            for idx in range(2):
+                await engine.add_node(f"input{idx}", "numbergraph:number_input_node", loading=True)
+            await self.__run_to_completion(engine)
+
+        asyncio.run(run())
+
+        # nodes requesting more than a pool's capacity are run one at a time rather than never
+        self.assertEqual(len(engine.executed_nodes), 2)
+
+    def test_resources_released_on_remove(self):
+        classmap = self.__get_classmap({"number_input_node": {"db": 1}})
+        node_class = ResourceLoader.get_class(classmap["numbergraph"]["nodes"]["number_input_node"])
+
+        async def slow_load(instance):
+            await asyncio.sleep(0.1)
+
+        engine = ExecutionEngine(classmap, tempfile.mkdtemp(), 4, {}, {}, resource_limits={"db": 1})
+
+        async def run():
+            await engine.add_node("input0", "numbergraph:number_input_node", loading=True)
+            await engine.add_node("input1", "numbergraph:number_input_node", loading=True)
+            await engine.run_coro(False)
+            await asyncio.sleep(0.01)
+            self.assertEqual(engine.resources_in_use, {"db": 1})
+            # removing the executing node frees its pool capacity for the other node
+            await engine.remove_node(list(engine.executing_nodes)[0])
+            while engine.executing_tasks:
+                await asyncio.gather(*list(engine.executing_tasks))
+
+        with unittest.mock.patch.object(node_class, "load", slow_load, create=True):
+            asyncio.run(run())
+
+        self.assertEqual(len(engine.executed_nodes), 1)
+        self.assertEqual(engine.resources_in_use, {})
+
+    def test_resources_of_re_added_node(self):
+        classmap = self.__get_classmap({"number_input_node": {"db": 1}})
+        node_class = ResourceLoader.get_class(classmap["numbergraph"]["nodes"]["number_input_node"])
+
+        async def slow_load(instance):
+            await asyncio.sleep(0.1)
+
+        engine = ExecutionEngine(classmap, tempfile.mkdtemp(), 4, {}, {}, resource_limits={"db": 1})
+
+        async def run():
+            await engine.add_node("input0", "numbergraph:number_input_node", loading=True)
+            await engine.run_coro(False)
+            await asyncio.sleep(0.01)
+            # the abandoned execution finishes while the re-added node executes, without releasing its resources
+            await engine.remove_node("input0")
+            await engine.add_node("input0", "numbergraph:number_input_node")
+            await asyncio.sleep(0.02)
+            self.assertEqual(engine.executing_nodes, {"input0": True})
+            self.assertEqual(engine.resources_in_use, {"db": 1})
+            while engine.executing_tasks:
+                await asyncio.gather(*list(engine.executing_tasks))
+
+        with unittest.mock.patch.object(node_class, "load", slow_load, create=True):
+            asyncio.run(run())
+
+        self.assertEqual(list(engine.executed_nodes), ["input0"])
+        self.assertEqual(engine.resources_in_use, {})
+
+    def test_mark_dirty_long_chain(self):
+        pending_events = []
+
+        def track_pending(at_time, node_id, state, exn, is_manual):
+            if state == "pending":
+                pending_events.append(node_id)
+
+        engine = ExecutionEngine(self.__get_classmap(), tempfile.mkdtemp(), 4, {}, {},
+                                 node_execution_callback=track_pending)
+        chain_length = 5000
+
+        async def build():
+            for idx in range(chain_length):
+                await engine.add_node(f"n{idx}", "numbergraph:number_display_node", loading=True)
+            for idx in range(1, chain_length):
+                await engine.add_link(f"l{idx}", f"n{idx-1}", "data_out", f"n{idx}", "integer_data_in", loading=True)
+
+        asyncio.run(build())
+
+        engine.dirty_nodes = {}
+        pending_events.clear()
+        engine.mark_dirty("n0")
+        self.assertEqual(pending_events, [f"n{idx}" for idx in range(chain_length)])
+
+    def test_mark_dirty_diamond(self):
+        pending_events = []
+
+        def track_pending(at_time, node_id, state, exn, is_manual):
+            if state == "pending":
+                pending_events.append(node_id)
+
+        engine = ExecutionEngine(self.__get_classmap(), tempfile.mkdtemp(), 4, {}, {},
+                                 node_execution_callback=track_pending)
+
+        async def build():
+            for node_id in ["a", "b", "c", "d"]:
+                await engine.add_node(node_id, "numbergraph:number_display_node", loading=True)
+            for (link_id, from_node_id, to_node_id) in [("l0", "a", "b"), ("l1", "a", "c"), ("l2", "b", "d"), ("l3", "c", "d")]:
+                await engine.add_link(link_id, from_node_id, "data_out", to_node_id, "integer_data_in", loading=True)
+
+        asyncio.run(build())
+
+        engine.dirty_nodes = {}
+        pending_events.clear()
+        engine.mark_dirty("a")
+        self.assertEqual(pending_events, ["a", "b", "d", "c"])
+
+    def test_reload_properties(self):
+        folder = tempfile.mkdtemp()
+        DataStoreUtils(folder).set_node_properties("input0", {"value": 5})
+        engine = ExecutionEngine(self.__get_classmap(), folder, 4, {}, {})
+
+        async def run():
+            outputs = []
+            await engine.add_node("input0", "numbergraph:number_input_node", loading=True)
+            await self.__run_to_completion(engine)
+            outputs.append(engine.node_outputs["input0"]["data_out"])
+
+            # properties are not re-read from the file before each execution...
+            DataStoreUtils(folder).set_node_properties("input0", {"value": 7})
+            engine.request_execution("input0")
+            await self.__run_to_completion(engine)
+            outputs.append(engine.node_outputs["input0"]["data_out"])
+
+            # ...only when the engine is notified of a change
+            await engine.reload_properties(["input0"])
+            engine.request_execution("input0")
+            await self.__run_to_completion(engine)
+            outputs.append(engine.node_outputs["input0"]["data_out"])
+            return outputs
+
+        self.assertEqual(asyncio.run(run()), [5, 5, 7])
+
+    def test_reload_properties_with_unwritten_changes(self):
+        folder = tempfile.mkdtemp()
+        DataStoreUtils(folder).set_node_properties("input0", {"value": 5})
+        engine = ExecutionEngine(self.__get_classmap(), folder, 4, {}, {})
+
+        async def run():
+            await engine.add_node("input0", "numbergraph:number_input_node", loading=True)
+            await asyncio.gather(*engine.loading_nodes.values())
+            engine.set_node_property("input0", "a", 1)
+            # a property changed elsewhere before the node's change is written is merged with that change
+            DataStoreUtils(folder).set_node_property("input0", "b", 2)
+            await engine.reload_properties(["input0"], {"input0": {"b": 2}})
+            engine.flush()
+
+        asyncio.run(run())
+        self.assertEqual(engine.get_node_property("input0", "b"), 2)
+        self.assertEqual(DataStoreUtils(folder).get_node_properties("input0"), {"value": 5, "a": 1, "b": 2})
+
+    def test_remove_and_add_node(self):
+        folder = tempfile.mkdtemp()
+        engine = ExecutionEngine(self.__get_classmap(), folder, 4, {}, {})
+
+        async def run():
+            await engine.add_node("input0", "numbergraph:number_input_node", loading=True)
+            await self.__run_to_completion(engine)
+            engine.set_node_property("input0", "value", 6)
+
+            # a new node with the same id uses its own properties, not the removed node's unwritten changes
+            await engine.remove_node("input0")
+            DataStoreUtils(folder).set_node_properties("input0", {"value": 7})
+            await engine.add_node("input0", "numbergraph:number_input_node", loading=True)
+            await self.__run_to_completion(engine)
+            engine.flush()
+
+        asyncio.run(run())
+        self.assertEqual(engine.node_outputs["input0"]["data_out"], 7)
+        self.assertEqual(DataStoreUtils(folder).get_node_properties("input0"), {"value": 7})
+
+    def test_async_data(self):
+        engine = ExecutionEngine(self.__get_classmap(), tempfile.mkdtemp(), 4, {}, {}, io_threads=2)
+
+        async def run():
+            await engine.add_node("input0", "numbergraph:number_input_node", loading=True)
+            services = (await engine.get_node_wrapper("input0")).services
+            await asyncio.gather(*[services.set_data_async(f"key{idx}", bytes([idx])*1000) for idx in range(10)])
+            return await asyncio.gather(*[services.get_data_async(f"key{idx}") for idx in range(10)])
+
+        self.assertEqual(asyncio.run(run()), [bytes([idx])*1000 for idx in range(10)])
+        # reads and writes were run on a bounded pool of threads
+        self.assertEqual(engine.io_executor._max_workers, 2)
+        engine.close()
+        self.assertIsNone(engine.io_executor)
+
+    def test_async_data_concurrent_writes(self):
+        folder = tempfile.mkdtemp()
+        engine = ExecutionEngine(self.__get_classmap(), folder, 4, {}, {}, deduplicate_data=True, io_threads=8)
+        shared_data = b"shared" * 1000
+
+        async def run():
+            await engine.add_node("input0", "numbergraph:number_input_node", loading=True)
+            services = (await engine.get_node_wrapper("input0")).services
+            await asyncio.gather(*[services.set_data_async(f"key{idx}", shared_data) for idx in range(16)])
+            await asyncio.gather(*[services.set_data_async(f"key{idx}", bytes([idx])) for idx in range(8)])
+            return await asyncio.gather(*[services.get_data_async(f"key{idx}") for idx in range(16)])
+
+        self.assertEqual(asyncio.run(run()), [bytes([idx]) for idx in range(8)] + [shared_data] * 8)
+        engine.close()
+        storage = DataStoreUtils(folder).get_storage()
+        references = {blob_hash: storage.load_properties("blob", blob_hash)["references"]
+                      for blob_hash in os.listdir(os.path.join(folder, "blob"))
+                      if storage.load_properties("blob", blob_hash) is not None}
+        self.assertEqual(sorted(references.values()), [1] * 8 + [8])
+
+    def test_lazy_nodes(self):
+        folder = tempfile.mkdtemp()
+        DataStoreUtils(folder).set_node_properties("input0", {"value": 5})
+        engine = ExecutionEngine(self.__get_classmap(), folder, 4, {}, {}, lazy_nodes=True)
+
+        async def run():
+            for idx in range(3):
+                await engine.add_node(f"input{idx}", "numbergraph:number_input_node", loading=True)
+            await engine.add_node("display0", "numbergraph:number_display_node", loading=True)
+            await engine.add_link("l0", "input0", "data_out", "display0", "integer_data_in", loading=True)
+            loaded = [sorted(engine.node_wrappers)]
+            self.assertEqual(engine.get_node_property("input0", "value"), 5)
+
+            # opening a client loads only that node
+            await engine.open_client("input1", "node", "client0", {},
+                                     "hyrrokkin.executor.client_service.ClientService")
+            await asyncio.gather(*engine.loading_nodes.values())
+            loaded.append(sorted(engine.node_wrappers))
+
+            # nodes are loaded when they are executed
+            await self.__run_to_completion(engine)
+            loaded.append(sorted(engine.node_wrappers))
+            return loaded
+
+        self.assertEqual(asyncio.run(run()), [[], ["input1"], ["display0", "input0", "input1", "input2"]])
+        self.assertEqual(engine.node_outputs["input0"]["data_out"], 5)
+        self.assertEqual(len(engine.executed_nodes), 4)
+
+    def test_concurrent_load(self):
+        classmap = self.__get_classmap()
+        node_class = ResourceLoader.get_class(classmap["numbergraph"]["nodes"]["number_input_node"])
+        loading = []
+        max_loading = []
+
+        async def slow_load(instance):
+            loading.append(instance)
+            max_loading.append(len(loading))
+            await asyncio.sleep(0.1)
+            loading.remove(instance)
+
+        engine = ExecutionEngine(classmap, tempfile.mkdtemp(), 4, {}, {}, load_limit=3)
+
+        async def run():
+            for idx in range(6):
+                await engine.add_node(f"input{idx}", "numbergraph:number_input_node", loading=True)
+            # nodes are loaded in the background, their clients are opened when loading completes
+            await engine.open_client("input0", "node", "client0", {},
+                                     "hyrrokkin.executor.client_service.ClientService")
+            self.assertEqual(list(engine.pending_node_clients), ["input0"])
+            await self.__run_to_completion(engine)
+
+        with unittest.mock.patch.object(node_class, "load", slow_load, create=True):
+            start_time = time.time()
+            asyncio.run(run())
+            elapsed = time.time() - start_time
+
+        self.assertEqual(max(max_loading), 3)
+        self.assertLess(elapsed, 0.5)
+        self.assertEqual(engine.pending_node_clients, {})
+        self.assertEqual(len(engine.executed_nodes), 6)
+
+    def test_remove_while_loading(self):
+        classmap = self.__get_classmap()
+        node_class = ResourceLoader.get_class(classmap["numbergraph"]["nodes"]["number_input_node"])
+        completed = []
+
+        async def slow_load(instance):
+            await asyncio.sleep(0.1)
+
+        engine = ExecutionEngine(classmap, tempfile.mkdtemp(), 4, {}, {},
+                                 execution_complete_callback=lambda: completed.append(True))
+
+        async def run():
+            await engine.add_node("input0", "numbergraph:number_input_node", loading=True)
+            await engine.run_coro(False)
+            await asyncio.sleep(0.01)
+            self.assertEqual(engine.executing_nodes, {"input0": True})
+            completed.clear()
+            await engine.remove_node("input0")
+            await asyncio.gather(*list(engine.executing_tasks))
+
+        with unittest.mock.patch.object(node_class, "load", slow_load, create=True):
+            asyncio.run(run())
+
+        self.assertEqual(engine.executing_nodes, {})
+        self.assertEqual(completed, [True])
+        self.assertEqual(engine.node_wrappers, {})
+
+    def test_load_failure(self):
+        classmap = self.__get_classmap()
+        node_class = ResourceLoader.get_class(classmap["numbergraph"]["nodes"]["number_input_node"])
+
+        async def failing_load(instance):
+            raise ValueError("unable to load")
+
+        engine = ExecutionEngine(classmap, tempfile.mkdtemp(), 4, {}, {})
+
+        async def run():
+            await engine.add_node("input0", "numbergraph:number_input_node", loading=True)
+            await engine.open_client("input0", "node", "client0", {},
+                                     "hyrrokkin.executor.client_service.ClientService")
+            await engine.recv_message("input0", "node", "client0", "hello")
+            await self.__run_to_completion(engine)
+
+        with unittest.mock.patch.object(node_class, "load", failing_load, create=True):
+            asyncio.run(run())
+
+        # the node fails with the exception raised by load, and queued clients and messages are discarded
+        self.assertIsInstance(engine.failed_nodes["input0"], ValueError)
+        self.assertEqual(str(engine.failed_nodes["input0"]), "unable to load")
+        self.assertEqual(engine.pending_node_clients, {})
+        self.assertEqual(engine.pending_node_messages, {})
+
+    def test_lazy_class_resolution(self):
+        schema_path = numbergraph_package + "/schema.json"
+        package_content = json.loads(ResourceLoader.load_resource(schema_path).decode("utf-8"))
+        package_content["node_types"]["number_input_node"]["classname"] = "nodes.number_input_node.MissingNode"
+        # classes are not imported or checked when the schema is loaded
+        schema = Schema()
+        schema.load_package_from_dict(package_content, schema_path)
+        classmap = schema.get_classmap()
+        self.assertEqual(classmap["numbergraph"]["nodes"]["number_input_node"],
+                         numbergraph_package + ".nodes.number_input_node.MissingNode")
+
+        engine = ExecutionEngine(classmap, tempfile.mkdtemp(), 4, {}, {})
+
+        async def run():
+            await engine.add_node("input0", "numbergraph:number_input_node", loading=True)
+            await engine.add_node("display0", "numbergraph:number_display_node", loading=True)
+            await self.__run_to_completion(engine)
+
+        asyncio.run(run())
+        self.assertEqual(list(engine.failed_nodes), ["input0"])
+        self.assertEqual(list(engine.executed_nodes), ["display0"])
+        # the node's failure reports why its class could not be used
+        self.assertIsInstance(engine.failed_nodes["input0"], AttributeError)
+        self.assertIn("MissingNode", str(engine.failed_nodes["input0"]))
+
+        # classes are resolved once per process
+        classname = classmap["numbergraph"]["nodes"]["number_display_node"]
+        self.assertIs(ResourceLoader.class_cache[classname], ResourceLoader.get_class(classname))
+
+    def test_invalid_node_class(self):
+        schema_path = numbergraph_package + "/schema.json"
+        package_content = json.loads(ResourceLoader.load_resource(schema_path).decode("utf-8"))
+        package_content["node_types"]["number_input_node"]["classname"] = "hyrrokkin.executor.client_service.ClientService"
+        package_content["node_types"]["number_display_node"]["classname"] = "no_such_module.NumberDisplayNode"
+        schema = Schema()
+        schema.load_package_from_dict(package_content, schema_path)
+        engine = ExecutionEngine(schema.get_classmap(), tempfile.mkdtemp(), 4, {}, {})
+
+        async def run():
+            await engine.add_node("input0", "numbergraph:number_input_node", loading=True)
+            await engine.add_node("display0", "numbergraph:number_display_node", loading=True)
+            await self.__run_to_completion(engine)
+
+        asyncio.run(run())
+        self.assertIn("does not have the required run method", str(engine.failed_nodes["input0"]))
+        self.assertIsInstance(engine.failed_nodes["display0"], ModuleNotFoundError)
+
+
+if __name__ == '__main__':
+    import logging
+    logging.basicConfig(level=logging.INFO)
+    unittest.main()
@@ -0,0 +1,261 @@
+#   Hyrrokkin - a Python library for building and running executable graphs
+#
+#   MIT License - Copyright (C) 2022-2023  Visual Topology Ltd
+#
+#   Permission is hereby granted, free of charge, to any person obtaining a copy of this software
+#   and associated documentation files (the "Software"), to deal in the Software without
+#   restriction, including without limitation the rights to use, copy, modify, merge, publish,
+#   distribute, sublicense, and/or sell copies of the Software, and to permit persons to whom the
+#   Software is furnished to do so, subject to the following conditions:
+#
+#   The above copyright notice and this permission notice shall be included in all copies or
+#   substantial portions of the Software.
+#
+#   THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING
+#   BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+#   NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM,
+#   DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#   OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+import json
+import os
+import unittest
+import tempfile
+
+from hyrrokkin.model.network import Network
+from hyrrokkin.model.node import Node
+from hyrrokkin.model.link import Link
+from hyrrokkin.schema.schema import Schema
+from hyrrokkin.exceptions.invalid_link_error import InvalidLinkError
+
+numbergraph_package = "hyrrokkin.example_packages.numbergraph"
+
+class NetworkTests(unittest.TestCase):
+
+    def __init__(self,*args,**kwargs):
+        super().__init__(*args,**kwargs)
+
+    def __get_network(self, savedir=None, **kwargs):
+        schema = Schema()
+        schema.load_package_from(numbergraph_package + "/schema.json")
+        return Network(schema, savedir if savedir else tempfile.mkdtemp(), **kwargs)
+
+    def __add_nodes(self, network, node_ids, node_type="numbergraph:number_display_node"):
+        for node_id in node_ids:
+            network.add_node(Node(node_id, node_type, 0, 0, {}))
+
+    def __add_link(self, network, link_id, from_node_id, to_node_id, from_port="data_out", to_port="integer_data_in"):
+        network.add_link(Link(link_id, from_node_id, from_port, to_node_id, to_port, "numbergraph:integer"))
+
+    def test_link_indexes(self):
+        n = self.__get_network()
+        self.__add_nodes(n, ["a", "b", "c"])
+        self.__add_link(n, "l0", "a", "b")
+        self.__add_link(n, "l1", "a", "c")
+        self.__add_link(n, "l2", "b", "c", to_port="integerlist_data_in")
+
+        self.assertEqual(n.get_outputs_from("a"), [("b", "integer_data_in"), ("c", "integer_data_in")])
+        self.assertEqual(n.get_outputs_from("a", "other_port"), [])
+        self.assertEqual(n.get_inputs_to("c"), [("a", "data_out"), ("b", "data_out")])
+        self.assertEqual(n.get_inputs_to("c", "integerlist_data_in"), [("b", "data_out")])
+        self.assertEqual(n.get_connection_counts("c"),
+                         {"inputs": {"integer_data_in": 1, "integerlist_data_in": 1}, "outputs": {}})
+        self.assertEqual(n.get_terminal_nodes(), {"c"})
+
+        n.remove_link("l2")
+        self.assertEqual(n.get_inputs_to("c", "integerlist_data_in"), [])
+        self.assertEqual(n.get_connection_counts("b"), {"inputs": {"integer_data_in": 1}, "outputs": {}})
+        self.assertEqual(n.get_terminal_nodes(), {"b", "c"})
+
+        n.clear()
+        self.assertEqual(n.get_inputs_to("c"), [])
+        self.assertEqual(n.get_terminal_nodes(), set())
+
+    def test_link_indexes_after_load(self):
+        n = self.__get_network()
+        self.__add_nodes(n, ["a", "b"])
+        self.__add_link(n, "l0", "a", "b")
+
+        n2 = self.__get_network()
+        n2.load(n.save(), {})
+        self.assertEqual(n2.get_outputs_from("a"), [("b", "integer_data_in")])
+        self.assertEqual(n2.get_connection_counts("a"), {"inputs": {}, "outputs": {"data_out": 1}})
+
+    def test_traversal_order(self):
+        n = self.__get_network()
+        self.__add_nodes(n, ["d", "c", "b", "a"])
+        self.__add_link(n, "l0", "a", "b")
+        self.__add_link(n, "l1", "a", "c")
+        self.__add_link(n, "l2", "b", "d")
+        self.__add_link(n, "l3", "c", "d")
+        self.assertEqual(n.get_node_ids(traversal_order=True), ["a", "b", "c", "d"])
+        self.assertEqual(n.get_node_ids(traversal_order=False), ["d", "c", "b", "a"])
+
+        # the cached order is discarded when links change
+        n.remove_link("l0")
+        self.assertEqual(n.get_node_ids(traversal_order=True), ["b", "a", "c", "d"])
+
+    def test_traversal_order_cycle(self):
+        n = self.__get_network()
+        self.__add_nodes(n, ["a", "b", "c"])
+        self.__add_link(n, "l0", "a", "b")
+        self.__add_link(n, "l1", "b", "c")
+        self.__add_link(n, "l2", "c", "b")
+        with self.assertRaises(InvalidLinkError):
+            n.get_node_ids(traversal_order=True)
+
+    def test_reachability(self):
+        n = self.__get_network()
+        # a chain of diamonds, the number of paths from the source to the sink is 2^layers
+        layers = 40
+        self.__add_nodes(n, ["j0"])
+        for layer in range(layers):
+            self.__add_nodes(n, [f"l{layer}", f"r{layer}", f"j{layer+1}"])
+            self.__add_link(n, f"a{layer}", f"j{layer}", f"l{layer}")
+            self.__add_link(n, f"b{layer}", f"j{layer}", f"r{layer}")
+            self.__add_link(n, f"c{layer}", f"l{layer}", f"j{layer+1}")
+            self.__add_link(n, f"d{layer}", f"r{layer}", f"j{layer+1}")
+
+        self.assertEqual(len(n.get_node_ids_from("j0")), 3*layers+1)
+        self.assertEqual(len(n.get_node_ids_to(f"j{layers}")), 3*layers+1)
+        self.assertEqual(sorted(n.get_node_ids_to("j1")), ["j0", "j1", "l0", "r0"])
+        self.assertEqual(sorted(n.get_node_ids_from(f"l{layers-1}")), [f"j{layers}", f"l{layers-1}"])
+        self.assertTrue(n.is_reachable("j0", f"j{layers}"))
+        self.assertFalse(n.is_reachable(f"j{layers}", "j0"))
+        self.assertFalse(n.is_reachable("l0", "r0"))
+
+        # the index is recomputed when links are added
+        self.__add_nodes(n, ["x"])
+        self.__add_link(n, "e0", f"j{layers}", "x")
+        self.assertIn("x", n.get_node_ids_from("j0"))
+        self.assertIn("j0", n.get_node_ids_to("x"))
+
+        # and recomputed when links are removed
+        n.remove_link("a0")
+        self.assertEqual(len(n.get_node_ids_from("j0")), 3*layers+1)
+        n.remove_link("b0")
+        self.assertEqual(n.get_node_ids_from("j0"), ["j0"])
+        self.assertNotIn("j0", n.get_node_ids_to("x"))
+
+    def test_batch(self):
+        n = self.__get_network()
+        path = os.path.join(n.get_directory(), "topology.json")
+        with n.batch():
+            self.__add_nodes(n, ["a", "b"])
+            with n.batch():
+                self.__add_link(n, "l0", "a", "b")
+            # nested batches do not save
+            self.assertFalse(os.path.exists(path))
+        with open(path) as f:
+            saved = json.loads(f.read())
+        self.assertEqual(list(saved["nodes"].keys()), ["a", "b"])
+        self.assertEqual(list(saved["links"].keys()), ["l0"])
+
+    def test_batch_failure(self):
+        for use_journal in [False, True]:
+            n = self.__get_network(use_journal=use_journal)
+            self.__add_nodes(n, ["a", "b"])
+            n.set_metadata({"name": "before"})
+            saved = n.save()
+            with self.assertRaises(ValueError):
+                with n.batch():
+                    self.__add_nodes(n, ["c"])
+                    self.__add_link(n, "l0", "a", "b")
+                    n.remove_node("b")
+                    n.set_metadata({"name": "after"})
+                    raise ValueError()
+            # the edits are discarded, in memory and on disk
+            self.assertEqual(n.save(), saved)
+            self.assertEqual(n.get_inputs_to("b"), [])
+            n2 = self.__get_network(n.get_directory())
+            n2.load_dir({})
+            self.assertEqual(n2.save(), saved)
+
+    def test_journal(self):
+        n = self.__get_network(use_journal=True)
+        savedir = n.get_directory()
+        self.__add_nodes(n, ["a", "b", "c"])
+        self.__add_link(n, "l0", "a", "b")
+        self.__add_link(n, "l1", "b", "c")
+        n.move_node("a", 10, 20)
+        n.update_node_metadata("b", {"name": "b"})
+        n.set_metadata({"name": "journal test"})
+        n.remove_link("l1")
+        n.remove_node("c")
+
+        # edits are appended to the journal, topology.json is not written
+        self.assertFalse(os.path.exists(os.path.join(savedir, "topology.json")))
+        with open(os.path.join(savedir, "topology.journal")) as f:
+            self.assertEqual(len(f.readlines()), 10)
+
+        n2 = self.__get_network(savedir)
+        (loaded_node_ids, loaded_link_ids, _) = n2.load_dir({})
+        self.assertEqual(loaded_node_ids, ["a", "b"])
+        self.assertEqual(loaded_link_ids, ["l0"])
+        self.assertEqual(n2.save(), n.save())
+
+        # loading compacts the journal into topology.json
+        self.assertTrue(os.path.exists(os.path.join(savedir, "topology.json")))
+        self.assertFalse(os.path.exists(os.path.join(savedir, "topology.journal")))
+
+    def test_journal_compaction(self):
+        n = self.__get_network(use_journal=True, journal_compaction_limit=3)
+        savedir = n.get_directory()
+        self.__add_nodes(n, ["a", "b", "c"])
+        self.assertFalse(os.path.exists(os.path.join(savedir, "topology.journal")))
+        self.__add_nodes(n, ["d"])
+        self.assertTrue(os.path.exists(os.path.join(savedir, "topology.journal")))
+
+        # simulate an edit interrupted while being written
+        with open(os.path.join(savedir, "topology.journal"), "a") as f:
+            f.write('{"action": "add_no')
+
+        n2 = self.__get_network(savedir)
+        n2.load_dir({})
+        self.assertEqual(n2.get_node_ids(), ["a", "b", "c", "d"])
+
+    def test_snapshot(self):
+        n = self.__get_network(use_snapshot=True)
+        savedir = n.get_directory()
+        with n.batch():
+            self.__add_nodes(n, ["a", "b", "c"])
+            n.move_node("b", 10, 20)
+            n.update_node_metadata("c", {"name": "display"})
+            self.__add_link(n, "l0", "a", "b")
+            self.__add_link(n, "l1", "b", "c")
+            n.set_metadata({"name": "snapshot test"})
+        self.assertTrue(os.path.exists(os.path.join(savedir, "topology.snapshot")))
+
+        n2 = self.__get_network(savedir)
+        (loaded_node_ids, loaded_link_ids, _) = n2.load_dir({})
+        self.assertEqual(loaded_node_ids, ["a", "b", "c"])
+        self.assertEqual(loaded_link_ids, ["l0", "l1"])
+        self.assertEqual(n2.save(), n.save())
+
+        # a snapshot that is out of date with respect to topology.json is ignored
+        with open(os.path.join(savedir, "topology.json")) as f:
+            saved = json.loads(f.read())
+        del saved["links"]["l1"]
+        with open(os.path.join(savedir, "topology.json"), "w") as f:
+            f.write(json.dumps(saved))
+        n3 = self.__get_network(savedir)
+        n3.load_dir({})
+        self.assertEqual(n3.get_link_ids(), ["l0"])
+
+    def test_snapshot_invalid(self):
+        n = self.__get_network(use_snapshot=True)
+        savedir = n.get_directory()
+        self.__add_nodes(n, ["a", "b"])
+        with open(os.path.join(savedir, "topology.snapshot"), "r+b") as f:
+            f.truncate(f.seek(0, os.SEEK_END) - 1)
+
+        n2 = self.__get_network(savedir)
+        n2.load_dir({})
+        self.assertEqual(n2.get_node_ids(), ["a", "b"])
+
+
+
+if __name__ == '__main__':
+    import logging
+    logging.basicConfig(level=logging.INFO)
+    unittest.main()
@@ -17,12 +17,14 @@
 #   DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
 #   OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
 
+import io
 import logging
 import unittest
 import tempfile
 
 from hyrrokkin.api.topology import Topology
 from hyrrokkin.utils.yaml_importer import import_from_yaml
+from hyrrokkin.exceptions.invalid_link_error import InvalidLinkError
 
 logging.basicConfig(level=logging.INFO)
 
@@ -60,3 +62,21 @@ class YamlImportTests(unittest.TestCase):
         self.assertTrue(t.run(output_listeners={"n1:data_out": lambda v: test_outputs.append(v)}))
 
         self.assertEqual(test_outputs,[[2, 2, 2, 5, 5]])
+
+    def test2(self):
+        t = Topology(tempfile.mkdtemp(),[numbergraph_package])
+        # the link refers to an undefined node, so nothing should be imported
+        with self.assertRaises(InvalidLinkError):
+            import_from_yaml(t, io.StringIO(test_yaml.replace("n0 => n1", "n0 => n2")))
+        self.assertEqual(t.get_node_ids(), [])
+
+    def test3(self):
+        t = Topology(tempfile.mkdtemp(),[numbergraph_package])
+        t.set_metadata({"name": "before"})
+        # the link names an invalid port, so neither the metadata nor the nodes should be imported
+        bad_yaml = "metadata:\n  name: after\n" + test_yaml.replace("n0 => n1", "n0:no_such_port => n1")
+        with self.assertRaises(InvalidLinkError):
+            import_from_yaml(t, io.StringIO(bad_yaml))
+        self.assertEqual(t.get_node_ids(), [])
+        self.assertEqual(t.get_link_ids(), [])
+        self.assertEqual(t.get_metadata()["name"], "before")